@@ -0,0 +1,104 @@
+#GitHub: koopaduo2
+#Temporal frame accumulation and running statistics for Beam GUI
+#Noisy low power beams are analyzed on a moving average of the last N frames, accumulated in place into a
+#float32 frame, and the pointing/width/power stability is kept as a running mean and standard deviation (Welford).
+#Memory does not grow with the length of the run and no frames have to be logged to get stable numbers
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import cv2
+import math
+
+#accumulation modes
+#"exponential": exponential moving average with weight 1/N (the average of the first N frames, then
+#each new frame weighs 1/N). Only the average is kept, so memory does not depend on N
+#"window": exact average of the last N frames (a running sum, the N frames are kept to subtract the oldest),
+#limited to WINDOW_BYTES of kept frames
+ACCUMULATE_MODES = ("exponential", "window")
+
+#memory budget of the frames kept by a "window" average (bytes)
+WINDOW_BYTES = 256*2**20
+
+#largest "window" average of frames of shape and dtype within the memory budget
+def max_window_frames(shape, dtype=np.uint8, budget=WINDOW_BYTES):
+    return max(int(budget // (int(np.prod(shape))*np.dtype(dtype).itemsize)), 1)
+
+#in place average of the last frames of a grayscale stream
+#add(frame) returns the current average as a float32 frame (valid until the next add)
+class FrameAccumulator(object):
+    count = 0 #number of frames in the current average (at most frames)
+
+    def __init__(self, shape, frames=16, mode="exponential", dtype=np.uint8):
+        if mode not in ACCUMULATE_MODES:
+            raise ValueError("Unknown accumulation mode: "+str(mode))
+        if mode == "window" and frames > max_window_frames(shape, dtype):
+            raise ValueError("A window of %d frames exceeds the memory budget (at most %d frames)" % \
+                (frames, max_window_frames(shape, dtype)))
+        self.shape, self.dtype = tuple(shape), np.dtype(dtype)
+        self.frames = frames
+        self.mode = mode
+        self.sum = np.zeros(shape, np.float32) #running sum ("window") or the average itself ("exponential")
+        self.mean = np.empty(shape, np.float32)
+        #integer frames summed in float32 stay exact up to 2**24 (e.g. 65000 8-bit or 4000 12-bit frames)
+        self.history = np.empty((frames,)+self.shape, dtype) if mode == "window" else None
+        self.next = 0 #history slot of the next frame
+
+    #start a new average
+    def reset(self):
+        self.count = 0
+        self.next = 0
+        self.sum.fill(0)
+
+    #True if frames of this shape and dtype can be added (sensor zoom or bit depth changes need a new one)
+    def accepts(self, frame):
+        return frame.shape == self.shape and frame.dtype == self.dtype
+
+    def add(self, frame):
+        if self.mode == "exponential":
+            self.count = min(self.count + 1, self.frames)
+            cv2.accumulateWeighted(frame, self.sum, 1.0/self.count)
+            return self.sum
+        if self.count == self.frames:
+            #the window is full: drop the oldest frame from the sum
+            np.subtract(self.sum, self.history[self.next], out=self.sum)
+        else:
+            self.count += 1
+        cv2.accumulate(frame, self.sum)
+        np.copyto(self.history[self.next], frame)
+        self.next = (self.next + 1) % self.frames
+        np.multiply(self.sum, 1.0/self.count, out=self.mean)
+        return self.mean
+
+#running mean and standard deviation of a few values per frame (Welford's algorithm, numerically stable)
+class RunningStats(object):
+    count = 0 #frames added
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.means = [0.0]*len(self.fields)
+        self.m2 = [0.0]*len(self.fields)
+
+    #add one frame's values (in the order of fields)
+    def update(self, values):
+        self.count += 1
+        for i, value in enumerate(values):
+            delta = value - self.means[i]
+            self.means[i] += delta / self.count
+            self.m2[i] += delta * (value - self.means[i])
+
+    #sample standard deviations (0 until two frames were added)
+    def stds(self):
+        if self.count < 2:
+            return [0.0]*len(self.fields)
+        return [math.sqrt(m2 / (self.count - 1)) for m2 in self.m2]
+
+    #{field: (mean, standard deviation)}
+    def summary(self):
+        return dict(zip(self.fields, zip(self.means, self.stds())))
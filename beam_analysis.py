@@ -0,0 +1,155 @@
+#GitHub: koopaduo2
+#Beam analysis engine for Beam GUI
+#Qt-free and camera-free so the beam maths can be unit tested and benchmarked on any machine
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+from collections import namedtuple
+import numpy as np
+import cv2
+import math
+from beam_profiles import marginal_profiles, profile_moments
+
+#immutable result record for one analyzed frame
+#pix_sum, pix_max, sat_num are gray value sum (ct), max (ct) and number of saturated pixels
+#centroid_x, centroid_y are in pixels (full frame coordinates)
+#d4x, d4y are the D4σ beam widths in microns
+#d4xy (signed cross term, microns) and ellipticity are only filled in when cross terms are requested
+BeamStats = namedtuple("BeamStats", ["pix_sum", "pix_max", "sat_num", "centroid_x", "centroid_y", \
+    "d4x", "d4y", "d4xy", "ellipticity"])
+
+#compute sum, max and saturated pixel count from a single histogram pass
+#works for any unsigned integer frame (8-bit camera images or 10/12/16-bit raw frames) and float averages
+#sat_level may be fractional (lowered by a subtracted dark reference or edge level), integer frames then count
+#the gray values from the next integer up as saturated
+def histogram_stats(image, sat_level=255):
+    if image.dtype.kind == "f":
+        #averaged (accumulated) frames are not integer, so no histogram
+        pix_sum = float(cv2.sumElems(image)[0])
+        pix_max = float(cv2.minMaxLoc(image)[1])
+        sat_num = cv2.countNonZero(cv2.compare(image, sat_level, cv2.CMP_GE))
+        return pix_sum, pix_max, sat_num
+    sat_level = max(int(math.ceil(sat_level)), 0)
+    if image.dtype == np.uint8:
+        #cv2.calcHist is considerably faster than np.bincount for 8-bit images
+        hist = cv2.calcHist([image], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+    elif image.dtype == np.uint16:
+        #and for 16-bit (raw) frames, where bincount would also copy non contiguous crops
+        hist = cv2.calcHist([image], [0], None, [65536], [0, 65536]).ravel().astype(np.int64)
+    else:
+        hist = np.bincount(image.ravel(), minlength=sat_level+1)
+    levels = np.nonzero(hist)[0]
+    pix_max = int(levels[-1]) if len(levels) else 0
+    pix_sum = int(np.dot(hist, np.arange(len(hist), dtype=np.int64)))
+    sat_num = int(hist[sat_level:].sum())
+    return pix_sum, pix_max, sat_num
+
+#reduce one image (or horizontal strip of an image starting at row0) to
+#(pix_sum, pix_max, sat_num, m00, centroid_x, centroid_y, mu20, mu02, mu11)
+#one histogram pass for sum, max and saturation, one moments pass for centroid and second moments
+def tile_stats(image, row0=0, sat_level=255):
+    pix_sum, pix_max, sat_num = histogram_stats(image, sat_level)
+    if pix_sum == 0:
+        return pix_sum, pix_max, sat_num, 0, 0.0, 0.0, 0.0, 0.0, 0.0
+    MOM = cv2.moments(image)
+    return pix_sum, pix_max, sat_num, MOM['m00'], MOM['m10']/MOM['m00'], MOM['m01']/MOM['m00'] + row0, \
+        MOM['mu20'], MOM['mu02'], MOM['mu11']
+
+#combine the tile_stats of several strips with the parallel axis theorem (exact, no cancellation)
+def combine_tiles(parts):
+    pix_sum = sum(p[0] for p in parts)
+    pix_max = max(p[1] for p in parts)
+    sat_num = sum(p[2] for p in parts)
+    m00 = sum(p[3] for p in parts)
+    if m00 == 0:
+        return pix_sum, pix_max, sat_num, 0, 0.0, 0.0, 0.0, 0.0, 0.0
+    cx = sum(p[3]*p[4] for p in parts)/m00
+    cy = sum(p[3]*p[5] for p in parts)/m00
+    mu20 = sum(p[6] + p[3]*(p[4] - cx)**2 for p in parts)
+    mu02 = sum(p[7] + p[3]*(p[5] - cy)**2 for p in parts)
+    mu11 = sum(p[8] + p[3]*(p[4] - cx)*(p[5] - cy) for p in parts)
+    return pix_sum, pix_max, sat_num, m00, cx, cy, mu20, mu02, mu11
+
+#stateless (apart from its settings) analyzer which turns a grayscale frame into BeamStats
+class BeamAnalyzer(object):
+    pixel_um = 1.55 #multiply a pixel width by 1.55 micron to get physical width #SENSOR DEPENDENT
+    sat_level = 255 #gray value counted as saturated
+    cross_terms = False #also compute the xy cross term and ellipticity
+
+    def __init__(self, pixel_um=1.55, sat_level=255, cross_terms=False):
+        self.pixel_um = pixel_um
+        self.sat_level = sat_level
+        self.cross_terms = cross_terms
+
+    #analyze a grayscale image which has already been masked/cropped to the aperture
+    #x0, y0 is the position of the image's top left corner in the full frame
+    #cx0, cy0 is reported as the centroid if no beam is detected (normally the aperture center)
+    #with an executor (e.g. concurrent.futures.ThreadPoolExecutor) and tiles > 1 the image is split into
+    #horizontal strips which are reduced in parallel (cv2 releases the GIL) and combined exactly
+    #sat_level overrides the analyzer's saturation level (e.g. lowered by a subtracted background)
+    def analyze(self, image, x0=0, y0=0, cx0=None, cy0=None, executor=None, tiles=1, sat_level=None):
+        if sat_level is None:
+            sat_level = self.sat_level
+        if executor is not None and tiles > 1 and image.shape[0] >= 2*tiles:
+            rows = [int(r) for r in np.linspace(0, image.shape[0], tiles + 1)]
+            parts = list(executor.map(lambda r: tile_stats(image[r[0]:r[1]], r[0], sat_level), \
+                zip(rows[:-1], rows[1:])))
+            part = combine_tiles(parts)
+        else:
+            part = tile_stats(image, 0, sat_level)
+        return self.make_stats(part, image.shape, x0, y0, cx0, cy0)
+
+    #analyze like analyze() and also return the marginal beam_profiles.Profiles of the image
+    #the centroid and second moments follow exactly from the profiles, so the two reductions replace the
+    #moments pass (only the xy cross term still needs it)
+    def analyze_profiles(self, image, x0=0, y0=0, cx0=None, cy0=None, sat_level=None):
+        if sat_level is None:
+            sat_level = self.sat_level
+        pix_sum, pix_max, sat_num = histogram_stats(image, sat_level)
+        profiles = marginal_profiles(image, x0, y0)
+        m00, centroid_x, mu20 = profile_moments(profiles.x)
+        m00_y, centroid_y, mu02 = profile_moments(profiles.y)
+        mu11 = cv2.moments(image)['mu11'] if self.cross_terms and m00 > 0 else 0.0
+        part = (pix_sum, pix_max, sat_num, m00, centroid_x, centroid_y, mu20, mu02, mu11)
+        return self.make_stats(part, image.shape, x0, y0, cx0, cy0), profiles
+
+    #BeamStats from the (combined) tile_stats of an image
+    def make_stats(self, part, shape, x0=0, y0=0, cx0=None, cy0=None):
+        pix_sum, pix_max, sat_num, m00, centroid_x, centroid_y, mu20, mu02, mu11 = part
+        #compute the centroid and D4σ in pixel values if image is not empty
+        if m00 > 0:
+            #central moments avoid the cancellation of m20/m00 - centroid**2 on large frames
+            var_x = mu20/m00
+            var_y = mu02/m00
+            #note 1 pixel has physical dimension: pixel_um * pixel_um (= 1.55 um (micron) * 1.55 um for Raspi HQ Camera module)
+            #With no scaling (lens) the physical beam widths are then d4x (px) * 1.55 um, d4y (px) * 1.55 um
+            d4x = self.pixel_um*4*math.sqrt(abs(var_x))
+            d4y = self.pixel_um*4*math.sqrt(abs(var_y))
+            d4xy, ellipticity = None, None
+            if self.cross_terms:
+                var_xy = mu11/m00
+                d4xy = math.copysign(self.pixel_um*4*math.sqrt(abs(var_xy)), var_xy)
+                #ellipticity is the ratio of the principal axis widths (ISO 11146), 1 for a round beam
+                root = math.sqrt((var_x - var_y)**2 + 4*var_xy**2)
+                major = var_x + var_y + root
+                minor = var_x + var_y - root
+                ellipticity = math.sqrt(max(minor, 0) / major) if major > 0 else 1.0
+            return BeamStats(pix_sum, pix_max, sat_num, centroid_x + x0, centroid_y + y0, \
+                d4x, d4y, d4xy, ellipticity)
+        else:
+            if cx0 is None:
+                cx0 = x0 + shape[1] / 2
+            if cy0 is None:
+                cy0 = y0 + shape[0] / 2
+            empty = 0 if self.cross_terms else None
+            return BeamStats(pix_sum, pix_max, sat_num, cx0, cy0, 0, 0, empty, \
+                1.0 if self.cross_terms else None)
+
+    #analyze a full grayscale frame inside a digital aperture (see beam_aperture.Aperture)
+    #only the aperture's bounding box is masked and analyzed
+    #dark (frame sized) and level are subtracted while masking (see Aperture.apply)
+    def analyze_aperture(self, image, aperture, out=None, dark=None, level=0, sat_level=None):
+        image_m, x0, y0 = aperture.apply(image, out, dark, level)
+        return self.analyze(image_m, x0, y0, aperture.x, aperture.y, sat_level=sat_level)
@@ -0,0 +1,154 @@
+#GitHub: koopaduo2
+#Digital aperture for Beam GUI
+#The aperture mask is only rebuilt when the aperture changes and only covers the aperture's bounding box,
+#so the per frame cost scales with the aperture area rather than the sensor size
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import cv2
+
+#supported aperture shapes
+SHAPES = ("circle", "ellipse", "rectangle")
+
+#cached, bounding box limited digital aperture
+#x, y is the aperture center, rx, ry the radii (half widths for a rectangle), all in full frame pixels
+class Aperture(object):
+    shape = "circle"
+    x, y, rx, ry = 0, 0, 0, 0
+    W, H = 0, 0 #frame size the cached mask was built for
+    x0, y0, x1, y1 = 0, 0, 0, 0 #bounding box (clipped to the frame) of the aperture
+    mask = None #0/1 uint8 mask of the bounding box (None for a rectangle, which needs no mask)
+    edges = None #(rows, cols) of the pixels on the aperture edge in bounding box coordinates (built on demand)
+    rebuilds = 0 #number of times the mask has been rebuilt
+
+    def __init__(self, x=0, y=0, rx=0, ry=None, shape="circle"):
+        self.set(x, y, rx, ry, shape)
+
+    #set the aperture. The cached mask is only invalidated if something actually changed
+    def set(self, x, y, rx, ry=None, shape=None):
+        if ry is None:
+            ry = rx
+        if shape is None:
+            shape = self.shape
+        if shape not in SHAPES:
+            raise ValueError("Unknown aperture shape: "+str(shape))
+        #a circle always has equal radii
+        if shape == "circle":
+            ry = rx
+        key = (int(x), int(y), max(int(rx), 0), max(int(ry), 0), shape)
+        if key != (self.x, self.y, self.rx, self.ry, self.shape):
+            self.x, self.y, self.rx, self.ry, self.shape = key
+            self.W, self.H = 0, 0
+
+    #rebuild the bounding box and mask for a W x H frame if the aperture or frame size changed
+    def update(self, W, H):
+        if (W, H) == (self.W, self.H):
+            return
+        self.W, self.H = W, H
+        #bounding box of the aperture clipped to the frame. An aperture completely outside
+        #of the frame is reduced to a single (masked off) pixel so the statistics stay defined
+        x0 = min(max(self.x - self.rx, 0), W - 1)
+        y0 = min(max(self.y - self.ry, 0), H - 1)
+        x1 = max(min(self.x + self.rx + 1, W), x0 + 1)
+        y1 = max(min(self.y + self.ry + 1, H), y0 + 1)
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        outside = self.x + self.rx < 0 or self.y + self.ry < 0 or self.x - self.rx >= W or self.y - self.ry >= H
+        if self.shape == "rectangle" and not outside:
+            self.mask = None
+        else:
+            mask = np.zeros((y1 - y0, x1 - x0), np.uint8)
+            #the mask is drawn in bounding box coordinates
+            center = (self.x - x0, self.y - y0)
+            if outside:
+                pass
+            elif self.shape == "circle":
+                cv2.circle(mask, center, self.rx, 1, -1)
+            else:
+                cv2.ellipse(mask, center, (self.rx, self.ry), 0, 0, 360, 1, -1)
+            self.mask = mask
+        self.edges = None
+        self.rebuilds += 1
+
+    #bounding box (x0, y0, x1, y1) of the aperture in a W x H frame
+    def window(self, W, H):
+        self.update(W, H)
+        return self.x0, self.y0, self.x1, self.y1
+
+    #apply the aperture to a (grayscale) frame
+    #returns the masked bounding box image and its top left corner x0, y0 in the frame
+    #for a rectangle the returned image is a view of the frame (no copy)
+    #dark (a background reference the size of the frame) and a constant level are subtracted in the same
+    #pass as the masking, clamped at 0. out is an optional buffer at least as large as the bounding box
+    def apply(self, image, out=None, dark=None, level=0):
+        H, W = image.shape[:2]
+        self.update(W, H)
+        crop = image[self.y0:self.y1, self.x0:self.x1]
+        if dark is not None or level:
+            return self.subtract(crop, out, dark, level), self.x0, self.y0
+        if self.mask is None:
+            return crop, self.x0, self.y0
+        if out is None:
+            return cv2.bitwise_and(crop, crop, mask=self.mask), self.x0, self.y0
+        #write into a caller supplied buffer (at least as large as the bounding box)
+        out = out[:crop.shape[0], :crop.shape[1]]
+        out.fill(0)
+        np.copyto(out, crop, where=self.mask.view(bool))
+        return out, self.x0, self.y0
+
+    #masked background subtraction of the bounding box crop (see apply)
+    def subtract(self, crop, out, dark, level):
+        if out is None:
+            out = np.zeros(crop.shape, crop.dtype)
+        else:
+            out = out[:crop.shape[0], :crop.shape[1]]
+            if self.mask is not None:
+                out.fill(0)
+        background = level if dark is None else dark[self.y0:self.y1, self.x0:self.x1]
+        #unsigned frames saturate at 0, averaged (float) frames are clamped afterwards
+        cv2.subtract(crop, background, dst=out, mask=self.mask)
+        if dark is not None and level:
+            cv2.subtract(out, level, dst=out, mask=self.mask)
+        if out.dtype.kind == "f":
+            np.maximum(out, 0, out=out)
+        return out
+
+    #pixels on the aperture edge as (rows, cols) in bounding box coordinates
+    def edge(self):
+        if self.edges is None:
+            if self.mask is None:
+                ring = np.ones((self.y1 - self.y0, self.x1 - self.x0), np.uint8)
+                ring[1:-1, 1:-1] = 0
+            else:
+                ring = self.mask - cv2.erode(self.mask, np.ones((3, 3), np.uint8))
+            self.edges = np.nonzero(ring)
+        return self.edges
+
+    #baseline of a frame estimated as the mean gray value on the aperture edge (after subtracting dark)
+    #integer frames get the level rounded to an integer: cv2.subtract rounds it anyway, and the saturation level
+    #must be lowered by the same amount that is subtracted (a fractional part would be rounded up there)
+    def edge_level(self, image, dark=None):
+        H, W = image.shape[:2]
+        self.update(W, H)
+        rows, cols = self.edge()
+        if len(rows) == 0:
+            return 0
+        values = image[self.y0:self.y1, self.x0:self.x1][rows, cols].astype(np.float64)
+        if dark is not None:
+            values -= dark[self.y0:self.y1, self.x0:self.x1][rows, cols]
+        level = max(float(values.mean()), 0.0)
+        return int(round(level)) if image.dtype.kind in "ui" else level
+
+    #draw the aperture outline on a display image which has been downsampled by scale
+    def draw(self, image, scale=1, color=(0,0,0), thickness=2):
+        center = (round(self.x/scale), round(self.y/scale))
+        if self.shape == "circle":
+            cv2.circle(image, center, int(self.rx/scale), color, thickness)
+        elif self.shape == "ellipse":
+            cv2.ellipse(image, center, (int(self.rx/scale), int(self.ry/scale)), 0, 0, 360, color, thickness)
+        else:
+            cv2.rectangle(image, (round((self.x - self.rx)/scale), round((self.y - self.ry)/scale)), \
+                (round((self.x + self.rx)/scale), round((self.y + self.ry)/scale)), color, thickness)
+        return image
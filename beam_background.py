@@ -0,0 +1,95 @@
+#GitHub: koopaduo2
+#Background (dark frame) subtraction for Beam GUI
+#Sensor offset and stray light inflate D4σ and the power estimate. A dark reference is averaged once with
+#the beam blocked and saved per frame size, sensor position and bit depth, so it is reloaded automatically
+#on the next start. The subtraction itself is fused into the aperture masking (see Aperture.apply)
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import os
+from beam_accumulate import FrameAccumulator
+
+#background modes: no subtraction, the dark reference, a baseline estimated on the aperture edge, or both
+BACKGROUND_MODES = ("off", "dark", "edge", "dark+edge")
+
+#dark references of a W x H sensor, cached in memory and as .npy files in directory
+#references are looked up by frame size, sensor position (x0, y0) and frame dtype. Frames of a sensor region
+#of interest without a reference of their own use a crop of the full frame reference
+class Background(object):
+    frames = 32 #frames averaged into a dark reference
+
+    def __init__(self, W, H, directory="backgrounds", frames=32):
+        self.W, self.H = W, H
+        self.directory = directory
+        self.frames = frames
+        self.refs = {} #key -> (reference, its maximum) or None if there is none
+        self.converted = {} #(key, dtype) -> reference converted for averaged (float) frames
+        self.accumulator = None #averages the dark reference being captured
+
+    def key(self, shape, x0, y0, frame_dtype):
+        return (shape[0], shape[1], x0, y0, np.dtype(frame_dtype).name)
+
+    #file of a reference
+    def path(self, key):
+        h, w, x0, y0, dtype = key
+        return os.path.join(self.directory, "dark_%dx%d_%d_%d_%s.npy" % (w, h, x0, y0, dtype))
+
+    #cached reference of key, loaded from its file the first time it is asked for
+    def lookup(self, key):
+        if key not in self.refs:
+            path = self.path(key)
+            self.refs[key] = None
+            if os.path.exists(path):
+                dark = np.load(path)
+                self.refs[key] = (dark, float(dark.max()))
+        return self.refs[key]
+
+    #dark reference for a frame of shape at sensor position x0, y0 whose frames are frame_dtype
+    #dtype is the type of the frame it is subtracted from (float32 for averaged frames)
+    #returns (reference, maximum of the reference), (None, 0) if there is none
+    def reference(self, shape, x0=0, y0=0, frame_dtype=np.uint8, dtype=None):
+        key = self.key(shape, x0, y0, frame_dtype)
+        ref = self.lookup(key)
+        if ref is None and (shape[0], shape[1]) != (self.H, self.W):
+            full = self.lookup(self.key((self.H, self.W), 0, 0, frame_dtype))
+            if full is not None:
+                crop = full[0][y0:y0+shape[0], x0:x0+shape[1]]
+                if crop.shape == tuple(shape[:2]):
+                    ref = self.refs[key] = (crop, full[1])
+        if ref is None:
+            return None, 0
+        dark, dark_max = ref
+        if dtype is not None and np.dtype(dtype) != dark.dtype:
+            converted = self.converted.get((key, np.dtype(dtype)))
+            if converted is None:
+                converted = self.converted[(key, np.dtype(dtype))] = dark.astype(dtype)
+            dark = converted
+        return dark, dark_max
+
+    #True while a dark reference is being captured
+    def capturing(self):
+        return self.accumulator is not None
+
+    #add a (dark, beam blocked) grayscale frame to the reference being captured, starting a new capture if
+    #needed. Once frames frames are averaged the reference is cached and saved: returns its path, else None
+    def add(self, image, x0=0, y0=0):
+        acc = self.accumulator
+        if acc is None or not acc.accepts(image):
+            acc = self.accumulator = FrameAccumulator(image.shape, self.frames, "exponential", image.dtype)
+        mean = acc.add(image)
+        if acc.count < self.frames:
+            return None
+        self.accumulator = None
+        dark = np.rint(mean).astype(image.dtype)
+        key = self.key(image.shape, x0, y0, image.dtype)
+        #cropped and converted references of the previous one are rebuilt (others reloaded) on demand
+        self.refs = {key: (dark, float(dark.max()))}
+        self.converted.clear()
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        path = self.path(key)
+        np.save(path, dark)
+        return path
@@ -0,0 +1,177 @@
+#GitHub: koopaduo2
+#Offline batch reprocessing for Beam GUI
+#Re-runs the beam analysis over saved camera images (a saves/ directory, a zip archive of one, or a
+#chunked .npy frame archive from Log mode) with a new aperture, pixel size or background, spreading
+#decoding and analysis across a process pool and streaming the results into one log table
+#
+#usage: python beam_batch.py saves/ [--aperture x,y,r[,ry]] [--shape circle] [--pixel-um 1.55]
+#                            [--background 0|dark.png] [--bits 8] [--factor-p 0] [--workers N] [--output reanalysis.csv]
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import cv2
+import argparse
+import datetime
+import glob
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from beam_analysis import BeamAnalyzer
+from beam_aperture import Aperture, SHAPES
+from beam_log import StatsLog, LOG_COLUMNS
+
+#per process state of the pool workers (set by init_worker)
+worker = {}
+
+#list the frames of a saves directory, zip archive or frame archive
+#returns a list of (kind, container, name, index) tasks in time order
+def find_frames(path):
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = sorted(n for n in archive.namelist() if re.search(r"camera_[^/]*\.png$", n))
+        return [("zip", path, name, 0) for name in names]
+    chunks = sorted(glob.glob(os.path.join(path, "frames_*.npy")))
+    if chunks:
+        tasks = []
+        for chunk in chunks:
+            count = np.load(chunk, mmap_mode='r').shape[0]
+            tasks.extend(("npy", chunk, os.path.basename(chunk), i) for i in range(count))
+        return tasks
+    names = sorted(glob.glob(os.path.join(path, "camera_*.png")))
+    return [("png", path, name, 0) for name in names]
+
+#time (seconds since the epoch) from a saved file name such as camera_20211011_124359(_123).png
+def name_time(name):
+    match = re.search(r"(\d{8}_\d{6})(?:_(\d{3}))?", os.path.basename(name))
+    if not match:
+        return float("nan")
+    t = datetime.datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').timestamp()
+    return t + (int(match.group(2))/1000 if match.group(2) else 0)
+
+#aperture recorded in the stats csv saved next to a camera image, or None
+#(the line after the "Aperture x (px), y (px), radius (px)..." header)
+def saved_aperture(text):
+    lines = text.splitlines()
+    for i, line in enumerate(lines[:-1]):
+        if line.startswith("Aperture x"):
+            values = lines[i+1].split(",")
+            x, y, r = [int(float(v)) for v in values[:3]]
+            ry = int(float(values[3])) if len(values) > 3 else r
+            shape = values[4].strip() if len(values) > 4 else "circle"
+            return x, y, r, ry, shape
+    return None
+
+#pool initializer: settings shared by all frames
+def init_worker(settings):
+    worker.clear()
+    worker.update(settings)
+    worker["analyzer"] = BeamAnalyzer(settings["pixel_um"], 2**settings["bits"] - 1)
+    worker["aperture"] = Aperture()
+    worker["zips"] = {}
+    background = settings["background"]
+    if isinstance(background, str):
+        dark = np.load(background) if background.endswith(".npy") else cv2.imread(background, cv2.IMREAD_UNCHANGED)
+        if dark.ndim == 3:
+            dark = cv2.cvtColor(dark, cv2.COLOR_BGR2GRAY)
+        worker["dark"] = dark
+        worker["dark_max"] = int(dark.max())
+
+#read one frame as grayscale, plus the stats csv text saved with it (if any)
+def read_frame(task):
+    kind, container, name, index = task
+    stats_name = re.sub(r"camera_([^/]*)\.png$", r"stats_\1.csv", name)
+    text = None
+    if kind == "npy":
+        return np.array(np.load(container, mmap_mode='r')[index]), None
+    if kind == "zip":
+        archive = worker["zips"].get(container)
+        if archive is None:
+            archive = worker["zips"][container] = zipfile.ZipFile(container)
+        data = np.frombuffer(archive.read(name), np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+        if stats_name in archive.namelist():
+            text = archive.read(stats_name).decode("utf-8", "replace")
+    else:
+        image = cv2.imread(name, cv2.IMREAD_UNCHANGED)
+        if os.path.exists(stats_name):
+            with open(stats_name, encoding="utf-8", errors="replace") as statsfile:
+                text = statsfile.read()
+    #same gray conversion as the live GUI (16-bit raw frames are saved as grayscale already)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image, text
+
+#decode and analyze one frame (runs in a pool worker). Returns one log row
+def analyze_frame(task):
+    image, text = read_frame(task)
+    H, W = image.shape[:2]
+    #aperture: given on the command line, else the one saved with the frame, else the GUI default
+    aperture = worker["aperture_args"]
+    if aperture is None and text is not None:
+        aperture = saved_aperture(text)
+    if aperture is None:
+        aperture = (W//2, H//2, H//2 - 100, H//2 - 100, "circle")
+    ap = worker["aperture"]
+    ap.set(*aperture)
+    #background: dark frame or constant gray level, subtracted (clamped at 0) while masking
+    #pixels within the background of the saturation level still count as saturated
+    dark = worker.get("dark")
+    level = 0 if dark is not None else int(round(float(worker["background"] or 0)))
+    offset = level + (worker["dark_max"] if dark is not None else 0)
+    stats = worker["analyzer"].analyze_aperture(image, ap, None, dark, level, worker["analyzer"].sat_level - offset)
+    return [name_time(task[2]), 0, stats.centroid_x, stats.centroid_y, stats.d4x, stats.d4y, \
+        stats.pix_sum * worker["factor_P"], stats.pix_max, stats.pix_sum, stats.sat_num, ap.x, ap.y, ap.rx, ap.ry]
+
+#reanalyze all frames of path and write one row per frame to output. Returns the number of frames
+#bits is the bit depth of the frames (8, or 10/12 for frames saved in raw mode) which sets the saturation level
+def reprocess(path, output, aperture=None, pixel_um=1.55, background=0, factor_P=0, workers=None, chunksize=4, bits=8):
+    tasks = find_frames(path)
+    settings = {"aperture_args": aperture, "pixel_um": pixel_um, "background": background, "factor_P": factor_P, \
+        "bits": bits}
+    log = StatsLog(output, LOG_COLUMNS)
+    try:
+        with multiprocessing.Pool(workers, init_worker, (settings,)) as pool:
+            #imap keeps the frame order while rows are streamed to the log as they arrive
+            for i, row in enumerate(pool.imap(analyze_frame, tasks, chunksize)):
+                row[1] = i
+                log.append(row)
+    finally:
+        log.close()
+    return len(tasks)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reanalyze saved Beam GUI frames")
+    parser.add_argument("path", help="saves directory, zip archive of one, or frame archive directory")
+    parser.add_argument("--aperture", help="x,y,r or x,y,rx,ry in pixels (default: aperture saved with each frame)")
+    parser.add_argument("--shape", default="circle", choices=SHAPES, help="aperture shape")
+    parser.add_argument("--pixel-um", type=float, default=1.55, help="pixel pitch in microns")
+    parser.add_argument("--background", default="0", help="gray level or dark frame (.png/.npy) to subtract")
+    parser.add_argument("--bits", type=int, default=8, choices=(8, 10, 12), help="bit depth of the frames")
+    parser.add_argument("--factor-p", type=float, default=0, help="power calibration factor (mW per count)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--output", default="reanalysis.csv", help="output log csv")
+    args = parser.parse_args(argv)
+
+    aperture = None
+    if args.aperture:
+        values = [int(v) for v in args.aperture.split(",")]
+        aperture = (values[0], values[1], values[2], values[-1], args.shape)
+    #a numeric background is a gray level (an integer, like the frames it is subtracted from)
+    background = args.background
+    try:
+        background = int(round(float(background)))
+    except ValueError:
+        pass
+    t0 = time.perf_counter()
+    n = reprocess(args.path, args.output, aperture, args.pixel_um, background, args.factor_p, args.workers, \
+        bits=args.bits)
+    dt = time.perf_counter() - t0
+    print("Reanalyzed %d frames in %.2f s (%.1f frames/s), results in %s" % (n, dt, n/dt if dt else 0, args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#GitHub: koopaduo2
+#Reusable frame buffers and memory reporting for Beam GUI
+#Every full frame array of the capture -> analysis -> display loop is taken from a BufferPool and written
+#with dst=/out= parameters, so once warmed up the loop allocates no frame sized memory. A Pi running other
+#services otherwise sees hundreds of MB/s of allocation churn, stutter and memory pressure
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import os
+import resource
+import sys
+
+#named, preallocated arrays reused every frame
+#get(name, shape, dtype) returns a C contiguous array of that shape backed by the name's buffer. The buffer
+#only grows (e.g. when the sensor zoom changes the frame size), smaller frames reuse the front of it
+class BufferPool(object):
+    allocations = 0 #number of buffers allocated (stays constant once warmed up)
+    allocated_bytes = 0 #total size of the pool's buffers
+
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, name, shape, dtype=np.uint8):
+        dtype = np.dtype(dtype)
+        n = int(np.prod(shape)) * dtype.itemsize
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.nbytes < n:
+            if buffer is not None:
+                self.allocated_bytes -= buffer.nbytes
+            buffer = self.buffers[name] = np.empty(n, np.uint8)
+            self.allocations += 1
+            self.allocated_bytes += n
+        return buffer[:n].view(dtype).reshape(shape)
+
+    #drop all buffers (they are reallocated on the next get)
+    def clear(self):
+        self.buffers.clear()
+        self.allocated_bytes = 0
+
+#resident memory of this process in MB, sampled per frame and its peak
+class MemoryMonitor(object):
+    rss_mb = 0.0 #resident memory at the last sample
+    peak_mb = 0.0 #highest sampled resident memory
+
+    def __init__(self):
+        self.page_mb = resource.getpagesize() / 2**20
+        #kept open, rereading it is cheaper than opening it every frame
+        self.statm = open("/proc/self/statm") if os.path.exists("/proc/self/statm") else None
+
+    #current resident memory in MB (one small /proc read on Linux)
+    def sample(self):
+        if self.statm is not None:
+            self.statm.seek(0)
+            self.rss_mb = int(self.statm.read().split()[1]) * self.page_mb
+        else:
+            self.rss_mb = self.max_rss_mb()
+        self.peak_mb = max(self.peak_mb, self.rss_mb)
+        return self.rss_mb
+
+    #peak resident memory over the lifetime of the process in MB (ru_maxrss is in bytes on macOS)
+    def max_rss_mb(self):
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 2**20 if sys.platform == "darwin" else maxrss / 2**10
+
+    #short summary for the status bar
+    def summary(self):
+        return "RSS %.0f MB (peak %.0f)" % (self.rss_mb, self.peak_mb)
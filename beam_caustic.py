@@ -0,0 +1,219 @@
+#GitHub: koopaduo2
+#Caustic (M²) measurement for Beam GUI
+#D4σ is averaged over a number of frames at each z position of a scan and the hyperbolic caustic
+#d²(z) = d0² + θ² (z - z0)² is refitted (ISO 11146 least squares fit of d² to a parabola in z) after every new
+#position. The fit keeps running sums of its normal equations, so adding, replacing or removing a position and
+#refitting costs a 3 x 3 solve regardless of the number of positions. Only the per position results are kept,
+#no images
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+from collections import namedtuple
+import numpy as np
+import math
+from beam_accumulate import RunningStats
+
+#one position of a scan: z (mm), D4σ x and y averaged over frames frames (μm) and their standard deviations
+CausticPoint = namedtuple("CausticPoint", ["z", "d4x", "d4y", "std_x", "std_y", "frames"])
+
+#columns of the exported scan (one row per position)
+CAUSTIC_COLUMNS = list(CausticPoint._fields)
+
+#caustic fit of one axis: waist diameter d0 (μm) at z0 (mm), Rayleigh range zr (mm), full far field divergence
+#theta (mrad), beam propagation ratio m2, rms deviation of the fitted d² relative to the mean d² and the number
+#of positions fitted
+CausticFit = namedtuple("CausticFit", ["d0", "z0", "zr", "theta", "m2", "residual", "points"])
+
+#incremental least squares fit of d² = a + b u + c u² (u = z - z_ref) for one axis
+#the sums of u**k (k = 0..4), d² u**k (k = 0..2) and d**4 are updated per position
+class CausticFitter(object):
+
+    def __init__(self):
+        self.z_ref = None #positions are taken relative to the first one (keeps the sums well conditioned)
+        self.sums = np.zeros(9)
+
+    #add (sign=1) or remove (sign=-1) the diameter d (μm) at position z (mm)
+    def add(self, z, d, sign=1):
+        if self.z_ref is None:
+            self.z_ref = z
+        u, d2 = z - self.z_ref, d*d
+        powers = u**np.arange(5)
+        self.sums[:5] += sign*powers
+        self.sums[5:8] += sign*d2*powers[:3]
+        self.sums[8] += sign*d2*d2
+
+    def remove(self, z, d):
+        self.add(z, d, -1)
+
+    #CausticFit for the wavelength (μm), None until the positions describe a waist (at least three positions
+    #and an upward parabola with a positive minimum)
+    def fit(self, wavelength_um):
+        S, T, n = self.sums[:5], self.sums[5:8], int(round(self.sums[0]))
+        if n < 3:
+            return None
+        A = np.array([S[0:3], S[1:4], S[2:5]])
+        try:
+            p = np.linalg.solve(A, T)
+        except np.linalg.LinAlgError:
+            return None
+        a, b, c = (float(v) for v in p)
+        if not c > 0:
+            return None
+        d0_2 = a - b*b/(4*c)
+        if not d0_2 > 0:
+            return None
+        d0, theta = math.sqrt(d0_2), math.sqrt(c) #μm, μm/mm = mrad
+        #sum of squared d² residuals from the sums: Σd⁴ - 2 p·T + p·A·p
+        sse = max(float(self.sums[8] - 2*p.dot(T) + p.dot(A).dot(p)), 0.0)
+        residual = math.sqrt(sse/n) / float(T[0]/n)
+        m2 = math.pi*d0*theta*1e-3/(4*wavelength_um)
+        return CausticFit(d0, self.z_ref - b/(2*c), d0/theta, theta, m2, residual, n)
+
+    def clear(self):
+        self.z_ref = None
+        self.sums[:] = 0
+
+#a caustic scan: positions are averaged one at a time (start, then add every frame's D4σ) and the x and y
+#caustics are refitted whenever a position completes. A position measured again replaces the old one
+class Caustic(object):
+    wavelength_um = 0.6328 #laser wavelength (μm), only scales M²
+    frames = 10 #frames averaged per position
+    settle = 0 #frames discarded after start (stage settling, frames already in the capture ring)
+
+    def __init__(self, wavelength_um=0.6328, frames=10):
+        self.wavelength_um = wavelength_um
+        self.frames = frames
+        self.points = {} #z -> CausticPoint
+        self.fitters = (CausticFitter(), CausticFitter())
+        self.fits = (None, None) #(x, y) CausticFit of the last completed position
+        self.pending = None #RunningStats of the position being averaged
+        self.pending_z = None
+        self.skip = 0 #frames left to discard before averaging
+
+    #start averaging the position z (mm) over frames frames (default self.frames) after discarding settle frames
+    def start(self, z, frames=None, settle=None):
+        self.pending = RunningStats(("d4x", "d4y"))
+        self.pending_z = float(z)
+        self.frames = frames or self.frames
+        self.skip = self.settle if settle is None else settle
+
+    #True while a position is being averaged
+    def capturing(self):
+        return self.pending is not None
+
+    #stop averaging the position being measured (it is not stored)
+    def cancel(self):
+        self.pending = self.pending_z = None
+
+    #add one frame's D4σ x, y (μm) to the position being averaged (frames without a beam are not counted)
+    #returns the CausticPoint once the position is complete (the fits are then updated), else None
+    def add(self, d4x, d4y):
+        if self.pending is None:
+            return None
+        if self.skip > 0:
+            self.skip -= 1
+            return None
+        if not (d4x > 0 and d4y > 0):
+            return None
+        self.pending.update((d4x, d4y))
+        if self.pending.count < self.frames:
+            return None
+        (d4x, std_x), (d4y, std_y) = zip(self.pending.means, self.pending.stds())
+        point = CausticPoint(self.pending_z, d4x, d4y, std_x, std_y, self.pending.count)
+        self.cancel()
+        self.set(point)
+        return point
+
+    #store a completed position (replacing one at the same z) and refit
+    def set(self, point):
+        self.remove(point.z, refit=False)
+        self.points[point.z] = point
+        self.fitters[0].add(point.z, point.d4x)
+        self.fitters[1].add(point.z, point.d4y)
+        self.refit()
+
+    #remove the position z (mm) if it was measured
+    def remove(self, z, refit=True):
+        point = self.points.pop(float(z), None)
+        if point is not None:
+            self.fitters[0].remove(point.z, point.d4x)
+            self.fitters[1].remove(point.z, point.d4y)
+            if not self.points:
+                self.clear()
+        if refit:
+            self.refit()
+
+    #(x, y) CausticFits for the current wavelength (either is None without a valid fit)
+    def refit(self):
+        self.fits = tuple(fitter.fit(self.wavelength_um) for fitter in self.fitters)
+        return self.fits
+
+    #forget all positions
+    def clear(self):
+        self.points.clear()
+        for fitter in self.fitters:
+            fitter.clear()
+        self.fits = (None, None)
+
+    #positions sorted by z
+    def rows(self):
+        return [self.points[z] for z in sorted(self.points)]
+
+    #number of positions within one Rayleigh range of the waist and beyond two Rayleigh ranges of a fit
+    #(ISO 11146 asks for at least five of each)
+    def coverage(self, fit):
+        if fit is None:
+            return 0, 0
+        near = sum(1 for z in self.points if abs(z - fit.z0) <= fit.zr)
+        far = sum(1 for z in self.points if abs(z - fit.z0) >= 2*fit.zr)
+        return near, far
+
+    #write the positions and the fits to a csv file
+    def save(self, path):
+        with open(path, 'w') as causticfile:
+            causticfile.write(",".join(CAUSTIC_COLUMNS)+"\n")
+            for point in self.rows():
+                causticfile.write(",".join(str(value) for value in point)+"\n")
+            causticfile.write("\nAxis,Wavelength (μm),"+",".join(CausticFit._fields)+"\n")
+            for axis, fit in zip("xy", self.fits):
+                if fit is not None:
+                    causticfile.write(axis+","+str(self.wavelength_um)+","+",".join(str(value) for value in fit)+"\n")
+
+#stand-in for a motorized z stage: steps through positions (mm) from start. If source has a waist_px
+#attribute (beam_source.SyntheticSource) its beam is resized to a Gaussian beam of waist diameter d0_um at
+#z0_mm with the given M², so a scan can be run end to end without hardware
+class SimulatedStage(object):
+
+    def __init__(self, start, step, count, source=None, pixel_um=1.55, d0_um=200.0, z0_mm=0.0, m2=1.2, \
+        wavelength_um=0.6328):
+        self.positions = [start + i*step for i in range(max(int(count), 1))]
+        self.source = source
+        self.pixel_um = pixel_um
+        self.d0_um, self.z0_mm, self.m2, self.wavelength_um = d0_um, z0_mm, m2, wavelength_um
+        self.index = 0
+        self.move(0)
+
+    #current position (mm)
+    @property
+    def z(self):
+        return self.positions[self.index]
+
+    #D4σ (1/e² diameter) of the simulated beam at z (μm)
+    def diameter_um(self, z):
+        w0 = self.d0_um/2
+        zr = math.pi*w0*w0/(self.m2*self.wavelength_um)*1e-3
+        return self.d0_um*math.sqrt(1 + ((z - self.z0_mm)/zr)**2)
+
+    def move(self, index):
+        self.index = index
+        if self.source is not None and hasattr(self.source, "waist_px"):
+            self.source.waist_px = self.diameter_um(self.z)/2/self.pixel_um
+
+    #move to the next position, False (staying put) after the last one
+    def next(self):
+        if self.index + 1 >= len(self.positions):
+            return False
+        self.move(self.index + 1)
+        return True
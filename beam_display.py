@@ -0,0 +1,130 @@
+#GitHub: koopaduo2
+#Display pipeline for Beam GUI
+#Frames are downsampled first and the rainbow map and overlays are applied to the small image through a
+#precomputed RGB lookup table. Rendering is rate limited independently of the analysis rate
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import cv2
+import time
+from beam_profiles import draw_profiles
+
+#RGB lookup table (256 x 3) of the beam map: the cv2 rainbow map applied to the negative gray value,
+#so 0 is violet and 255 is red (same colors as cv2.applyColorMap(255 - image, cv2.COLORMAP_RAINBOW))
+def rainbow_lut():
+    gray = (255 - np.arange(256, dtype=np.uint8)).reshape(256, 1)
+    bgr = cv2.applyColorMap(gray, cv2.COLORMAP_RAINBOW)
+    return np.ascontiguousarray(bgr[:, 0, ::-1])
+
+#full resolution beam map as BGR (used when saving beam images)
+#high bit depth frames are scaled to the map by 255/max_value
+def colormap(image, lut=None, max_value=255):
+    if lut is None:
+        lut = rainbow_lut()
+    if image.dtype != np.uint8:
+        image = cv2.convertScaleAbs(image, alpha=255.0/max_value)
+    return lut[:, ::-1][image]
+
+#RGB colorbar of the beam map (max_value at the top, 0 at the bottom) with ticks labeled in gray values
+#drawn from the same lookup table as the beam image, so no image file is needed and the labels follow the
+#bit depth of the frames. The default size fits next to the "Beam" tab image
+def colorbar_image(lut=None, max_value=255, w=96, h=509, ticks=8):
+    if lut is None:
+        lut = rainbow_lut()
+    image = np.full((h, w, 3), 242, np.uint8)
+    x0, x1, y0, y1 = 5, 40, 8, h - 8
+    #bar rows from the top (max_value) to the bottom (0)
+    levels = np.linspace(255, 0, y1 - y0).round().astype(np.uint8)
+    image[y0:y1, x0:x1] = lut[levels][:, np.newaxis, :]
+    cv2.rectangle(image, (x0, y0), (x1 - 1, y1 - 1), (0, 0, 0), 1)
+    for i in range(ticks + 1):
+        y = y1 - 1 - round(i*(y1 - y0 - 1)/ticks)
+        cv2.line(image, (x1, y), (x1 + 5, y), (0, 0, 0), 1)
+        cv2.putText(image, str(round(i*max_value/ticks)), (x1 + 9, y + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.45, \
+            (0, 0, 0), 1, cv2.LINE_AA)
+    return image
+
+#renders the downsampled "Camera" and "Beam" tab images into preallocated RGB buffers
+class BeamDisplay(object):
+    scale = 4 #downsampling factor of the displayed images
+    fps = 15 #maximum display refresh rate (analysis runs at the camera rate regardless)
+    last_render = 0 #time.monotonic() of the last rendered frame
+
+    def __init__(self, W, H, scale=4, fps=15, max_value=255, pixel_um=1.55):
+        self.W, self.H = W, H
+        self.pixel_um = pixel_um #converts the fitted profile widths to microns
+        self.scale = scale
+        self.fps = fps
+        self.max_value = max_value
+        self.w, self.h = int(W/scale), int(H/scale)
+        self.lut = rainbow_lut()
+        self.lut3 = self.lut.reshape(256, 1, 3) #cv2.LUT form of the table for 3 channel images
+        self.camera_small = np.empty((self.h, self.w, 3), np.uint8)
+        self.gray_small = np.empty((self.h, self.w), np.uint8)
+        self.beam_small = np.empty((self.h, self.w, 3), np.uint8)
+        #high bit depth (raw) and averaged (float) frames are downsampled at full depth, then scaled to 8-bit
+        self.smalls = {} #dtype -> downsampled buffer
+
+    #True (and the render clock is restarted) if the display should be refreshed now
+    def due(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        if not self.fps or now - self.last_render >= 1.0/self.fps:
+            self.last_render = now
+            return True
+        return False
+
+    #downsample image into the display buffer dst
+    #a region of interest frame (smaller than the full frame, top left corner at x0, y0) is placed
+    #at its position on an otherwise black display
+    def downsample(self, image, dst, x0=0, y0=0):
+        if image.shape[:2] == (self.H, self.W):
+            return cv2.resize(image, (self.w, self.h), dst=dst)
+        dst.fill(0)
+        sx0, sy0 = int(x0/self.scale), int(y0/self.scale)
+        sx1 = min(max(int((x0 + image.shape[1])/self.scale), sx0 + 1), self.w)
+        sy1 = min(max(int((y0 + image.shape[0])/self.scale), sy0 + 1), self.h)
+        dst[sy0:sy1, sx0:sx1] = cv2.resize(image, (sx1 - sx0, sy1 - sy0))
+        return dst
+
+    #downsample the camera image for the "Camera" tab
+    def camera(self, image, x0=0, y0=0):
+        if image.ndim == 2:
+            return cv2.cvtColor(self.gray(image, x0, y0), cv2.COLOR_GRAY2RGB, dst=self.camera_small)
+        return self.downsample(image, self.camera_small, x0, y0)
+
+    #downsample a grayscale frame to 8-bit (other frames are scaled by 255/max_value)
+    def gray(self, image, x0=0, y0=0):
+        if image.dtype == np.uint8:
+            return self.downsample(image, self.gray_small, x0, y0)
+        small = self.smalls.get(image.dtype)
+        if small is None:
+            small = self.smalls[image.dtype] = np.empty((self.h, self.w), image.dtype)
+        small = self.downsample(image, small, x0, y0)
+        return cv2.convertScaleAbs(small, self.gray_small, 255.0/self.max_value)
+
+    #downsample the grayscale image, apply the beam map and draw centroid lines and the aperture
+    #centroid is in full frame pixels, aperture is anything with a draw(image, scale, color, thickness)
+    #method (beam_aperture.Aperture, beam_roi.BeamTracker) or None
+    #profiles (beam_profiles.Profiles) and their (x, y) fits are drawn along the bottom and left edges
+    def beam(self, gray, centroid=None, aperture=None, x0=0, y0=0, profiles=None, fits=(None, None)):
+        small = self.gray(gray, x0, y0)
+        #gray to 3 channels and the table lookup in place, both without temporaries
+        #(np.take would convert the gray values to a full size index array first)
+        beam = cv2.cvtColor(small, cv2.COLOR_GRAY2BGR, dst=self.beam_small)
+        beam = cv2.LUT(beam, self.lut3, dst=beam)
+        #centroid line tracking
+        if centroid is not None:
+            cx, cy = round(centroid[0]/self.scale), round(centroid[1]/self.scale)
+            thickness = max(1, round(5/self.scale))
+            cv2.line(beam, (cx,0), (cx,self.h), (0,0,0), thickness=thickness)
+            cv2.line(beam, (0,cy), (self.w,cy), (0,0,0), thickness=thickness)
+        #aperture outline
+        if aperture is not None:
+            aperture.draw(beam, self.scale, (0,0,0), 2)
+        if profiles is not None:
+            draw_profiles(beam, profiles, self.scale, fits, self.pixel_um)
+        return beam
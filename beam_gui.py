@@ -9,26 +9,51 @@
 #GitHub project link: https://github.com/koopaduo2/Beam-GUI
 
 #required imports
+import time
+#process start, the reference of the startup and time to first frame figures
+T_START = time.perf_counter()
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import QThread
 import numpy as np
-import matplotlib.pyplot as plt
 import cv2
 import os
 import datetime
-from picamera.array import PiRGBArray
-from picamera import PiCamera
-import time
 import math
+from beam_analysis import BeamAnalyzer
+from beam_aperture import Aperture, SHAPES
+from beam_source import PiCameraSource, SyntheticSource, FileSource, import_picamera, configure_camera
+from beam_raw import RawSource, PiRawSource, SyntheticRawSource
+from beam_writer import SaveJob, SaveWriter, submit_save
+from beam_log import StatsLog, FrameArchive, LOG_COLUMNS
+from beam_display import BeamDisplay, colormap, colorbar_image
+from beam_roi import BeamTracker
+from beam_timing import StageTimer, STAGES
+from beam_buffers import BufferPool, MemoryMonitor
+from beam_accumulate import FrameAccumulator, RunningStats, max_window_frames
+from beam_background import Background, BACKGROUND_MODES
+from beam_spots import SpotFinder, SPOT_COLUMNS
+from beam_profiles import fit_profiles
+from beam_caustic import Caustic, SimulatedStage
 
 #ignore command line warnings
 import warnings
 warnings.filterwarnings("ignore")
 
+#results kept as a running mean ± σ while "Mean ± σ" is checked
+RUNNING_FIELDS = ["power", "centroid_x", "centroid_y", "d4x", "d4y"]
+
+#columns of the "Spots" table
+SPOT_TABLE = ["Spot", "x (px)", "y (px)", "D4σx (μm)", "D4σy (μm)", "Share (%)", "Power (mW)", "Saturated"]
+
+#columns of the "M²" table (one row per measured z position)
+CAUSTIC_TABLE = ["z (mm)", "D4σx (μm)", "σ x (μm)", "D4σy (μm)", "σ y (μm)", "Frames"]
+
 #main GUI window definitions
 class Ui_MainWindow(object):
     #set camera resolution which will be passed through the whole program
     W, H = 2592,1944
+    #optional directory or glob of saved camera images to replay instead of the camera
+    source_path = None
     
     #setup UI elements
     def setupUi(self, MainWindow):
@@ -63,6 +88,14 @@ class Ui_MainWindow(object):
         self.tab_2 = QtWidgets.QWidget()
         self.tab_2.setObjectName("tab_2")
         self.tabWidget.addTab(self.tab_2, "")
+        #third tab is for "Spots" (multi-spot mode)
+        self.tab_3 = QtWidgets.QWidget()
+        self.tab_3.setObjectName("tab_3")
+        self.tabWidget.addTab(self.tab_3, "")
+        #fourth tab is for "M²" (caustic scans)
+        self.tab_4 = QtWidgets.QWidget()
+        self.tab_4.setObjectName("tab_4")
+        self.tabWidget.addTab(self.tab_4, "")
         MainWindow.setCentralWidget(self.centralwidget)
         self.menubar = QtWidgets.QMenuBar(MainWindow)
         self.menubar.setGeometry(QtCore.QRect(0, 0, 943, 21))
@@ -97,7 +130,7 @@ class Ui_MainWindow(object):
         self.label_centroid = QtWidgets.QLabel(self.tab_2)
         self.label_centroid.setFont(QtGui.QFont('Any',12))
         self.label_centroid.setText("Centroid (x,y) = 0, 0")
-        self.label_centroid.setGeometry(QtCore.QRect(550, 540, 250, 30))
+        self.label_centroid.setGeometry(QtCore.QRect(550, 540, 235, 30))
         self.label_dx = QtWidgets.QLabel(self.tab_2)
         self.label_dx.setGeometry(QtCore.QRect(20,230,101,41))
         self.lcdNumber_dx = QtWidgets.QLCDNumber(self.tab_2)
@@ -126,6 +159,75 @@ class Ui_MainWindow(object):
         self.lineEdit_apr = QtWidgets.QLineEdit(self.tab_2)
         self.lineEdit_apr.setGeometry(QtCore.QRect(20, 530, 80, 40))
         self.lineEdit_apr.setText(str(int(self.H / 2 - 100)))
+        #aperture shape. For an ellipse or rectangle the radius box takes "rx,ry"
+        self.comboBox_aps = QtWidgets.QComboBox(self.tab_2)
+        self.comboBox_aps.setGeometry(QtCore.QRect(20, 575, 80, 25))
+        self.comboBox_aps.addItems(SHAPES)
+        #automatic beam tracking region of interest (replaces the aperture while checked)
+        self.checkBox_roi = QtWidgets.QCheckBox(self.tab_2)
+        self.checkBox_roi.setGeometry(QtCore.QRect(460, 540, 90, 30))
+        #background subtraction mode and dark reference capture (block the beam before pressing "Dark")
+        self.comboBox_bg = QtWidgets.QComboBox(self.tab_2)
+        self.comboBox_bg.setGeometry(QtCore.QRect(125, 543, 80, 25))
+        self.comboBox_bg.addItems(BACKGROUND_MODES)
+        self.pushButton_dark = QtWidgets.QPushButton(self.tab_2)
+        self.pushButton_dark.setGeometry(QtCore.QRect(790, 538, 96, 25))
+        #number of frames averaged before the analysis (1 analyzes every frame on its own)
+        self.spinBox_avg = QtWidgets.QSpinBox(self.tab_2)
+        self.spinBox_avg.setGeometry(QtCore.QRect(790, 565, 96, 25))
+        #the "window" average keeps its frames and is limited by their memory (16-bit raw frames at worst)
+        self.spinBox_avg.setRange(1, 256 if captureThread.accumulate_mode == "exponential" else \
+            min(max_window_frames((self.H, self.W), np.uint16), 256))
+        #running mean ± σ of the results, restarted every time the box is checked
+        self.checkBox_stats = QtWidgets.QCheckBox(self.tab_2)
+        self.checkBox_stats.setGeometry(QtCore.QRect(125, 565, 90, 25))
+        self.label_running = QtWidgets.QLabel(self.tab_2)
+        self.label_running.setGeometry(QtCore.QRect(215, 565, 570, 25))
+        #multi-spot mode: all spots are analyzed in their own windows (replaces the aperture and Auto ROI)
+        #the spot with the largest power share is shown on the "Beam" tab, every spot in the table
+        self.checkBox_spots = QtWidgets.QCheckBox(self.tab_3)
+        self.checkBox_spots.setGeometry(QtCore.QRect(20, 20, 120, 25))
+        self.tableWidget_spots = QtWidgets.QTableWidget(self.tab_3)
+        self.tableWidget_spots.setGeometry(QtCore.QRect(20, 55, 860, 520))
+        self.tableWidget_spots.setColumnCount(len(SPOT_TABLE))
+        self.tableWidget_spots.setHorizontalHeaderLabels(SPOT_TABLE)
+        self.tableWidget_spots.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        #M² mode: D4σ is averaged at each z position (entered manually, or stepped by the stand-in stage with
+        #"Scan" as "start,step,count" in mm) and the caustic is refitted after every position
+        self.label_z = QtWidgets.QLabel(self.tab_4)
+        self.label_z.setGeometry(QtCore.QRect(20, 20, 50, 25))
+        self.lineEdit_z = QtWidgets.QLineEdit(self.tab_4)
+        self.lineEdit_z.setGeometry(QtCore.QRect(70, 20, 70, 25))
+        self.lineEdit_z.setText("0")
+        self.pushButton_z = QtWidgets.QPushButton(self.tab_4)
+        self.pushButton_z.setGeometry(QtCore.QRect(145, 20, 75, 25))
+        self.spinBox_m2 = QtWidgets.QSpinBox(self.tab_4)
+        self.spinBox_m2.setGeometry(QtCore.QRect(230, 20, 105, 25))
+        self.spinBox_m2.setRange(1, 1000)
+        self.spinBox_m2.setValue(10)
+        self.label_wl = QtWidgets.QLabel(self.tab_4)
+        self.label_wl.setGeometry(QtCore.QRect(345, 20, 50, 25))
+        self.lineEdit_wl = QtWidgets.QLineEdit(self.tab_4)
+        self.lineEdit_wl.setGeometry(QtCore.QRect(395, 20, 60, 25))
+        self.lineEdit_wl.setText("632.8")
+        self.lineEdit_scan = QtWidgets.QLineEdit(self.tab_4)
+        self.lineEdit_scan.setGeometry(QtCore.QRect(470, 20, 110, 25))
+        self.lineEdit_scan.setText("-100,10,21")
+        self.pushButton_scan = QtWidgets.QPushButton(self.tab_4)
+        self.pushButton_scan.setGeometry(QtCore.QRect(585, 20, 60, 25))
+        self.pushButton_m2clear = QtWidgets.QPushButton(self.tab_4)
+        self.pushButton_m2clear.setGeometry(QtCore.QRect(730, 20, 70, 25))
+        self.pushButton_m2save = QtWidgets.QPushButton(self.tab_4)
+        self.pushButton_m2save.setGeometry(QtCore.QRect(810, 20, 70, 25))
+        self.tableWidget_caustic = QtWidgets.QTableWidget(self.tab_4)
+        self.tableWidget_caustic.setGeometry(QtCore.QRect(20, 55, 560, 520))
+        self.tableWidget_caustic.setColumnCount(len(CAUSTIC_TABLE))
+        self.tableWidget_caustic.setHorizontalHeaderLabels(CAUSTIC_TABLE)
+        self.tableWidget_caustic.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.label_m2 = QtWidgets.QLabel(self.tab_4)
+        self.label_m2.setGeometry(QtCore.QRect(595, 55, 290, 300))
+        self.label_m2.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+        self.label_m2.setWordWrap(True)
         
         #widgets for saving data
         self.pushButton_S = QtWidgets.QPushButton(MainWindow)
@@ -137,17 +239,24 @@ class Ui_MainWindow(object):
         #create an image frame for raw image (downsampled)
         #the image frame hosts the "Camera" tab image
         #the beam frame hosts the "Beam" tab image + processing
-        #the cb frame hosts the colorbar (manual containment to insert colorbar). Requires cb.png in root directory
+        #the cb frame hosts the colorbar (manual containment to insert colorbar)
         self.image_frame = QtWidgets.QLabel(self.tab)
         self.beam_frame = QtWidgets.QLabel(self.tab_2)
+        #images are downsampled by scale factor 4 to fit on the GUI screen
+        self.image_frame.move(125,60)
+        self.image_frame.resize(int(self.W/4),int(self.H/4))
+        self.beam_frame.move(125,60)
+        self.beam_frame.resize(int(self.W/4),int(self.H/4))
         self.cb_frame = QtWidgets.QLabel(self.tab_2)
-        #cb.png is required to manually place a colorbar (containment for cv2 heat map and colorbar)
-        colorbar = cv2.imread("cb.png")
-        colorbar = cv2.cvtColor(colorbar, cv2.COLOR_RGB2BGR)
+        #the colorbar is drawn in memory from the beam map's lookup table (relabeled for raw frames on Run)
         self.cb_frame.move(790,49)
-        imGUI = QtGui.QImage(colorbar.data, colorbar.shape[1], colorbar.shape[0], \
-        colorbar.shape[1]*3, QtGui.QImage.Format_RGB888)
-        self.cb_frame.setPixmap(QtGui.QPixmap.fromImage(imGUI))
+        self.show_colorbar(255)
+        #progress of the camera initialization, shown in the status bar until the first frame
+        self.progressBar = QtWidgets.QProgressBar(MainWindow)
+        self.progressBar.setMaximumWidth(150)
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setVisible(False)
+        self.statusbar.addPermanentWidget(self.progressBar)
         
         self.retranslateUi(MainWindow)
         self.tabWidget.setCurrentIndex(0)
@@ -156,6 +265,11 @@ class Ui_MainWindow(object):
         self.pushButton_P.clicked.connect(self.cal)
         self.pushButton_S.clicked.connect(self.save)
         self.pushButton_L.clicked.connect(self.log)
+        self.pushButton_dark.clicked.connect(self.dark)
+        self.pushButton_z.clicked.connect(self.measure_z)
+        self.pushButton_scan.clicked.connect(self.scan)
+        self.pushButton_m2clear.clicked.connect(self.clear_caustic)
+        self.pushButton_m2save.clicked.connect(self.export_caustic)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
 
     #set text for GUI elements
@@ -166,6 +280,16 @@ class Ui_MainWindow(object):
         self.pushButton.setText(_translate("MainWindow", "Run"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab), _translate("MainWindow", "Camera"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_2), _translate("MainWindow", "Beam"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_3), _translate("MainWindow", "Spots"))
+        self.checkBox_spots.setText(_translate("MainWindow", "Multi-spot"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_4), _translate("MainWindow", "M²"))
+        self.label_z.setText(_translate("MainWindow", "z (mm)"))
+        self.pushButton_z.setText(_translate("MainWindow", "Measure"))
+        self.spinBox_m2.setPrefix(_translate("MainWindow", "Frames "))
+        self.label_wl.setText(_translate("MainWindow", "λ (nm)"))
+        self.pushButton_scan.setText(_translate("MainWindow", "Scan"))
+        self.pushButton_m2clear.setText(_translate("MainWindow", "Clear"))
+        self.pushButton_m2save.setText(_translate("MainWindow", "Export"))
         self.label_P.setText(_translate("MainWindow", "Power (mW)"))
         self.pushButton_P.setText(_translate("MainWindow", "Cal (mW)"))
         self.label_dx.setText(_translate("MainWindow", "D4σx (μm)"))
@@ -175,30 +299,128 @@ class Ui_MainWindow(object):
         self.label_apr.setText(_translate("MainWindow", "Ap. Radius"))
         self.pushButton_S.setText(_translate("MainWindow", "Save"))
         self.pushButton_L.setText(_translate("MainWindow", "Log"))
+        self.checkBox_roi.setText(_translate("MainWindow", "Auto ROI"))
+        self.spinBox_avg.setPrefix(_translate("MainWindow", "Avg "))
+        self.checkBox_stats.setText(_translate("MainWindow", "Mean ± σ"))
+        self.pushButton_dark.setText(_translate("MainWindow", "Dark"))
 
     #run image acquisition and processing thread
     RUNNING = False
     def run(self):
         if not self.RUNNING:
-            self.threadA = captureThread(self, self.W, self.H)
+            self.threadA = captureThread(self, self.W, self.H, self.source_path)
+            #the thread hands images and text to the GUI through signals (widgets are only touched here)
+            self.threadA.camera_image.connect(lambda imGUI: self.image_frame.setPixmap(QtGui.QPixmap.fromImage(imGUI)))
+            self.threadA.beam_image.connect(lambda imGUI: self.beam_frame.setPixmap(QtGui.QPixmap.fromImage(imGUI)))
+            self.threadA.beam_stats.connect(self.show_stats)
+            self.threadA.spot_table.connect(self.show_spots)
+            self.threadA.caustic_result.connect(self.show_caustic)
+            self.threadA.set_text.connect(lambda widget, text: widget.setText(text))
+            self.threadA.enable.connect(lambda widget, enabled: widget.setEnabled(enabled))
+            self.threadA.status.connect(self.statusbar.showMessage)
+            self.threadA.progress.connect(self.show_progress)
+            self.threadA.colorbar.connect(self.show_colorbar)
+            self.connect_controls(self.threadA)
+            #the camera is initialized on the thread, the window stays responsive meanwhile
+            self.progressBar.setValue(0)
+            self.progressBar.setVisible(True)
             self.threadA.start()
             self.RUNNING = True
         else:
             self.lineEdit.setText("System already running")
 
+    #the capture thread never reads widgets: the controls it uses are copied into its attributes now and
+    #again whenever they change (these slots run on the GUI thread)
+    def connect_controls(self, thread):
+        controls = [(self.spinBox_avg.valueChanged, self.spinBox_avg.value, "avg_frames"),
+            (self.comboBox_bg.currentTextChanged, self.comboBox_bg.currentText, "bg_mode"),
+            (self.checkBox_spots.toggled, self.checkBox_spots.isChecked, "MULTI_SPOT"),
+            (self.checkBox_roi.toggled, self.checkBox_roi.isChecked, "AUTO_ROI"),
+            (self.checkBox_stats.toggled, self.checkBox_stats.isChecked, "MEAN_STATS"),
+            (self.spinBox_m2.valueChanged, self.spinBox_m2.value, "caustic_frames"),
+            (self.lineEdit_wl.textChanged, self.lineEdit_wl.text, "wavelength_text"),
+            (self.lineEdit_apx.textChanged, self.lineEdit_apx.text, "apx_text"),
+            (self.lineEdit_apy.textChanged, self.lineEdit_apy.text, "apy_text"),
+            (self.lineEdit_apr.textChanged, self.lineEdit_apr.text, "apr_text"),
+            (self.comboBox_aps.currentTextChanged, self.comboBox_aps.currentText, "aperture_shape")]
+        for signal, value, name in controls:
+            setattr(thread, name, value())
+            signal.connect(lambda value, name=name: setattr(thread, name, value))
+
+    #stop the capture thread when the GUI quits (releases the camera, the workers and their shared memory)
+    def quit(self):
+        if self.RUNNING:
+            self.threadA.STOP = True
+            self.threadA.wait(5000)
+
+    #fill the "Spots" table with the rows emitted by captureThread (lists of strings in SPOT_TABLE order)
+    def show_spots(self, rows):
+        table = self.tableWidget_spots
+        table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                table.setItem(r, c, QtWidgets.QTableWidgetItem(value))
+
+    #fill the "M²" table and fit results with the dict emitted by captureThread ("rows" in CAUSTIC_TABLE order,
+    #"text" of the fits)
+    def show_caustic(self, result):
+        table = self.tableWidget_caustic
+        table.setRowCount(len(result["rows"]))
+        for r, row in enumerate(result["rows"]):
+            for c, value in enumerate(row):
+                table.setItem(r, c, QtWidgets.QTableWidgetItem(value))
+        self.label_m2.setText(result["text"])
+
+    #show the progress of the camera initialization (hidden once the first frame is shown at 100)
+    def show_progress(self, percent, text):
+        self.progressBar.setValue(percent)
+        self.progressBar.setVisible(percent < 100)
+        self.lineEdit.setText(text)
+
+    #draw the colorbar of the beam map for frames of full scale max_value
+    def show_colorbar(self, max_value):
+        colorbar = colorbar_image(max_value=max_value)
+        imGUI = QtGui.QImage(colorbar.data, colorbar.shape[1], colorbar.shape[0], \
+        colorbar.shape[1]*3, QtGui.QImage.Format_RGB888)
+        self.cb_frame.setPixmap(QtGui.QPixmap.fromImage(imGUI))
+
+    #show the beam statistics emitted by captureThread
+    def show_stats(self, stats):
+        self.lcdNumber_P.display(round(stats["power"]))
+        self.label_sat.setText("# Saturated Pixels: "+str(stats["sat_num"]))
+        self.label_centroid.setText("Centroid x,y: "+str(round(stats["centroid_x"]))+", "+str(round(stats["centroid_y"])))
+        self.lcdNumber_dx.display(round(stats["d4x"]))
+        self.lcdNumber_dy.display(round(stats["d4y"]))
+        running = stats.get("running")
+        if running is not None:
+            P, cx, cy, dx, dy = [running[field] for field in RUNNING_FIELDS]
+            self.label_running.setText("n=%d  P %.3g±%.2g mW  D4σx %.1f±%.1f μm  D4σy %.1f±%.1f μm  x,y %.1f±%.1f, %.1f±%.1f" \
+                % ((stats["running_n"],) + P + dx + dy + cx + cy))
+        elif stats.get("fit_x") is not None and stats.get("fit_y") is not None:
+            #1/e² diameters of the profile fits next to D4σ
+            self.label_running.setText("1/e² fit x, y: %.1f, %.1f μm" % (stats["fit_x"], stats["fit_y"]))
+        else:
+            self.label_running.setText("")
+
     def cal(self):
         if not self.RUNNING:
             self.lineEdit.setText("Run the system before calibrating power measurement")
         else:
-            if self.lineEdit_P.text() != "0":
-                self.threadA.cal()
+            try:
+                measured_P = float(self.lineEdit_P.text())
+            except ValueError:
+                measured_P = 0
+            if measured_P != 0:
+                self.threadA.cal(measured_P)
             else:
                 self.lineEdit.setText("Input reading from real power meter to calibrate")
                 
     def log(self):
         if self.RUNNING:
             if not self.threadA.LOGGING:
-                self.threadA.SAVE_NOW = True
+                #streaming logs only append rows, "files" mode saves everything for every frame
+                if self.threadA.LOG_MODE == "files":
+                    self.threadA.SAVE_NOW = True
                 self.threadA.LOGGING = True
                 self.pushButton_L.setText("Stop")
             else:
@@ -217,291 +439,750 @@ class Ui_MainWindow(object):
         else:
             self.lineEdit.setText("Run the system before saving data")
 
+    #average a new dark reference (the beam must be blocked)
+    def dark(self):
+        if self.RUNNING:
+            self.threadA.DARK_NOW = True
+            self.lineEdit.setText("Capturing dark reference, keep the beam blocked")
+        else:
+            self.lineEdit.setText("Run the system before capturing a dark reference")
+
+    #average the caustic position entered in the z box (replaces an earlier measurement at the same z)
+    def measure_z(self):
+        if not self.RUNNING:
+            self.lineEdit.setText("Run the system before measuring the caustic")
+            return
+        try:
+            z = float(self.lineEdit_z.text())
+        except ValueError:
+            self.lineEdit.setText("Input the z position (mm) to measure")
+            return
+        self.threadA.CAUSTIC_Z = z
+        self.lineEdit.setText("Measuring z = %g mm" % z)
+
+    #step the stand-in stage through "start,step,count" (mm) and measure every position
+    def scan(self):
+        if not self.RUNNING:
+            self.lineEdit.setText("Run the system before scanning the caustic")
+            return
+        try:
+            start, step, count = [float(value) for value in self.lineEdit_scan.text().split(",")]
+        except ValueError:
+            self.lineEdit.setText("Input the scan as start,step,count (mm)")
+            return
+        self.threadA.CAUSTIC_SCAN = (start, step, int(count))
+        self.lineEdit.setText("Scanning %d positions from z = %g mm" % (count, start))
+
+    def clear_caustic(self):
+        if self.RUNNING:
+            self.threadA.CAUSTIC_CLEAR = True
+
+    def export_caustic(self):
+        if self.RUNNING:
+            self.threadA.CAUSTIC_SAVE = True
+
 #thread which handles live image acquisition and beam image processing
 #runs separately from main GUI thread to prevent hang ups
 class captureThread(QThread):
+    #signals which hand results to the GUI thread
+    camera_image = QtCore.pyqtSignal(QtGui.QImage) #downsampled "Camera" tab image
+    beam_image = QtCore.pyqtSignal(QtGui.QImage) #downsampled "Beam" tab image
+    beam_stats = QtCore.pyqtSignal(object) #dict of the displayed beam statistics
+    spot_table = QtCore.pyqtSignal(object) #rows of the "Spots" table
+    caustic_result = QtCore.pyqtSignal(object) #rows of the "M²" table and text of the caustic fits
+    set_text = QtCore.pyqtSignal(object, str) #set the text of a widget
+    enable = QtCore.pyqtSignal(object, bool) #enable or disable a widget
+    status = QtCore.pyqtSignal(str) #status bar message
+    progress = QtCore.pyqtSignal(int, str) #camera initialization progress (percent) and message
+    colorbar = QtCore.pyqtSignal(int) #full scale value of the frames, to relabel the colorbar
     #variables which can be accessed across functions and threads
     image_live = np.empty(1) #live camera image
     camera = None #camera variable for PiCamera
     rawCapture = None #rawCapture variable for PiCamera
+    CONTINUOUS = True #capture continuously from the video port into a ring buffer (False uses single still captures)
+    ring_slots = 4 #number of preallocated frame buffers in the ring
+    drop_policy = "latest" #"latest" processes the newest frame and drops stale ones, "fifo" processes frames in order
+    source = None #frame source (Pi camera, synthetic or saved files) which fills the ring
+    ring = None #ring buffer of captured frames
+    frame_seq, frame_time = 0, 0 #sequence number and monotonic timestamp of the current frame
+    frame_x0, frame_y0 = 0, 0 #top left corner of the current frame on the sensor (non zero when zoomed)
+    tracker = None #BeamTracker for the automatic region of interest (3 x D4σ window following the beam)
+    spot_finder = None #SpotFinder which analyzes and tracks every spot while "Multi-spot" is checked
+    ZOOM_ROI = False #with Auto ROI, also zoom the Pi camera sensor to the tracked window
+    timer = None #StageTimer with rolling per stage timings, shown in the status bar
+    LOG_TIMING = False #also append the per stage timings (and resident memory) to the streaming log
+    buffers = None #BufferPool with the reused frame sized arrays, nothing frame sized is allocated per frame
+    memory = None #MemoryMonitor sampling the resident memory after every frame
+    accumulator = None #FrameAccumulator averaging the frames while the "Avg" box is above 1
+    accumulate_mode = "exponential" #"exponential" (moving average, weight 1/N, constant memory) or "window" (average
+                                    #of the last N frames, keeps N frames within beam_accumulate.WINDOW_BYTES)
+    running = None #RunningStats of the results while "Mean ± σ" is checked
+    background = None #Background with the dark references, saved to and reloaded from ./backgrounds
+    DARK_NOW = False #flag to average the next frames into a new dark reference
+    dark_frames = 32 #frames averaged into a dark reference
+    bg_level = 0 #background level subtracted from the last frame on top of the dark reference
+    PARALLEL = 0 #number of analysis worker processes (0 analyzes on this thread). Needs CONTINUOUS, no Auto ROI
+    tiles = 1 #with PARALLEL, split each frame into this many strips reduced by parallel threads (very large frames)
+    parallel = None #ParallelAnalyzer running the worker processes
+    parallel_timeout = 10 #seconds to wait for a worker result before the workers are considered hung
+    STOP = False #flag to stop the capture loop and release the camera, workers and shared memory (on quit)
+    writer = None #background writer which saves and logs data off the capture thread
+    save_policy = "drop_oldest" #backpressure while logging: "block", "drop_oldest" or "decimate"
+    save_decimate = 1 #with the "decimate" policy only every n-th logged frame is written
+    save_queue = 8 #maximum number of frames waiting to be written
+    LOG_MODE = "stream" #"stream" appends one row per frame to a single log file, "files" saves all files per frame
+    LOG_FRAMES = False #in stream mode also archive the grayscale frames to chunked .npy files
+    stats_log = None #open StatsLog while stream logging
+    frame_archive = None #open FrameArchive while stream logging with LOG_FRAMES
+    spots_log = None #open per spot StatsLog (SPOT_COLUMNS) while stream logging in multi-spot mode
+    PROFILES = True #compute the marginal x/y profiles in the moments pass, draw them and fit their 1/e² widths
+    profile_fit = "gaussian" #profile fit model: "gaussian" or "super-gaussian" (see beam_profiles.FITS)
+    LOG_PROFILES = True #in stream mode also log the fitted widths and archive the profiles to chunked .npy files
+    profile_archives = None #open (x, y) profile FrameArchives while stream logging with LOG_PROFILES
+    caustic = None #Caustic of the M² mode: averaged D4σ per z position and incremental fits, no images kept
+    stage = None #SimulatedStage stepping through a scan started with "Scan" (None while z is entered manually)
+    CAUSTIC_Z = None #z position (mm) to measure next, set from the "M²" tab
+    CAUSTIC_SCAN = None #(start, step, count) of a stand-in stage scan to start, set from the "M²" tab
+    CAUSTIC_CLEAR, CAUSTIC_SAVE = False, False #flags to clear or export the caustic once
     MainWindow = None #MainWindow passed to thread so thread can modify UI elements
+    #state of the controls, copied from the widgets on the GUI thread (see Ui_MainWindow.connect_controls)
+    avg_frames = 1 #"Avg" frames averaged
+    bg_mode = "off" #background mode (beam_background.BACKGROUND_MODES)
+    MULTI_SPOT = False #"Multi-spot" checked
+    AUTO_ROI = False #"Auto ROI" checked
+    MEAN_STATS = False #"Mean ± σ" checked
+    caustic_frames = 10 #frames averaged per caustic position
+    wavelength_text = "632.8" #wavelength (nm) box of the "M²" tab
+    apx_text, apy_text, apr_text = "", "", "" #aperture x, y and radius boxes
+    aperture_shape = "circle" #aperture shape (beam_aperture.SHAPES)
     SAVE_NOW = False #flag to save all data once
     LOGGING = False #flag to continuously log data
-    FRAMES_INIT = False #used to set camera and beam frame sizes and locations to draw images on
+    display = None #BeamDisplay which renders the downsampled GUI images
+    display_fps = 15 #maximum GUI refresh rate, independent of the analysis rate
+    DISPLAY_NOW = False #set once per frame when the GUI is due for a refresh
     pix_sum, factor_P, pix_max, sat_num = 0,0,0,0 #used for power meter calibration, estimation and detecting saturation
     sat_num_allowed = 20 #number of allowed saturated pixels before considering the beam profile 'saturated'
     count_x,count_y,count_r = 0,0,0 #used to reset aperture values if input is left blank
     mask_x, mask_y, mask_r = 1296,972,880 #mask values for digital aperture. Changes based on text input
+    mask_ry = 880 #y radius of an elliptical or rectangular aperture
+    aperture = None #cached digital aperture (see beam_aperture.py), only rebuilt when the aperture changes
     W = 0 #camera/image width to be set
     H = 0 #camera/image height to be set
     pixel_um = 1.55 #multiply a pixel width by 1.55 micron to get physical width #SENSOR DEPENDENT
+    analyzer = None #BeamAnalyzer which computes the beam statistics (Qt-free, see beam_analysis.py)
+    RAW_BITS = 0 #10 or 12: analyze the sensor's raw Bayer data as 16-bit luminance frames (still port, full
+                 #sensor resolution), 0: 8-bit frames from the video port
+    sat_level = 255 #gray value counted as saturated (2**RAW_BITS - 1 for raw frames)
+    run_time = 0 #time.perf_counter() when Run was pressed
+    first_frame_s = None #seconds from Run to the first displayed frame (time to first frame)
+    init_message = "" #outcome of the frame source initialization, shown in the info bar
 
     
-    #initialize camera and set main window for interaction between thread and MainWindow
-    def __init__(self, MainWindow, W, H):
+    #set main window for interaction between thread and MainWindow
+    #the camera itself is initialized when the thread runs (see init_source), not on the GUI thread
+    def __init__(self, MainWindow, W, H, source_path=None):
         QThread.__init__(self)
+        self.run_time = time.perf_counter()
         #set the camera resolution
         self.W, self.H = W, H
         self.MainWindow = MainWindow
-        self.init_camera()
+        self.source_path = source_path
+        self.aperture = Aperture(self.mask_x, self.mask_y, self.mask_r)
+        self.timer = StageTimer()
+        self.buffers = BufferPool()
+        self.memory = MemoryMonitor()
+        self.background = Background(self.W, self.H, os.path.join(os.getcwd(), "backgrounds"), self.dark_frames)
+        self.caustic = Caustic()
 
+    #open the frame source (camera, synthetic beam or saved images) and set up the analysis for its frames
+    #runs on this thread, the progress is shown in the status bar
+    def init_source(self):
+        if self.source_path is not None:
+            #replay saved images instead of using the camera
+            self.CONTINUOUS = True
+            self.source = FileSource(self.source_path, self.W, self.H)
+            self.init_message = "Replaying saved images from: "+self.source_path
+        else:
+            self.progress.emit(10, "Loading camera driver...")
+            PiCamera, PiRGBArray = import_picamera()
+            if PiCamera is None:
+                #no Pi camera available, run the pipeline on a synthetic beam
+                self.CONTINUOUS = True
+                self.source = SyntheticRawSource(self.W, self.H, self.RAW_BITS) if self.RAW_BITS \
+                    else SyntheticSource(self.W, self.H)
+                self.init_message = "No camera found! Image processing system running on a synthetic beam"
+            else:
+                self.init_camera(PiCamera, PiRGBArray)
+        #saturation, detection threshold and display scaling follow the bit depth of the frames
+        if isinstance(self.source, RawSource):
+            self.sat_level = 2**self.source.bits - 1
+            self.colorbar.emit(self.sat_level)
+        self.analyzer = BeamAnalyzer(self.pixel_um, self.sat_level)
+        self.tracker = BeamTracker(self.W, self.H, self.pixel_um, detect_level=10*self.sat_level/255)
+        self.display = BeamDisplay(self.W, self.H, 4, self.display_fps, self.sat_level, self.pixel_um)
+        self.progress.emit(90, self.init_message)
 
     #capture live images and convert to beam profile
     def run(self):
-        while(1):
-            self.live_image()
-            self.beam()
+        self.init_source()
+        if self.CONTINUOUS and self.PARALLEL:
+            self.run_parallel()
+            return
+        if self.CONTINUOUS:
+            self.ring = self.source.start(self.ring_slots, self.drop_policy)
+        try:
+            while not self.STOP:
+                self.timer.start()
+                self.live_image()
+                self.beam()
+                self.timer.end()
+                self.memory.sample()
+        finally:
+            self.close()
+
+    #stop the frame source and finish the logs and queued saves
+    def close(self):
+        if self.ring is not None:
+            self.source.stop()
+        if self.stats_log is not None:
+            self.stop_log_stream()
+        if self.writer is not None:
+            self.writer.flush()
     
-    #initialize camera settings
-    def init_camera(self):
+    #capture into shared memory and analyze the frames in PARALLEL worker processes
+    #the workers also prepare the downsampled display images, this thread only publishes the results in order
+    #the workers analyze the aperture of the raw frames only: averaging, background subtraction, multi-spot,
+    #Auto ROI and the profiles are not available, so their controls are disabled instead of silently ignored
+    def run_parallel(self):
+        #multiprocessing workers are only set up (and imported) when used
+        from beam_parallel import ParallelAnalyzer
+        for widget in (self.MainWindow.spinBox_avg, self.MainWindow.comboBox_bg, self.MainWindow.pushButton_dark, \
+            self.MainWindow.checkBox_spots, self.MainWindow.checkBox_roi):
+            self.enable.emit(widget, False)
+        self.init_message += ". Parallel mode: averaging, background, multi-spot and Auto ROI are disabled"
+        self.ring = self.source.start(max(self.ring_slots, self.PARALLEL + 3), self.drop_policy, shared=True)
+        try:
+            self.parallel = ParallelAnalyzer(self.ring, self.W, self.H, self.PARALLEL, self.tiles, self.pixel_um, \
+                self.sat_level)
+            self.parallel_loop()
+        finally:
+            #the source must stop writing to the shared frames before they are freed
+            self.close()
+            if self.parallel is not None:
+                self.parallel.close()
+                self.parallel = None
+            self.ring.unlink()
+
+    def parallel_loop(self):
+        while not self.STOP:
+            #keep every worker busy with the newest frames
+            while self.parallel.in_flight() < self.PARALLEL:
+                frame = self.ring.get(0 if self.parallel.in_flight() else 1.0, retain=True)
+                if frame is None:
+                    break
+                self.read_aperture()
+                ap = self.aperture
+                self.parallel.submit(frame, (ap.x, ap.y, ap.rx, ap.ry, ap.shape), self.display.due())
+            if not self.parallel.in_flight():
+                continue
+            self.timer.start()
+            #raises if a worker died, None if the workers stopped answering
+            result = self.parallel.next_result(self.parallel_timeout)
+            if result is None:
+                raise RuntimeError("No analysis result in %g s, the workers are hung" % self.parallel_timeout)
+            self.timer.mark("capture")
+            self.timer.add("moments", result.busy_ns)
+            frame = result.frame
+            self.image_live = frame.image
+            self.frame_seq, self.frame_time = frame.seq, frame.timestamp
+            self.frame_x0, self.frame_y0 = frame.x0, frame.y0
+            self.DISPLAY_NOW = result.render
+            beam_R = None
+            if result.render:
+                camera_R, beam_R = self.parallel.display_images(result)
+                self.camera_image.emit(self.to_qimage(camera_R))
+                self.timer.mark("qt")
+            self.publish(None, result.stats, self.aperture, beam_R)
+            #the frame slot can be reused once the result has been published
+            self.ring.release(frame.slot)
+            self.timer.end()
+            self.memory.sample()
+
+    #initialize camera settings (PiCamera and PiRGBArray are the classes returned by import_picamera)
+    def init_camera(self, PiCamera, PiRGBArray):
         #initialize the PiCamera and PiRGBArray
+        self.progress.emit(30, "Opening camera...")
         camera = PiCamera()
         camera.resolution = (self.W,self.H)
         rawCapture = PiRGBArray(camera, size=(self.W,self.H))
+        #let the sensor settle (this thread only, the GUI keeps running)
         time.sleep(0.1)
-        #configure settings for the camera
-        #these settings were chosen to minimize exposure and gain for laser profiling
-        #even at minimum settings, the camera will most likely need a variable ND filter
-        camera.awb_mode = 'off' #AWB mode
-        camera.awb_gains = (3.1,3.1) #manual AWB gain settings
-        camera.brightness = 50 #Image brightness
-        camera.meter_mode = 'backlit' #Metering mode
-        camera.exposure_mode = 'off' #Prevent auto exposure so results are consistent
-        camera.exposure_compensation = 0 #Exposure compensation
-        camera.shutter_speed = 10 #Minimum shutter speed
-        #vflip should be set to True since the camera sensor is lensless and will not have the image inverted
-        #hflip can be set to True or False depending on how you want the image to move as you physically move
-        #the beam spot location on the sensor. It is ultimately an alignment convention
-        camera.vflip = True
-        camera.hflip = False
-        camera.iso = 1
-        camera.saturation = 0
-        #If ZOOM_BOOL is set to True, the camera capture will be zoomed in to a Region of Interest
-        #The ROI will be the full Field of View cropped by a ratio of crop_factor
-        #the roi_start_x, roi_start_y are the origin (top left corner) of the ROI
-        ZOOM_BOOL = False
-        if ZOOM_BOOL:
-            crop_factor = 0.4
-            roi_start_x = (1-crop_factor)/2
-            roi_start_y = (1-crop_factor)/2
-            camera.zoom = (roi_start_x,roi_start_y,crop_factor,crop_factor)
-        #If CAMERA_SETTINGS is set to True, the camera settings will be printed on camera init
-        CAMERA_SETTINGS=True
-        if CAMERA_SETTINGS:
-            print("AWB is "+str(camera.awb_mode))
-            print("AWB gain is "+str(camera.awb_gains))
-            print("Brightness is "+str(camera.brightness))
-            print("Aperture is "+str(camera.exposure_compensation))
-            print("Shutter speed is "+str(camera.shutter_speed))
-            print("Camera exposure speed is "+str(camera.exposure_speed))
-            print("Iso is "+str(camera.iso))
-            print("Camera digital gain is "+str(camera.digital_gain))
-            print("Camera analog gain is "+str(camera.analog_gain))
-            print("Camera v/h flip is "+str(camera.vflip)+", "+str(camera.hflip))
-            print("Camera contrast is "+str(camera.contrast))
-            print("Camera color saturation is "+str(camera.saturation))
-            print("Camera meter mode is "+str(camera.meter_mode))
-            if ZOOM_BOOL:
-                print("Camera crop factor is "+str(crop_factor))
-            else:
-                print("Camera crop is disabled")
+        self.progress.emit(60, "Configuring camera...")
+        #configure settings for the camera (see beam_source.configure_camera)
+        configure_camera(camera)
         #store the camera and capture for use by other functions
         self.camera = camera
         self.rawCapture = rawCapture
-        self.MainWindow.lineEdit.setText("Camera initialized! Image processing system running")
+        self.init_message = "Camera initialized! Image processing system running"
+        if self.RAW_BITS:
+            self.CONTINUOUS = True
+            try:
+                self.source = PiRawSource(camera, self.W, self.H, self.RAW_BITS)
+                return
+            except ValueError as error:
+                #raw frames need the sensor's full resolution, fall back to the 8-bit video port frames
+                self.RAW_BITS = 0
+                self.init_message = str(error)+". Running on 8-bit frames"
+        if self.CONTINUOUS:
+            self.source = PiCameraSource(camera, self.W, self.H)
 
     #capture an image from the camera and store to self.image_live
+    #in continuous mode the newest frame is taken from the ring buffer instead
     def img_capture(self):
-        self.camera.capture(self.rawCapture, format="bgr")
-        self.image_live = self.rawCapture.array
-        self.rawCapture.truncate(0)
+        if self.CONTINUOUS:
+            frame = None
+            while frame is None:
+                frame = self.ring.get(1.0)
+            self.image_live = frame.image
+            self.frame_seq, self.frame_time = frame.seq, frame.timestamp
+            self.frame_x0, self.frame_y0 = frame.x0, frame.y0
+        else:
+            self.camera.capture(self.rawCapture, format="bgr")
+            self.image_live = self.rawCapture.array
+            self.rawCapture.truncate(0)
+            self.frame_seq, self.frame_time = self.frame_seq + 1, time.monotonic()
+        self.timer.mark("capture")
     
     #take camera capture and display live on "Camera" tab
     def live_image(self):
-        #time printouts can be used for runtime optimization which directly translates to framerate of images
-        #A = datetime.datetime.now()
-        
         #take a raw capture
         self.img_capture()
-        #downsample the image by scale factor 4 to fit on the GUI screen
-        scale = 4
-        imR = cv2.resize(self.image_live, (int(self.W/scale),int(self.H/scale)))
-        #set the image to the proper position on the window if not already done
-        if not self.FRAMES_INIT:
-            self.MainWindow.image_frame.move(125,60)
-            self.MainWindow.image_frame.resize(int(self.W/scale),int(self.H/scale))
-        imGUI = QtGui.QImage(imR.data, imR.shape[1], imR.shape[0], imR.shape[1]*3, QtGui.QImage.Format_RGB888)
-        self.MainWindow.image_frame.setPixmap(QtGui.QPixmap.fromImage(imGUI))
-        #B = datetime.datetime.now()
-        #print("Live image runtime: "+str(B-A))
+        #the GUI is only refreshed at display_fps, analysis runs on every frame
+        self.DISPLAY_NOW = self.display.due()
+        if self.DISPLAY_NOW:
+            #downsample the image by scale factor 4 to fit on the GUI screen
+            imR = self.display.camera(self.image_live, self.frame_x0, self.frame_y0)
+            self.timer.mark("display")
+            self.camera_image.emit(self.to_qimage(imR))
+            self.timer.mark("qt")
     
+    #wrap an RGB image in a QImage. The image buffers are reused, so the QImage owns a copy
+    #(the only per frame allocation left, downsampled and at the display rate)
+    def to_qimage(self, image):
+        return QtGui.QImage(image.data, image.shape[1], image.shape[0], image.strides[0], \
+            QtGui.QImage.Format_RGB888).copy()
+
+    #report the time to first frame once the first beam image is shown: from Run (camera initialization,
+    #first capture and analysis) and from the process start (imports and window setup included)
+    def first_frame(self):
+        now = time.perf_counter()
+        self.first_frame_s = now - self.run_time
+        text = "First frame %.2f s after Run (%.2f s after start)" % (self.first_frame_s, now - T_START)
+        self.progress.emit(100, self.init_message+". "+text)
+
     #calibrate the estimated power meter using a real power meter and pixel sum
 
-    def cal(self):
+    #measured_P is the reading of the real power meter (mW)
+    def cal(self, measured_P):
         #define saturation as having a certain number of fully bright pixels self.sat_num_allowed
         if self.sat_num > self.sat_num_allowed:
-            self.MainWindow.lineEdit.setText("Calibration failed! Image is saturated")
+            self.set_text.emit(self.MainWindow.lineEdit, "Calibration failed! Image is saturated")
         elif 0 < self.pix_max:
-            measured_P = float(self.MainWindow.lineEdit_P.text())
             self.factor_P = measured_P / self.pix_sum
-            self.MainWindow.lineEdit.setText("Power meter calibrated!")
+            self.set_text.emit(self.MainWindow.lineEdit, "Power meter calibrated!")
         else:
-            self.MainWindow.lineEdit.setText("Calibration failed! No beam detected")
+            self.set_text.emit(self.MainWindow.lineEdit, "Calibration failed! No beam detected")
     
+    #append one row per frame to the streaming log (and the frame to the archive if LOG_FRAMES, which starts a
+    #new chunk whenever the frame shape or dtype changes, e.g. with the Auto ROI zoom or averaging)
+    #in multi-spot mode every spot is also appended to a spots_ log
+    #with LOG_PROFILES the fitted 1/e² diameters (μm) are logged and the profiles archived as full width/height
+    #arrays, zero outside the analyzed region (all zero for frames without profiles)
+    def log_stream(self, image, stats, P_estimated, spots=None, profiles=None, fits=(None, None)):
+        if self.stats_log is None:
+            savepath = os.path.join(os.getcwd(), "saves")
+            if not os.path.exists(savepath):
+                os.mkdir(savepath)
+            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            columns = LOG_COLUMNS + (["ms_"+stage for stage in STAGES]+["rss_mb"] if self.LOG_TIMING else []) \
+                + (["fit_d_x", "fit_d_y", "fit_order_x", "fit_order_y"] if self.LOG_PROFILES else [])
+            self.stats_log = StatsLog(os.path.join(savepath, "log_"+timestamp+".csv"), columns)
+            if self.LOG_FRAMES:
+                self.frame_archive = FrameArchive(os.path.join(savepath, "frames_"+timestamp), image.shape, image.dtype)
+            if self.LOG_PROFILES:
+                self.profile_archives = (FrameArchive(os.path.join(savepath, "xprofiles_"+timestamp), (self.W,), \
+                    np.float32, 1024), FrameArchive(os.path.join(savepath, "yprofiles_"+timestamp), (self.H,), \
+                    np.float32, 1024))
+            self.set_text.emit(self.MainWindow.lineEdit, "Data logging to: "+self.stats_log.path)
+        #t and frame describe the same capture (not the time of logging, which lags by the pipeline latency)
+        t = self.frame_time
+        row = [t, self.frame_seq, stats.centroid_x, stats.centroid_y, \
+            stats.d4x, stats.d4y, P_estimated, stats.pix_max, stats.pix_sum, stats.sat_num, \
+            self.aperture.x, self.aperture.y, self.aperture.rx, self.aperture.ry]
+        if self.LOG_TIMING:
+            #stage timings of the previous (completed) frame
+            row.extend(round(float(t), 3) for t in self.timer.last_ms())
+            row.append(round(self.memory.rss_mb, 1))
+        if self.LOG_PROFILES:
+            row.extend(fit.diameter*self.pixel_um if fit is not None else float("nan") for fit in fits)
+            row.extend(fit.order if fit is not None else float("nan") for fit in fits)
+        self.stats_log.append(row)
+        if spots is not None:
+            if self.spots_log is None:
+                path = self.stats_log.path
+                self.spots_log = StatsLog(os.path.join(os.path.dirname(path), \
+                    os.path.basename(path).replace("log_", "spots_", 1)), SPOT_COLUMNS)
+            for spot in spots:
+                spot_stats = spot.stats
+                self.spots_log.append([t, self.frame_seq, spot.id, spot_stats.centroid_x, spot_stats.centroid_y, \
+                    spot_stats.d4x, spot_stats.d4y, spot.share, spot_stats.pix_max, spot_stats.pix_sum, spot_stats.sat_num])
+        if self.frame_archive is not None:
+            self.frame_archive.append(image)
+        if self.profile_archives is not None:
+            for axis, archive in enumerate(self.profile_archives):
+                padded = self.buffers.get(("profile", axis), archive.shape, np.float32)
+                padded.fill(0)
+                if profiles is not None:
+                    start, profile = (profiles.x0, profiles.x) if axis == 0 else (profiles.y0, profiles.y)
+                    n = max(min(len(profile), len(padded) - start), 0)
+                    padded[start:start+n] = profile[:n]
+                archive.append(padded)
+
+    #close the streaming log files
+    def stop_log_stream(self):
+        self.stats_log.close()
+        self.stats_log = None
+        if self.spots_log is not None:
+            self.spots_log.close()
+            self.spots_log = None
+        if self.frame_archive is not None:
+            self.frame_archive.close()
+            self.frame_archive = None
+        if self.profile_archives is not None:
+            for archive in self.profile_archives:
+                archive.close()
+            self.profile_archives = None
+
+    #M² mode: requests from the "M²" tab are picked up here, on this thread. D4σ of every frame is averaged into
+    #the position being measured, the caustic is refitted once it completes and the stand-in stage moves on
+    def caustic_step(self, stats):
+        caustic = self.caustic
+        if self.CAUSTIC_CLEAR:
+            self.CAUSTIC_CLEAR = False
+            self.stage = None
+            caustic.cancel()
+            caustic.clear()
+            self.report_caustic()
+        if self.CAUSTIC_SAVE:
+            self.CAUSTIC_SAVE = False
+            savepath = os.path.join(os.getcwd(), "saves")
+            if not os.path.exists(savepath):
+                os.mkdir(savepath)
+            path = os.path.join(savepath, "caustic_"+datetime.datetime.now().strftime('%Y%m%d_%H%M%S')+".csv")
+            caustic.save(path)
+            self.set_text.emit(self.MainWindow.lineEdit, "Caustic saved to: "+path)
+        #frames still in the capture ring predate the request (and the stage move) and are discarded
+        frames = self.caustic_frames
+        if self.CAUSTIC_SCAN is not None:
+            (start, step, count), self.CAUSTIC_SCAN = self.CAUSTIC_SCAN, None
+            self.read_wavelength()
+            self.stage = SimulatedStage(start, step, count, self.source, self.pixel_um, \
+                wavelength_um=caustic.wavelength_um)
+            caustic.start(self.stage.z, frames, self.ring_slots + 1)
+        elif self.CAUSTIC_Z is not None:
+            z, self.CAUSTIC_Z = self.CAUSTIC_Z, None
+            self.read_wavelength()
+            self.stage = None
+            caustic.start(z, frames, self.ring_slots + 1)
+        point = caustic.add(stats.d4x, stats.d4y)
+        if point is None:
+            return
+        message = "Measured z = %g mm" % point.z
+        if self.stage is not None:
+            if self.stage.next():
+                caustic.start(self.stage.z, frames, self.ring_slots + 1)
+            else:
+                self.stage = None
+                message = "Caustic scan complete"
+        self.set_text.emit(self.MainWindow.lineEdit, message)
+        self.report_caustic()
+
+    #read the wavelength (nm) of the "M²" tab into the caustic (keeps the last valid value)
+    def read_wavelength(self):
+        try:
+            self.caustic.wavelength_um = float(self.wavelength_text)/1000
+        except ValueError:
+            pass
+        self.caustic.refit()
+
+    #emit the "M²" table rows and the fit results of both axes
+    def report_caustic(self):
+        caustic = self.caustic
+        rows = [["%g" % point.z, "%.1f" % point.d4x, "%.1f" % point.std_x, "%.1f" % point.d4y, "%.1f" % point.std_y, \
+            str(point.frames)] for point in caustic.rows()]
+        lines = []
+        for axis, fit in zip("xy", caustic.fits):
+            if fit is None:
+                lines.append(axis+": needs 3 or more positions around the waist")
+                continue
+            near, far = caustic.coverage(fit)
+            lines.append("%s: M² %.3f\n  waist D4σ %.1f μm at z0 %.2f mm\n  zR %.2f mm, θ %.3f mrad\n" \
+                "  fit rms %.2f %%, %d within zR, %d beyond 2 zR" % (axis, fit.m2, fit.d0, fit.z0, fit.zr, fit.theta, \
+                100*fit.residual, near, far))
+        self.caustic_result.emit({"rows": rows, "text": "\n\n".join(lines)})
+
     #convert camera image to beam profile (rainbow map) and display on GUI
     #compute metrics of beam (centroid, D4σ)
     def beam(self):
-        #time printouts can be used for runtime optimization which directly translates to framerate of images
-        #A = datetime.datetime.now()
-        
+        #per stage runtimes (which directly translate to the frame rate) are kept by self.timer
+        #and shown in the status bar
+        self.read_aperture()
+        self.timer.skip()
+
+        #take grayscale version of the image for intensity profiling
+        #(all frame sized arrays below are written into the reused buffers)
+        frame_shape = self.image_live.shape[:2]
+        image = self.gray_frame()
+        frame_dtype = image.dtype
+        self.timer.mark("gray")
+        if self.DARK_NOW:
+            path = self.background.add(image, self.frame_x0, self.frame_y0)
+            if path is not None:
+                self.DARK_NOW = False
+                self.set_text.emit(self.MainWindow.lineEdit, "Dark reference saved to: "+path)
+        #analyze the average of the last frames instead (no frames are stored beyond the window)
+        frames = self.avg_frames
+        if frames > 1:
+            image = self.average(image, frames)
+            self.timer.mark("average")
+
+        #background: the cached dark reference of this frame size/position and/or the aperture edge baseline,
+        #subtracted while masking. Pixels within the subtracted background of saturation still count as saturated
+        mode = self.bg_mode
+        dark, dark_max = None, 0
+        if "dark" in mode:
+            dark, dark_max = self.background.reference(image.shape, self.frame_x0, self.frame_y0, frame_dtype, image.dtype)
+
+        spots, profiles = None, None
+        if self.MULTI_SPOT:
+            #multi-spot: the spots are labeled on a downsampled frame and each is analyzed in its own window
+            #(each window has its own background level, bg_level is not used)
+            if self.spot_finder is None:
+                self.spot_finder = SpotFinder(self.W, self.H, self.analyzer, detect_level=10*self.sat_level/255)
+            spots = self.spot_finder.analyze(image, self.frame_x0, self.frame_y0, dark, dark_max, self.sat_level)
+            self.bg_level = 0
+            self.timer.mark("moments")
+        elif self.spot_finder is not None:
+            self.spot_finder = None
+            self.spot_table.emit([])
+        if spots:
+            #the spot with the largest power share is shown, saved and logged as the beam
+            stats = self.spot_finder.main().stats
+            overlay = self.spot_finder
+        elif self.AUTO_ROI:
+            #auto ROI: analyze only the background subtracted 3 x D4σ window around the beam and move the
+            #window (and optionally the sensor zoom) to follow it. A lost beam triggers a full frame search
+            image_m, x0, y0 = self.tracker.apply_clipped(image, self.frame_x0, self.frame_y0, \
+                self.buffers.get("clipped", frame_shape, np.float32), dark)
+            self.bg_level = self.tracker.level
+            self.timer.mark("mask")
+            stats, profiles = self.analyze(image_m, x0, y0, sat_level=self.sat_level - dark_max - self.bg_level)
+            self.timer.mark("moments")
+            self.tracker.update(stats)
+            overlay = self.tracker
+            if self.ZOOM_ROI and isinstance(self.source, PiCameraSource):
+                self.source.set_roi(self.tracker.sensor_roi())
+        else:
+            if self.tracker.locked:
+                self.tracker.reset()
+                if isinstance(self.source, PiCameraSource):
+                    self.source.set_roi(None)
+            #mask the aperture's bounding box and compute all beam statistics
+            #(sum, max, saturation, centroid, D4σ) in a histogram + moments (or marginal profiles) pass
+            self.bg_level = self.aperture.edge_level(image, dark) if "edge" in mode else 0
+            image_m, x0, y0 = self.aperture.apply(image, self.buffers.get("masked", frame_shape, image.dtype), \
+                dark, self.bg_level)
+            self.timer.mark("mask")
+            stats, profiles = self.analyze(image_m, x0, y0, self.aperture.x, self.aperture.y, \
+                sat_level=self.sat_level - dark_max - self.bg_level)
+            self.timer.mark("moments")
+            overlay = self.aperture
+        self.publish(image, stats, overlay, spots=spots, profiles=profiles)
+
+    #BeamStats of a masked/cropped frame (top left corner at x0, y0) and, with PROFILES, its marginal
+    #profiles (the moments then follow from the profiles at no extra cost), else None
+    def analyze(self, image_m, x0, y0, cx0=None, cy0=None, sat_level=None):
+        if self.PROFILES:
+            return self.analyzer.analyze_profiles(image_m, x0, y0, cx0, cy0, sat_level)
+        return self.analyzer.analyze(image_m, x0, y0, cx0, cy0, sat_level=sat_level), None
+
+    #add a grayscale frame to the running average of frames frames and return the average (float32)
+    #a new average is started when the number of frames or the frame size (sensor zoom) changes
+    def average(self, image, frames):
+        acc = self.accumulator
+        if self.accumulate_mode == "window":
+            frames = min(frames, max_window_frames(image.shape, image.dtype))
+        if acc is None or acc.frames != frames or not acc.accepts(image):
+            acc = self.accumulator = FrameAccumulator(image.shape, frames, self.accumulate_mode, image.dtype)
+        return acc.add(image)
+
+    #grayscale version of the current frame (raw frames already are 16-bit luminance)
+    def gray_frame(self):
+        if self.image_live.ndim == 2:
+            return self.image_live
+        return cv2.cvtColor(self.image_live, cv2.COLOR_BGR2GRAY, dst=self.buffers.get("gray", self.image_live.shape[:2]))
+
+    #read the aperture from the text boxes (their text as last copied by the GUI thread)
+    def read_aperture(self):
         #set the aperture mask values to those input by the user in the text boxes
         #if the text boxes are left blank for some time, they will default
         try:        
-            self.mask_x = int(self.MainWindow.lineEdit_apx.text())
+            self.mask_x = int(self.apx_text)
             self.count_x = 0
         except:
             if self.count_x == 3:
                 self.mask_x = int(self.W / 2)
-                self.MainWindow.lineEdit_apx.setText(str(self.mask_x))
+                self.set_text.emit(self.MainWindow.lineEdit_apx, str(self.mask_x))
             self.count_x += 1
         try:
-            self.mask_y = int(self.MainWindow.lineEdit_apy.text())
+            self.mask_y = int(self.apy_text)
             self.count_y = 0
         except:
             if self.count_y == 3:
                 self.mask_y = int(self.H / 2)
-                self.MainWindow.lineEdit_apy.setText(str(self.mask_y))
+                self.set_text.emit(self.MainWindow.lineEdit_apy, str(self.mask_y))
             self.count_y += 1
         try:
-            self.mask_r = int(self.MainWindow.lineEdit_apr.text())
+            #the radius box takes a single radius or "rx,ry"
+            radii = [int(r) for r in self.apr_text.split(",")]
+            self.mask_r, self.mask_ry = radii[0], radii[-1]
             self.count_r = 0
         except:
             if self.count_r == 3:
                 self.mask_r = int(self.H/2 - 100)
-                self.MainWindow.lineEdit_apr.setText(str(self.mask_r))
+                self.mask_ry = self.mask_r
+                self.set_text.emit(self.MainWindow.lineEdit_apr, str(self.mask_r))
             self.count_r += 1
-            
-        #define a mask depending on aperture
-        mask = np.zeros([self.H,self.W])
-        mask = cv2.circle(mask, (self.mask_x,self.mask_y), self.mask_r, 255, -1)
-        
-        #take grayscale version of the image for intensity profiling
-        image = cv2.cvtColor(self.image_live, cv2.COLOR_BGR2GRAY)
+        #the mask is only rebuilt if the aperture actually changed
+        self.aperture.set(self.mask_x, self.mask_y, self.mask_r, self.mask_ry, self.aperture_shape)
 
-        #copy and mask the image based on the circular aperture mask
-        image_m = np.copy(image)
-        image_m[mask==0] = 0
-        
+    #show, save and log the statistics of the current frame
+    #image is the grayscale frame (None if it was analyzed by a worker process, it is then only converted
+    #when needed), overlay is drawn on the beam image, beam_R is an already rendered display image (or None)
+    #spots is the list of beam_spots.Spot in multi-spot mode (None otherwise), profiles the marginal
+    #beam_profiles.Profiles of the analyzed region (None without PROFILES, in multi-spot and parallel mode)
+    def publish(self, image, stats, overlay, beam_R=None, spots=None, profiles=None):
+        if image is None and (self.SAVE_NOW or (self.LOGGING and self.LOG_FRAMES) or (self.DISPLAY_NOW and beam_R is None)):
+            image = self.gray_frame()
         #approximate the power based on the total bit count and calibration factors
-        self.pix_sum = np.sum(image_m)
-        self.pix_max = image_m.max()
+        self.pix_sum = stats.pix_sum
+        self.pix_max = stats.pix_max
         P_estimated = self.pix_sum * self.factor_P
-        self.MainWindow.lcdNumber_P.display(round(P_estimated))
         
-        #count the number of saturated pixels
-        self.sat_num = len(np.where(image_m==255)[0])
-        self.MainWindow.label_sat.setText("# Saturated Pixels: "+str(self.sat_num))
-        
-        #compute the centroid and D4σ in pixel values if image is not empty
-        MOM = cv2.moments(image_m)
-        if MOM['m00'] != 0:
-            centroid_x = MOM['m10']/MOM['m00']
-            centroid_y = MOM['m01']/MOM['m00']
-            #note 1 pixel has physical dimension: pixel_um * pixel_um (= 1.55 um (micron) * 1.55 um for Raspi HQ Camera module)
-            #With no scaling (lens) the physical beam widths are then d4x (px) * 1.55 um, d4y (px) * 1.55 um
-            d4x = self.pixel_um*4*math.sqrt(abs(MOM['m20']/MOM['m00'] - centroid_x**2))
-            d4y = self.pixel_um*4*math.sqrt(abs(MOM['m02']/MOM['m00'] - centroid_y**2))
-        else:
-            centroid_x = self.mask_x
-            centroid_y = self.mask_y
-            d4x = 0
-            d4y = 0
-
-        self.MainWindow.label_centroid.setText("Centroid x,y: "+str(round(centroid_x))+", "+str(round(centroid_y)))
-        self.MainWindow.lcdNumber_dx.display(round(d4x))
-        self.MainWindow.lcdNumber_dy.display(round(d4y))
+        #number of saturated pixels
+        self.sat_num = stats.sat_num
         
-        #take the negative of the image in grayscale space to apply cv2 rainbow map
-        image_n = 255 - image
-        beam = cv2.applyColorMap(image_n, cv2.COLORMAP_RAINBOW)
+        #centroid in pixels and D4σ in microns
+        centroid_x, centroid_y = stats.centroid_x, stats.centroid_y
+        d4x, d4y = stats.d4x, stats.d4y
         
+        #running mean ± σ of the results since "Mean ± σ" was checked (constant memory)
+        if self.MEAN_STATS:
+            if self.running is None:
+                self.running = RunningStats(RUNNING_FIELDS)
+            self.running.update((P_estimated, centroid_x, centroid_y, d4x, d4y))
+        else:
+            self.running = None
+
+        #M² mode: average D4σ into the caustic position being measured
+        self.caustic_step(stats)
+
+        #1/e² fits of the profiles, only for frames which are shown, saved or logged
+        fits = (None, None)
+        if profiles is not None and (self.DISPLAY_NOW or self.SAVE_NOW or self.LOGGING):
+            fits = fit_profiles(profiles, self.profile_fit)
+
         #save all data if SAVE_NOW is flagged by save button, then reset the flag
+        self.timer.skip()
         if self.SAVE_NOW:
             savepath = os.path.join(os.getcwd(), "saves")
-            if not os.path.exists(savepath):
-                os.mkdir(savepath)
-            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename1 = "camera_"+timestamp+".png"
-            filename2 = "beam_"+timestamp+".png"
-            filename3 = "stats_"+timestamp+".csv"
-            filename4 = "x_profile_"+timestamp+".png"
-            filename5 = "y_profile_"+timestamp+".png"
-            cv2.imwrite(os.path.join(savepath,filename1), self.image_live) #may need to cvt color
-            cv2.imwrite(os.path.join(savepath,filename2), beam)
-            statsfile = open(os.path.join(savepath,filename3), 'w')
-            statsfile.write("Image width (px), height (px)\n")
-            statsfile.write(str(self.W)+","+str(self.H)+"\n")
-            statsfile.write("Centroid x (px), y (px)\n")
-            statsfile.write(str(centroid_x)+","+str(centroid_y)+"\n")
-            statsfile.write("D4σ x, y\n")
-            statsfile.write(str(d4x)+","+str(d4y)+"\n")
-            statsfile.write("Aperture x (px), y (px), radius (px)\n")
-            statsfile.write(str(self.mask_x)+","+str(self.mask_y)+","+str(self.mask_r)+"\n")
-            statsfile.write("Estimated power (mW)\n")
-            statsfile.write(str(P_estimated)+"\n")
-            statsfile.write("Gray value max (ct), sum (ct), saturated pixels (ct)\n")
-            statsfile.write(str(self.pix_max)+","+str(self.pix_sum)+","+str(self.sat_num)+"\n")
-            statsfile.close()
-            x_prof = image[round(centroid_y),:]
-            plt.plot(range(len(x_prof)),x_prof)
-            plt.title('Beam profile along x-axis at y-centroid')
-            plt.xlim(0,len(x_prof)-1)
-            plt.ylim(0,255)
-            plt.xlabel('Pixel')
-            plt.ylabel('Intensity')
-            plt.savefig(os.path.join(savepath,filename4))
-            plt.close('all')
-            y_prof = image[:,round(centroid_x)]
-            plt.plot(range(len(y_prof)),y_prof)
-            plt.title('Beam profile along y-axis at x-centroid')
-            plt.xlim(0,len(y_prof)-1)
-            plt.ylim(0,255)
-            plt.xlabel('Pixel')
-            plt.ylabel('Intensity')
-            plt.savefig(os.path.join(savepath,filename5))
-            plt.close('all')
-            #only stop the saving if LOGGING is not enabled
+            if self.writer is None:
+                self.writer = SaveWriter(savepath, maxsize=self.save_queue, policy=self.save_policy, \
+                    decimate=self.save_decimate)
+            #millisecond timestamps so files do not overwrite each other when logging faster than 1 Hz
+            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+            stats_rows = [("Image width (px), height (px)", (self.W, self.H)),
+                ("Centroid x (px), y (px)", (centroid_x, centroid_y)),
+                ("D4σ x, y", (d4x, d4y)),
+                ("Aperture x (px), y (px), radius (px), radius y (px), shape", \
+                    (self.aperture.x, self.aperture.y, self.aperture.rx, self.aperture.ry, self.aperture.shape)),
+                ("Estimated power (mW)", (P_estimated,)),
+                ("Gray value max (ct), sum (ct), saturated pixels (ct)", (self.pix_max, self.pix_sum, self.sat_num)),
+                ("Saturation level (ct)", (self.sat_level,)),
+                ("Background mode, level (ct)", (self.bg_mode, self.bg_level))]
+            if profiles is not None:
+                stats_rows.append(("Profile fit, 1/e² diameter x (μm), y (μm), order x, order y", (self.profile_fit,) + \
+                    tuple(fit.diameter*self.pixel_um if fit is not None else "" for fit in fits) + \
+                    tuple(fit.order if fit is not None else "" for fit in fits)))
+            for spot in spots or []:
+                stats_rows.append(("Spot id, centroid x (px), y (px), D4σ x, y, power share, saturated pixels (ct)", \
+                    (spot.id, spot.stats.centroid_x, spot.stats.centroid_y, spot.stats.d4x, spot.stats.d4y, spot.share, \
+                    spot.stats.sat_num)))
+            #the marginal profiles are saved, without them the row and column through the centroid
+            #the camera frame belongs to the capture ring and is copied before queueing
+            if profiles is not None:
+                x_prof, y_prof, x_start, y_start = profiles.x, profiles.y, profiles.x0, profiles.y0
+            else:
+                row = min(max(round(centroid_y) - self.frame_y0, 0), image.shape[0]-1)
+                col = min(max(round(centroid_x) - self.frame_x0, 0), image.shape[1]-1)
+                x_prof, y_prof, x_start, y_start = image[row,:].copy(), image[:,col].copy(), self.frame_x0, self.frame_y0
+            #the full resolution beam map is only computed when saving
+            job = SaveJob(timestamp, self.image_live.copy(), colormap(image, self.display.lut, self.sat_level), \
+                stats_rows, x_prof, y_prof, self.sat_level, x_start, y_start)
+            #encoding and csv writing happen on the writer's threads
+            #saving only stays on while logging in "files" mode, a Save while stream logging saves once
             #update info bar depending on whether logging or single save
-            if not self.LOGGING:
-                self.MainWindow.lineEdit.setText("Data saved to: "+savepath)
-                self.SAVE_NOW = False
+            self.SAVE_NOW = submit_save(self.writer, job, self.LOGGING, self.LOG_MODE)
+            if self.SAVE_NOW:
+                self.set_text.emit(self.MainWindow.lineEdit, "Data logging to: "+savepath+" (written "+\
+                    str(self.writer.frames_written)+", dropped "+str(self.writer.frames_dropped)+")")
             else:
-                self.MainWindow.lineEdit.setText("Data logging to: "+savepath)
+                self.set_text.emit(self.MainWindow.lineEdit, "Data saved to: "+savepath)
             
-        #convert to int by rounding
-        d4x, d4y, centroid_x, centroid_y = round(d4x), round(d4y), round(centroid_x), round(centroid_y)
-        
-        #apply centroid line tracking
-        cv2.line(beam, (centroid_x,0), (centroid_x,self.H), (0,0,0), thickness=5)
-        cv2.line(beam, (0,centroid_y), (self.W,centroid_y), (0,0,0), thickness=5)
-        #downsample the image by scale factor 4 to fit on the GUI screen
-        scale = 4
-        beam_R = cv2.resize(beam, (int(self.W/scale),int(self.H/scale)))
-        beam_R = cv2.cvtColor(beam_R, cv2.COLOR_BGR2RGB)
-        #line below is to add aperture mask circle
-        #image is reduced by scale times, so center coordinate is mask_x/scale, mask_y/scale; radius is mask_r/scale
-        beam_R = cv2.circle(beam_R, (round(self.mask_x/scale),round(self.mask_y/scale)),\
-            int(self.mask_r/scale), (0,0,0), 2)
-        #set the image to the proper position on the window if not already done
-        if not self.FRAMES_INIT:
-            self.MainWindow.beam_frame.move(125,60)
-            self.MainWindow.beam_frame.resize(int(self.W/scale),int(self.H/scale))
-            self.FRAMES_INIT = True
-        imGUI = QtGui.QImage(beam_R.data, beam_R.shape[1], beam_R.shape[0], \
-        beam_R.shape[1]*3, QtGui.QImage.Format_RGB888)
-        self.MainWindow.beam_frame.setPixmap(QtGui.QPixmap.fromImage(imGUI))
-        #B = datetime.datetime.now()
-        #print("Beam runtime: "+str(B-A))
+        #append this frame to the streaming log (opened and closed following the Log button)
+        if self.LOGGING and self.LOG_MODE == "stream":
+            self.log_stream(image, stats, P_estimated, spots, profiles, fits)
+        elif self.stats_log is not None:
+            self.stop_log_stream()
+        self.timer.mark("save")
+            
+        #refresh the GUI at the display rate: the rainbow map and overlays are applied to the downsampled image
+        if self.DISPLAY_NOW:
+            shown = {"power": P_estimated, "sat_num": self.sat_num, "centroid_x": centroid_x, \
+                "centroid_y": centroid_y, "d4x": d4x, "d4y": d4y}
+            #1/e² diameters of the profile fits (μm)
+            shown["fit_x"], shown["fit_y"] = (fit.diameter*self.pixel_um if fit is not None else None for fit in fits)
+            if self.running is not None:
+                shown["running"] = self.running.summary()
+                shown["running_n"] = self.running.count
+            self.beam_stats.emit(shown)
+            if spots is not None:
+                self.spot_table.emit([[str(spot.id), "%.1f" % spot.stats.centroid_x, "%.1f" % spot.stats.centroid_y, \
+                    "%.1f" % spot.stats.d4x, "%.1f" % spot.stats.d4y, "%.1f" % (100*spot.share), \
+                    "%.3g" % (spot.stats.pix_sum*self.factor_P), str(spot.stats.sat_num)] for spot in spots])
+            if beam_R is None:
+                beam_R = self.display.beam(image, (centroid_x, centroid_y), overlay, self.frame_x0, self.frame_y0, \
+                    profiles, fits)
+                self.timer.mark("display")
+            self.beam_image.emit(self.to_qimage(beam_R))
+            if self.first_frame_s is None:
+                self.first_frame()
+            #live frame rate, per stage milliseconds and dropped frames
+            dropped = " | dropped "+str(self.ring.frames_dropped if self.ring is not None else 0)
+            if self.writer is not None:
+                dropped += ", not saved "+str(self.writer.frames_dropped)
+            self.status.emit(self.timer.summary()+dropped+" | "+self.memory.summary())
+            self.timer.mark("qt")
         
         
 #run the GUI      
@@ -510,6 +1191,11 @@ if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
     MainWindow = QtWidgets.QMainWindow()
     ui = Ui_MainWindow()
+    #optional first argument: directory (or glob) of saved camera images to replay without a camera
+    if len(sys.argv) > 1:
+        ui.source_path = sys.argv[1]
     ui.setupUi(MainWindow)
     MainWindow.show()
+    app.aboutToQuit.connect(ui.quit)
+    print("Window shown %.2f s after start" % (time.perf_counter() - T_START))
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,114 @@
+#GitHub: koopaduo2
+#Streaming time-series log for Beam GUI
+#Log mode appends one row per frame to a single csv file (buffered writes) and can optionally keep the raw
+#frames in chunked, memory-mapped .npy archives instead of writing five files per frame
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import glob
+import os
+
+#columns logged for every frame by captureThread.beam
+#t is the frame's capture time (time.monotonic() in seconds, as Frame.timestamp), frame is the capture sequence
+#number
+LOG_COLUMNS = ["t", "frame", "centroid_x", "centroid_y", "d4x", "d4y", "power", \
+    "pix_max", "pix_sum", "sat_num", "ap_x", "ap_y", "ap_rx", "ap_ry"]
+
+#columns of a FrameArchive's chunks.csv: chunk file, index of its first frame, number of frames, frame shape
+#("480x640") and dtype
+CHUNK_COLUMNS = ["file", "first", "frames", "shape", "dtype"]
+
+#append-only csv log with one row per frame
+class StatsLog(object):
+    rows = 0 #number of rows written
+
+    def __init__(self, path, columns=LOG_COLUMNS, buffering=1<<20):
+        self.path = path
+        self.columns = list(columns)
+        #large write buffer, rows are only flushed to disk every ~1 MB
+        self.file = open(path, 'w', buffering=buffering)
+        self.file.write(",".join(self.columns)+"\n")
+
+    #append one row (values in the same order as columns)
+    def append(self, values):
+        self.file.write(",".join(repr(v) if isinstance(v, float) else str(v) for v in values)+"\n")
+        self.rows += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+#load a StatsLog csv back into a numpy structured array (one float64 field per column)
+def load_log(path):
+    with open(path) as logfile:
+        columns = logfile.readline().strip().split(",")
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    return np.rec.fromarrays(data.T, names=columns) if len(data) else \
+        np.rec.fromarrays([np.empty(0)]*len(columns), names=columns)
+
+#chunked archive of raw frames. Frames are copied into memory-mapped .npy files of chunk frames each
+#(frames_000000.npy, frames_000001.npy, ...) so writing is a single memcpy per frame
+#a frame of another shape or dtype than the current chunk (Auto ROI zoom, raw or averaged frames) starts a new
+#chunk, so every chunk holds frames of one shape. Each closed chunk is listed in chunks.csv (CHUNK_COLUMNS)
+class FrameArchive(object):
+    frames = 0 #number of frames written
+    chunks = 0 #number of chunks started
+    chunk_file = None #memory map of the current chunk
+    chunk_count = 0 #frames written to the current chunk
+
+    def __init__(self, path, shape=None, dtype=np.uint8, chunk=64):
+        self.path = path
+        self.shape = None if shape is None else tuple(shape) #shape and dtype of the frames of the current chunk
+        self.dtype = np.dtype(dtype)
+        self.chunk = chunk
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.index = StatsLog(os.path.join(path, "chunks.csv"), CHUNK_COLUMNS, buffering=-1)
+
+    def chunk_path(self, index):
+        return os.path.join(self.path, "frames_%06d.npy" % index)
+
+    #copy one frame into the archive
+    def append(self, frame):
+        if frame.shape != self.shape or frame.dtype != self.dtype:
+            self.close_chunk()
+            self.shape, self.dtype = frame.shape, frame.dtype
+        if self.chunk_file is None or self.chunk_count == self.chunk:
+            self.close_chunk()
+            self.chunk_file = np.lib.format.open_memmap(self.chunk_path(self.chunks), mode='w+', \
+                dtype=self.dtype, shape=(self.chunk,)+self.shape)
+            self.chunks += 1
+            self.chunk_count = 0
+        self.chunk_file[self.chunk_count] = frame
+        self.chunk_count += 1
+        self.frames += 1
+
+    #flush the current chunk and list it in the index. A partially filled chunk is rewritten to its actual length
+    def close_chunk(self):
+        if self.chunk_file is None:
+            return
+        chunk_file, count = self.chunk_file, self.chunk_count
+        self.chunk_file = None
+        path = chunk_file.filename
+        chunk_file.flush()
+        if count < self.chunk:
+            frames = np.array(chunk_file[:count])
+            del chunk_file
+            np.save(path, frames)
+        self.index.append([os.path.basename(path), self.frames - count, count, \
+            "x".join(str(n) for n in self.shape), self.dtype.name])
+
+    def close(self):
+        self.close_chunk()
+        self.index.close()
+
+#load a FrameArchive as a list of read-only memory maps (one per chunk), in frame order
+#the chunks may differ in frame shape and dtype
+def load_frames(path):
+    return [np.load(f, mmap_mode='r') for f in sorted(glob.glob(os.path.join(path, "frames_*.npy")))]
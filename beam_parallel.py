@@ -0,0 +1,163 @@
+#GitHub: koopaduo2
+#Multi-process analysis for Beam GUI
+#The capture thread writes frames into a shared memory FrameRing (see beam_source.py). Worker processes attach
+#to the same memory and run the gray conversion, aperture, moments and display downsampling on the frame
+#slots without copying them, and the results are handed back to the GUI in frame order. This spreads the
+#per frame work over all cores of the Pi 4 instead of one core behind the GIL
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+from collections import namedtuple
+import numpy as np
+import cv2
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+from beam_analysis import BeamAnalyzer
+from beam_aperture import Aperture
+from beam_display import BeamDisplay
+
+#result of one frame analyzed by a worker
+#frame is the beam_source.Frame which was analyzed, stats its BeamStats, render is True if the display
+#images were prepared (worker camera_small/beam_small slot), busy_ns the worker's processing time
+FrameResult = namedtuple("FrameResult", ["frame", "stats", "render", "busy_ns"])
+
+#attach a numpy array of shape (slots,)+shape to an existing shared memory block
+def attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype, buffer=shm.buf)
+
+#worker process main loop
+#tasks are (task_id, slot, h, w, aperture, render), results are (task_id, stats, busy_ns)
+def worker_main(frames_spec, display_spec, settings, tasks, results):
+    #frames must be detached from the block before it is closed, so keep the shm objects alive here
+    frames_shm, frames = attach(*frames_spec)
+    display_shm, display_buffers = attach(*display_spec)
+    analyzer = BeamAnalyzer(settings["pixel_um"], settings["sat_level"], settings["cross_terms"])
+    aperture = Aperture()
+    W, H, scale = settings["W"], settings["H"], settings["scale"]
+    display = BeamDisplay(W, H, scale, 0, settings["sat_level"])
+    executor = None
+    if settings["tiles"] > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(settings["tiles"])
+    gray = np.empty((H, W), np.uint8)
+    masked = np.empty((H, W), frames.dtype)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        t0 = time.perf_counter_ns()
+        task_id, slot, h, w, ap, render = task
+        frame = frames[slot][:h, :w]
+        if frame.ndim == 2:
+            #raw sources already deliver (16-bit) luminance
+            image = frame
+        else:
+            image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray[:h, :w]) if (h, w) == (H, W) \
+                else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        aperture.set(*ap)
+        image_m, x0, y0 = aperture.apply(image, masked)
+        stats = analyzer.analyze(image_m, x0, y0, aperture.x, aperture.y, executor, settings["tiles"])
+        if render:
+            #display preparation straight into the slot's shared display buffers
+            display_buffers[slot, 0] = display.camera(frame)
+            display_buffers[slot, 1] = display.beam(image, (stats.centroid_x, stats.centroid_y), aperture)
+        results.put((task_id, stats, time.perf_counter_ns() - t0))
+    del frames, display_buffers
+    frames_shm.close()
+    display_shm.close()
+
+#pool of analysis worker processes working on the slots of a shared FrameRing
+#usage: submit(frame, aperture, render) for frames taken with ring.get(retain=True), then next_result()
+#returns the results in submission order. The caller releases each frame's slot after using its result
+class ParallelAnalyzer(object):
+    submitted = 0 #tasks handed to the workers
+    completed = 0 #results returned by next_result
+
+    def __init__(self, ring, W, H, workers=3, tiles=1, pixel_um=1.55, sat_level=255, cross_terms=False, scale=4):
+        if ring.shm is None:
+            raise ValueError("ParallelAnalyzer needs a shared FrameRing (source.start(shared=True))")
+        self.ring = ring
+        self.workers = workers
+        slots = len(ring.buffers)
+        #downsampled display images (camera, beam) per ring slot, shared with the workers
+        self.w, self.h = int(W/scale), int(H/scale)
+        display_shape = (slots, 2, self.h, self.w, 3)
+        self.display_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(display_shape)))
+        self.display = np.ndarray(display_shape, np.uint8, buffer=self.display_shm.buf)
+        settings = {"W": W, "H": H, "scale": scale, "tiles": tiles, "pixel_um": pixel_um, \
+            "sat_level": sat_level, "cross_terms": cross_terms}
+        #spawn (rather than fork) so the workers do not inherit the Qt/camera state of the GUI process
+        context = multiprocessing.get_context("spawn")
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.frames = {} #task_id -> (frame, render) of tasks in flight
+        self.done = {} #task_id -> (stats, busy_ns) of results which arrived out of order
+        frames_spec = (ring.shm.name, (slots,)+ring.shape, ring.dtype)
+        display_spec = (self.display_shm.name, display_shape, np.uint8)
+        self.processes = [context.Process(target=worker_main, daemon=True, \
+            args=(frames_spec, display_spec, settings, self.tasks, self.results)) for i in range(workers)]
+        for process in self.processes:
+            process.start()
+
+    #number of tasks waiting for their result
+    def in_flight(self):
+        return self.submitted - self.completed
+
+    #hand a frame (from ring.get(retain=True)) to the workers
+    #aperture is (x, y, rx, ry, shape), render asks for the downsampled display images
+    def submit(self, frame, aperture, render=False):
+        h, w = frame.image.shape[:2]
+        self.frames[self.submitted] = (frame, render)
+        self.tasks.put((self.submitted, frame.slot, h, w, aperture, render))
+        self.submitted += 1
+
+    #wait for the result of the oldest task in flight (results are returned in submission order)
+    #returns None after timeout seconds without it. The workers are checked every poll seconds while waiting:
+    #a task of a dead worker never completes, so a RuntimeError is raised instead of waiting forever
+    def next_result(self, timeout=None, poll=1.0):
+        task_id = self.completed
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while task_id not in self.done:
+            wait = poll if deadline is None else max(min(poll, deadline - time.monotonic()), 0)
+            try:
+                result_id, stats, busy_ns = self.results.get(timeout=wait)
+            except queue.Empty:
+                self.check_workers()
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+                continue
+            self.done[result_id] = (stats, busy_ns)
+        stats, busy_ns = self.done.pop(task_id)
+        frame, render = self.frames.pop(task_id)
+        self.completed += 1
+        return FrameResult(frame, stats, render, busy_ns)
+
+    #raise a RuntimeError if a worker process exited
+    def check_workers(self):
+        dead = [process for process in self.processes if not process.is_alive()]
+        if dead:
+            raise RuntimeError("%d analysis worker(s) exited (exit codes %s)" % \
+                (len(dead), ", ".join(str(process.exitcode) for process in dead)))
+
+    #downsampled (camera, beam) RGB display images prepared for a result with render=True
+    #valid until the frame's slot is released
+    def display_images(self, result):
+        return self.display[result.frame.slot, 0], self.display[result.frame.slot, 1]
+
+    #stop the workers and free the shared display buffers
+    def close(self):
+        for process in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(2)
+            if process.is_alive():
+                process.terminate()
+                process.join(1)
+        del self.display
+        self.display_shm.close()
+        self.display_shm.unlink()
@@ -0,0 +1,146 @@
+#GitHub: koopaduo2
+#Marginal beam profiles and profile fits for Beam GUI
+#The x and y profiles are the column and row sums over the analyzed (masked, background subtracted) region.
+#Unlike a single row and column through the centroid they use every pixel, so they are not noisy, and the
+#centroid and D4σ follow exactly from them. A vectorized Gaussian (or super-Gaussian) fit gives the 1/e²
+#diameters reported alongside D4σ
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+from collections import namedtuple
+import numpy as np
+import cv2
+import math
+
+#marginal profiles of an analyzed region: x (column sums) and y (row sums) as float64 arrays whose first
+#samples are at full frame pixel x0 and y0
+Profiles = namedtuple("Profiles", ["x0", "y0", "x", "y"])
+
+#fit of one profile to baseline + amplitude * exp(-2 |(x - center) / (diameter/2)|**order)
+#center and diameter (the 1/e² full width) are in pixels, order is 2 for a Gaussian, residual is the rms
+#deviation of the fit relative to the profile's peak above the baseline (the profile's minimum)
+ProfileFit = namedtuple("ProfileFit", ["amplitude", "center", "diameter", "order", "residual", "baseline"])
+ProfileFit.__new__.__defaults__ = (0.0,)
+
+#profile fit models
+FITS = ("gaussian", "super-gaussian")
+
+#x and y profiles of an image with its top left corner at x0, y0 (one row and one column reduction)
+#cv2 sums into int32 (8-bit frames) or float32 (others) many times faster than into float64. The sums stay
+#exact for 8-bit frames and for 10/12-bit raw frames up to 4096 pixels wide (sums below 2**24)
+def marginal_profiles(image, x0=0, y0=0):
+    dtype = cv2.CV_32S if image.dtype == np.uint8 else cv2.CV_32F
+    x = cv2.reduce(image, 0, cv2.REDUCE_SUM, dtype=dtype).ravel().astype(np.float64)
+    y = cv2.reduce(image, 1, cv2.REDUCE_SUM, dtype=dtype).ravel().astype(np.float64)
+    return Profiles(x0, y0, x, y)
+
+#zeroth, first and second central moments of a profile: (m00, centroid, mu2), centroid relative to sample 0
+def profile_moments(profile):
+    m00 = float(profile.sum())
+    if m00 <= 0:
+        return 0.0, 0.0, 0.0
+    index = np.arange(len(profile), dtype=np.float64)
+    centroid = float(np.dot(profile, index)) / m00
+    index -= centroid
+    return m00, centroid, float(np.dot(profile, index*index))
+
+#value of a fit at the pixel positions x
+def fit_curve(fit, x):
+    u = np.abs((np.asarray(x, np.float64) - fit.center) / (fit.diameter/2))
+    return fit.baseline + fit.amplitude * np.exp(-2*u**fit.order)
+
+#fit a profile (first sample at pixel start) with a Gaussian, or a super-Gaussian (order fitted too)
+#the Gaussian is fitted as a parabola to the log of the samples above floor x peak, weighted by the samples
+#(the noise of the log grows as 1/value). The super-Gaussian refines it with a few damped Gauss-Newton steps
+#returns a ProfileFit, or None if there is no beam
+def fit_profile(profile, start=0, model="gaussian", floor=0.1, iterations=10):
+    if model not in FITS:
+        raise ValueError("Unknown profile fit: "+str(model))
+    y = np.asarray(profile, np.float64)
+    if not len(y):
+        return None
+    #the baseline of a profile over an unmasked region (background noise summed over the region) is removed
+    baseline = float(y.min())
+    y = y - baseline
+    peak = float(y.max())
+    if not peak > 0:
+        return None
+    x = np.arange(start, start + len(y), dtype=np.float64)
+    above = y > floor*peak
+    if np.count_nonzero(above) < 3:
+        return None
+    xs, ys = x[above], y[above]
+    xm = xs.mean()
+    c2, c1, c0 = np.polyfit(xs - xm, np.log(ys), 2, w=ys)
+    if not c2 < 0:
+        return None
+    #ln(amplitude) - 2 (x - center)**2 / w**2 with w the 1/e² radius
+    w = math.sqrt(-2/c2)
+    center = xm - c1/(2*c2)
+    amplitude = math.exp(c0 - c1*c1/(4*c2))
+    fit = ProfileFit(amplitude, center, 2*w, 2.0, 0.0)
+    if model == "super-gaussian":
+        fit = refine_fit(x, y, fit, iterations)
+    residual = math.sqrt(float(np.mean((fit_curve(fit, x) - y)**2))) / peak
+    return fit._replace(residual=residual, baseline=baseline)
+
+#damped Gauss-Newton (Levenberg-Marquardt) refinement of amplitude, center, 1/e² radius and order
+def refine_fit(x, y, fit, iterations=10, damping=1e-3):
+    p = np.array([fit.amplitude, fit.center, fit.diameter/2, fit.order])
+    J = np.empty((len(x), 4))
+    for i in range(iterations):
+        A, c, w, n = p
+        d = x - c
+        u = np.maximum(np.abs(d) / w, 1e-12)
+        un = u**n
+        f = A*np.exp(-2*un)
+        r = y - f
+        #derivatives of f = A exp(g), g = -2 |(x - c)/w|**n
+        J[:, 0] = f / A
+        J[:, 1] = f * 2*n*un/u*np.sign(d)/w
+        J[:, 2] = f * 2*n*un/w
+        J[:, 3] = f * -2*un*np.log(u)
+        JTJ = J.T @ J
+        JTJ[np.diag_indices(4)] *= 1 + damping
+        try:
+            step = np.linalg.solve(JTJ, J.T @ r)
+        except np.linalg.LinAlgError:
+            break
+        p += step
+        p[2] = max(p[2], 0.5)
+        p[3] = min(max(p[3], 1.0), 20.0)
+        if np.all(np.abs(step) <= 1e-6*np.maximum(np.abs(p), 1)):
+            break
+    return ProfileFit(float(p[0]), float(p[1]), float(2*p[2]), float(p[3]), 0.0)
+
+#(x fit, y fit) of Profiles (either is None without a beam)
+def fit_profiles(profiles, model="gaussian"):
+    return fit_profile(profiles.x, profiles.x0, model), fit_profile(profiles.y, profiles.y0, model)
+
+#draw the profiles (white) and their fits (black) on a display image which has been downsampled by scale:
+#the x profile along the bottom edge, the y profile along the left edge, each using a quarter of the image
+#the fitted 1/e² diameters are written next to them (pixel_um converts them to microns)
+def draw_profiles(image, profiles, scale=1, fits=(None, None), pixel_um=1.55):
+    h, w = image.shape[:2]
+    for axis, profile, start, fit in ((0, profiles.x, profiles.x0, fits[0]), (1, profiles.y, profiles.y0, fits[1])):
+        n = max(int(round(len(profile)/scale)), 2)
+        small = cv2.resize(profile.reshape(1, -1), (n, 1), interpolation=cv2.INTER_AREA).ravel()
+        peak = max(float(small.max()), fit.baseline + fit.amplitude if fit is not None else 0)
+        if not peak > 0:
+            continue
+        span = (h if axis == 0 else w) / 4 / peak
+        pos = round(start/scale) + np.arange(n)
+        curves = [(small, (255,255,255))]
+        if fit is not None:
+            curves.append((fit_curve(fit, start + (np.arange(n) + 0.5)*len(profile)/n), (0,0,0)))
+        for values, color in curves:
+            level = values*span
+            points = np.column_stack((pos, h - 1 - level) if axis == 0 else (level, pos)).round().astype(np.int32)
+            cv2.polylines(image, [points], False, color, 1, cv2.LINE_AA)
+        if fit is not None:
+            text = "1/e2 %s %.0f um" % ("x" if axis == 0 else "y", fit.diameter*pixel_um)
+            origin = (5, h - 8 - 14*(1 - axis))
+            cv2.putText(image, text, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0,0,0), 1, cv2.LINE_AA)
+    return image
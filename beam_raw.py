@@ -0,0 +1,201 @@
+#GitHub: koopaduo2
+#High bit depth raw capture for Beam GUI
+#The Pi camera can append the sensor's packed 10/12-bit Bayer data to a jpeg capture (bayer=True). Unpacking
+#it to a 16-bit luminance frame keeps the full dynamic range for the beam wings, saturation and power,
+#instead of the 8-bit BGR frames of the video port. Unpacking is vectorized into preallocated buffers
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import cv2
+import io
+import time
+from beam_source import FrameSource
+
+#supported raw bit depths: MIPI CSI-2 RAW10 packs 4 pixels in 5 bytes (4 high bytes, then the 2 low bits of
+#each pixel), RAW12 packs 2 pixels in 3 bytes (2 high bytes, then the 4 low bits of each pixel)
+RAW_BITS = (10, 12)
+
+#size of the "BRCM" header in front of the raw data picamera appends to the jpeg
+RAW_HEADER = 32768
+
+#full resolution and bit depth of the raw data by PiCamera.revision (the raw data always covers the full sensor)
+SENSOR_MODES = {"ov5647": (2592, 1944, 10), "imx219": (3280, 2464, 10), "imx477": (4056, 3040, 12)}
+
+#cv2 demosaicing codes by the sensor's Bayer order (cv2 names the patterns by their second row)
+BAYER_CODES = {"RGGB": cv2.COLOR_BayerBG2GRAY, "BGGR": cv2.COLOR_BayerRG2GRAY, \
+    "GRBG": cv2.COLOR_BayerGB2GRAY, "GBRG": cv2.COLOR_BayerGR2GRAY}
+
+#bytes per packed row (padded to 32 bytes)
+def raw_stride(W, bits=12):
+    return (W*bits//8 + 31) // 32 * 32
+
+#size of the raw block at the end of a bayer=True capture (padding rows up to the next multiple of 16 rows,
+#at least one)
+#e.g. 18711040 bytes for the HQ camera (4056 x 3040, 12-bit), 6404096 for the v1 camera (2592 x 1944, 10-bit)
+def raw_size(W, H, bits=12):
+    return RAW_HEADER + raw_stride(W, bits) * (H // 16 + 1) * 16
+
+#raw rows of a bayer=True capture (data supports the buffer protocol) as a memoryview
+#the raw block is located from the end of the capture and checked against its "BRCM" header, so a W x H or bit
+#depth which does not match the sensor's raw mode raises a ValueError instead of unpacking garbage
+def raw_block(data, W, H, bits=12):
+    data = memoryview(data)
+    size = raw_size(W, H, bits)
+    start = len(data) - size
+    if start < 0 or bytes(data[start:start+4]) != b"BRCM":
+        raise ValueError("Capture holds no %d x %d %d-bit raw data (%d bytes expected after the jpeg): W x H and the " \
+            "bit depth must be the sensor's full raw resolution, see SENSOR_MODES" % (W, H, bits, size))
+    return data[start + RAW_HEADER:]
+
+#pack a uint16 Bayer mosaic (H x W) into raw rows (the inverse of RawUnpacker.unpack, for synthetic raw data)
+def pack_raw(mosaic, bits=12, stride=None):
+    if bits not in RAW_BITS:
+        raise ValueError("Unsupported raw bit depth: "+str(bits))
+    H, W = mosaic.shape
+    stride = stride or raw_stride(W, bits)
+    rows = np.zeros((H, stride), np.uint8)
+    mosaic = mosaic.astype(np.uint16)
+    if bits == 12:
+        pixels = mosaic.reshape(H, W//2, 2)
+        groups = rows[:, :W//2*3].reshape(H, W//2, 3)
+        groups[..., 0] = pixels[..., 0] >> 4
+        groups[..., 1] = pixels[..., 1] >> 4
+        groups[..., 2] = (pixels[..., 0] & 0x0F) | ((pixels[..., 1] & 0x0F) << 4)
+    else:
+        pixels = mosaic.reshape(H, W//4, 4)
+        groups = rows[:, :W//4*5].reshape(H, W//4, 5)
+        low = np.zeros((H, W//4), np.uint16)
+        for i in range(4):
+            groups[..., i] = pixels[..., i] >> 2
+            low |= (pixels[..., i] & 0x03) << (2*i)
+        groups[..., 4] = low
+    return rows
+
+#synthetic packed raw frame of a round Gaussian beam for tests and benchmarks without the sensor
+#peak is the beam maximum as a fraction of full scale. Returns (raw rows, the uint16 mosaic they hold)
+def synthetic_raw(W, H, bits=12, waist_px=None, peak=0.85, noise=8, seed=0):
+    waist_px = waist_px or H/16
+    rng = np.random.default_rng(seed)
+    gx = np.exp(-2*((np.arange(W) - W/2)/waist_px)**2)
+    gy = np.exp(-2*((np.arange(H) - H/2)/waist_px)**2)
+    full = 2**bits - 1
+    beam = peak*full*np.outer(gy, gx) + rng.uniform(0, noise, (H, W))
+    mosaic = np.clip(beam, 0, full).astype(np.uint16)
+    return pack_raw(mosaic, bits), mosaic
+
+#unpacks packed raw rows into a uint16 Bayer mosaic and a uint16 luminance frame (preallocated buffers)
+#pattern is the sensor's Bayer order. With demosaic=False the mosaic itself is the frame: no interpolation
+#and the saturation is counted per photosite (useful for monochromatic beams, which light one color)
+class RawUnpacker(object):
+    bits = 12 #bit depth of the packed data, frames hold values up to 2**bits - 1
+
+    def __init__(self, W, H, bits=12, stride=None, pattern="BGGR", demosaic=True):
+        if bits not in RAW_BITS:
+            raise ValueError("Unsupported raw bit depth: "+str(bits))
+        group = 4 if bits == 10 else 2
+        if W % group:
+            raise ValueError("Raw width must be a multiple of "+str(group))
+        self.W, self.H = W, H
+        self.bits = bits
+        self.stride = stride or raw_stride(W, bits)
+        self.code = BAYER_CODES[pattern]
+        self.demosaic = demosaic
+        self.mosaic = np.empty((H, W), np.uint16)
+        self.gray = np.empty((H, W), np.uint16)
+        self.low = np.empty((H, W//group), np.uint8) #low bits of one pixel of every group
+
+    #full scale value of the unpacked frames (the saturation level)
+    def max_value(self):
+        return 2**self.bits - 1
+
+    #unpack the raw rows (anything supporting the buffer protocol, at least stride x H bytes) to the mosaic
+    def unpack(self, data):
+        H, W = self.H, self.W
+        rows = np.frombuffer(data, np.uint8, count=self.stride*H).reshape(H, self.stride)
+        low = self.low
+        if self.bits == 12:
+            groups = rows[:, :W//2*3].reshape(H, W//2, 3)
+            pixels = self.mosaic.reshape(H, W//2, 2)
+            for i in range(2):
+                np.left_shift(groups[..., i], 4, out=pixels[..., i], dtype=np.uint16)
+                np.right_shift(groups[..., 2], 4*i, out=low)
+                np.bitwise_and(low, 0x0F, out=low)
+                np.bitwise_or(pixels[..., i], low, out=pixels[..., i])
+        else:
+            groups = rows[:, :W//4*5].reshape(H, W//4, 5)
+            pixels = self.mosaic.reshape(H, W//4, 4)
+            for i in range(4):
+                np.left_shift(groups[..., i], 2, out=pixels[..., i], dtype=np.uint16)
+                np.right_shift(groups[..., 4], 2*i, out=low)
+                np.bitwise_and(low, 0x03, out=low)
+                np.bitwise_or(pixels[..., i], low, out=pixels[..., i])
+        return self.mosaic
+
+    #unpack the raw rows to a uint16 luminance frame, written into out (H x W uint16) if given
+    def luminance(self, data, out=None):
+        mosaic = self.unpack(data)
+        if out is None:
+            out = self.gray
+        if not self.demosaic:
+            np.copyto(out, mosaic)
+            return out
+        return cv2.cvtColor(mosaic, self.code, dst=out)
+
+#base class of the raw frame sources: frames are single channel uint16 luminance
+class RawSource(FrameSource):
+    channels, dtype = 1, np.uint16
+
+    def __init__(self, W, H, bits=12, pattern="BGGR", demosaic=True):
+        FrameSource.__init__(self, W, H)
+        self.unpacker = RawUnpacker(W, H, bits, pattern=pattern, demosaic=demosaic)
+        self.bits = bits
+
+#Pi camera raw source: still port jpeg captures with the raw Bayer data appended (bayer=True)
+#the raw data always covers the full sensor mode, so W x H must be the sensor resolution: a known sensor
+#(SENSOR_MODES) with another W x H or bit depth raises a ValueError, unknown sensors are checked per capture
+#camera must be an already configured PiCamera (see captureThread.init_camera)
+class PiRawSource(RawSource):
+
+    def __init__(self, camera, W, H, bits=12, pattern="BGGR", demosaic=True):
+        mode = SENSOR_MODES.get(getattr(camera, "revision", None))
+        if mode is not None and mode != (W, H, bits):
+            raise ValueError("The %s sensor's raw data is %d x %d %d-bit, not %d x %d %d-bit" % \
+                ((camera.revision,) + mode + (W, H, bits)))
+        RawSource.__init__(self, W, H, bits, pattern, demosaic)
+        self.camera = camera
+        self.stream = io.BytesIO()
+
+    def fill(self, buffer):
+        self.stream.seek(0)
+        self.stream.truncate()
+        self.camera.capture(self.stream, format="jpeg", bayer=True)
+        #the views must be released before the stream is truncated again
+        with self.stream.getbuffer() as data:
+            with raw_block(data, self.W, self.H, self.unpacker.bits) as raw:
+                self.unpacker.luminance(raw, buffer[:self.H, :self.W])
+        return True
+
+#synthetic raw source for testing and benchmarking without the sensor
+#a synthetic packed raw frame is unpacked for every frame, so the unpacking cost is the same as live
+class SyntheticRawSource(RawSource):
+
+    def __init__(self, W, H, bits=12, fps=10, frames=None):
+        RawSource.__init__(self, W, H, bits)
+        self.raw, mosaic = synthetic_raw(W, H, bits)
+        self.fps = fps
+        self.frames = frames #stop after this many frames (None runs forever)
+        self.next_time = 0
+
+    def fill(self, buffer):
+        if self.frames is not None and self.seq >= self.frames:
+            return False
+        if self.fps:
+            now = time.monotonic()
+            if now < self.next_time:
+                time.sleep(self.next_time - now)
+            self.next_time = max(now, self.next_time) + 1.0/self.fps
+        self.unpacker.luminance(self.raw, buffer[:self.H, :self.W])
+        return True
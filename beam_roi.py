@@ -0,0 +1,175 @@
+#GitHub: koopaduo2
+#Automatic beam tracking region of interest for Beam GUI
+#Following ISO 11146 the beam is integrated over a window of 3 x D4σ around the centroid. The window follows
+#the beam every frame and falls back to a full frame search when the beam is lost, so a small spot only costs
+#a few tens of kilopixels per frame. The window can also be pushed to the sensor zoom to cut readout/transfer
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import cv2
+import math
+
+#share of a window's width/height inside of which its background level is not estimated: in a 3 x D4σ window
+#the beam is down to e⁻⁸ of its peak at the ellipse of 2/3 its size, the pixels outside of it (65 % of the
+#window) sample the background
+CLIP_INNER = 2.0/3
+
+#background level of a window (float32), estimated from its pixels outside the inscribed ellipse of CLIP_INNER
+#its size (mask: uint8, nonzero for the pixels which may be used): their mean (the baseline), plus sigma
+#standard deviations if given. Many pixels are needed: an error of the baseline is weighted with r² over the
+#whole window in the second moments
+def clip_level(crop, sigma=0, mask=None):
+    h, w = crop.shape[:2]
+    if h < 3 or w < 3:
+        return 0
+    outside = np.full((h, w), 255, np.uint8) if mask is None else mask.copy()
+    cv2.ellipse(outside, (((w - 1)/2.0, (h - 1)/2.0), (w*CLIP_INNER, h*CLIP_INNER), 0), 0, -1)
+    if not cv2.countNonZero(outside):
+        return 0
+    mean, std = cv2.meanStdDev(crop, mask=outside)
+    level = float(mean[0, 0])
+    if sigma:
+        level += sigma*float(std[0, 0])
+    return level
+
+#subtract the background level of a window in place (float32). With sigma = 0 only the baseline is removed and
+#the negative noise is kept (ISO 11146-3), so the noise averages out of the moments instead of adding a positive
+#floor which inflates D4σ. A sigma > 0 clips at baseline + sigma x noise and clamps at 0: less noise, but the
+#beam wings below the level are cut off too, so D4σ reads low (about 2 % at sigma = 2 without noise, more with)
+def subtract_level(window, level, sigma=0):
+    if level:
+        cv2.subtract(window, level, dst=window)
+    if sigma:
+        np.maximum(window, 0, out=window)
+    return window
+
+#beam tracking integration window in full frame pixel coordinates
+class BeamTracker(object):
+    factor = 3.0 #window size as a multiple of D4σ (ISO 11146 uses 3)
+    min_size = 32 #minimum window width/height (px)
+    detect_level = 10 #minimum gray value max for a beam to be detected
+    locked = False #True while the window is following a beam
+    x0, y0, x1, y1 = 0, 0, 0, 0 #current window (x1, y1 exclusive)
+    zoom_roi = None #(x0, y0, w, h) currently requested from the sensor, None for the full frame
+    level = 0 #background level subtracted from the last window
+    clip_sigma = 0 #background clip of the window (see subtract_level)
+
+    def __init__(self, W, H, pixel_um=1.55, factor=3.0, min_size=32, detect_level=10):
+        self.W, self.H = W, H
+        self.pixel_um = pixel_um
+        self.factor = factor
+        self.min_size = min_size
+        self.detect_level = detect_level
+        self.reset()
+
+    #search the full frame
+    def reset(self):
+        self.locked = False
+        self.x0, self.y0, self.x1, self.y1 = 0, 0, self.W, self.H
+
+    #full frame search on a downsampled copy of the frame: the window is seeded around the brightest spot
+    #with a size estimated from the area above half maximum (D4σ of a Gaussian is ~1.7x its FWHM).
+    #Integrating the full frame instead would let the background noise blow up D4σ and never converge
+    def search(self, image, fx0=0, fy0=0, step=8):
+        h, w = image.shape[:2]
+        small = cv2.resize(image, (max(w//step, 1), max(h//step, 1)), interpolation=cv2.INTER_AREA)
+        minv, maxv, minloc, maxloc = cv2.minMaxLoc(small)
+        if maxv < self.detect_level:
+            return False
+        above = cv2.countNonZero(cv2.compare(small, (minv + maxv)/2, cv2.CMP_GT))
+        fwhm = 2*math.sqrt(above/math.pi)*step
+        half = max(self.factor*1.7*fwhm/2, self.min_size/2)
+        cx = fx0 + (maxloc[0] + 0.5)*step
+        cy = fy0 + (maxloc[1] + 0.5)*step
+        self.x0, self.y0 = max(int(cx - half), 0), max(int(cy - half), 0)
+        self.x1, self.y1 = min(int(cx + half) + 1, self.W), min(int(cy + half) + 1, self.H)
+        return True
+
+    #crop the window out of a frame whose top left corner is at fx0, fy0 (non zero for sensor zoomed frames)
+    #a full frame search is run first if no beam is being tracked
+    #returns the cropped view (no copy) and its top left corner in full frame coordinates
+    def apply(self, image, fx0=0, fy0=0):
+        if not self.locked:
+            self.search(image, fx0, fy0)
+        h, w = image.shape[:2]
+        x0 = min(max(self.x0 - fx0, 0), w - 1)
+        y0 = min(max(self.y0 - fy0, 0), h - 1)
+        x1 = max(min(self.x1 - fx0, w), x0 + 1)
+        y1 = max(min(self.y1 - fy0, h), y0 + 1)
+        return image[y0:y1, x0:x1], x0 + fx0, y0 + fy0
+
+    #background level of a cropped window (see clip_level)
+    def clip_level(self, crop):
+        return clip_level(crop, self.clip_sigma)
+
+    #crop the window and subtract its background level (see subtract_level). Returns the background free
+    #float32 window and its top left corner in full frame coordinates. The window is written into out (a float32
+    #array, at least frame sized) if given, else into a new crop sized array. A dark reference (the size of
+    #image) is subtracted first
+    def apply_clipped(self, image, fx0=0, fy0=0, out=None, dark=None):
+        crop, x0, y0 = self.apply(image, fx0, fy0)
+        h, w = crop.shape[:2]
+        window = np.empty((h, w), np.float32) if out is None else out[:h, :w]
+        if dark is not None:
+            cx0, cy0 = x0 - fx0, y0 - fy0
+            cv2.subtract(crop, dark[cy0:cy0+h, cx0:cx0+w], dst=window, dtype=cv2.CV_32F)
+        else:
+            np.copyto(window, crop)
+        level = self.level = self.clip_level(window)
+        return subtract_level(window, level, self.clip_sigma), x0, y0
+
+    #move and resize the window from the statistics of the current frame (a beam_analysis.BeamStats)
+    #returns True while the beam is tracked
+    def update(self, stats):
+        if stats.pix_max < self.detect_level or stats.d4x <= 0 or stats.d4y <= 0:
+            #beam lost: fall back to a full frame search
+            self.reset()
+            return False
+        #half widths of the factor x D4σ window in pixels
+        hw = max(self.factor * stats.d4x / self.pixel_um / 2, self.min_size / 2)
+        hh = max(self.factor * stats.d4y / self.pixel_um / 2, self.min_size / 2)
+        cx, cy = stats.centroid_x, stats.centroid_y
+        self.x0 = max(int(cx - hw), 0)
+        self.y0 = max(int(cy - hh), 0)
+        self.x1 = min(int(cx + hw) + 1, self.W)
+        self.y1 = min(int(cy + hh) + 1, self.H)
+        if self.x1 <= self.x0 or self.y1 <= self.y0:
+            self.reset()
+            return False
+        self.locked = True
+        return True
+
+    #number of pixels in the current window
+    def area(self):
+        return (self.x1 - self.x0) * (self.y1 - self.y0)
+
+    #sensor zoom region for the current window, or None for the full frame
+    #the zoom is only changed when the window leaves it or becomes much smaller than it (every change
+    #restarts the camera), and the region is padded by margin and aligned to the camera's 32 x 16 blocks
+    def sensor_roi(self, margin=1.0):
+        if not self.locked:
+            self.zoom_roi = None
+            return None
+        roi = self.zoom_roi
+        if roi is not None:
+            inside = roi[0] <= self.x0 and roi[1] <= self.y0 and self.x1 <= roi[0] + roi[2] and self.y1 <= roi[1] + roi[3]
+            if inside and self.area() * 4 > roi[2] * roi[3]:
+                return roi
+        w = self.x1 - self.x0
+        h = self.y1 - self.y0
+        w = min((int(w * (1 + margin)) + 31) // 32 * 32, self.W)
+        h = min((int(h * (1 + margin)) + 15) // 16 * 16, self.H)
+        x0 = min(max((self.x0 + self.x1 - w) // 2, 0), self.W - w)
+        y0 = min(max((self.y0 + self.y1 - h) // 2, 0), self.H - h)
+        self.zoom_roi = (x0, y0, w, h)
+        return self.zoom_roi
+
+    #draw the window outline on a display image which has been downsampled by scale
+    def draw(self, image, scale=1, color=(0,0,0), thickness=2):
+        if self.locked:
+            cv2.rectangle(image, (round(self.x0/scale), round(self.y0/scale)), \
+                (round(self.x1/scale), round(self.y1/scale)), color, thickness)
+        return image
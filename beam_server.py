@@ -0,0 +1,522 @@
+#GitHub: koopaduo2
+#Headless streaming server for Beam GUI
+#Runs the capture -> analysis loop without Qt (no window to render over VNC) and serves the results over HTTP:
+#a JSON lines stream of the per frame statistics, an MJPEG or PNG preview at a client selected decimation and
+#control commands equivalent to the GUI buttons. Nothing is encoded while no client is connected
+#
+#usage: python beam_server.py [--host 127.0.0.1] [--port 8080] [--synthetic] [--replay saves/] [--raw-bits 12]
+#
+#endpoints (GET, /control also accepts a form encoded POST):
+#  /                  minimal page with the live preview
+#  /stats             JSON lines, one object per analyzed frame (LOG_COLUMNS), ?every=N sends every N-th frame
+#  /stats/latest      the last frame's statistics
+#  /status            frame rate, dropped frames, clients, logging and memory
+#  /preview.mjpg      MJPEG stream of the beam map, ?view=beam|camera, ?every=N previews, ?quality=80
+#  /preview.png       the last preview as a png, ?view=beam|camera
+#  /control?cmd=...   aperture (x, y, r, ry, shape), save, log (on=1|0, toggles without), cal (power in mW),
+#                     dark (capture a dark reference), bg (mode=off|dark|edge|dark+edge)
+#
+#test against localhost without a camera: python beam_server.py --synthetic, then
+#curl -N localhost:8080/stats or open http://localhost:8080/ in a browser
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import cv2
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+from beam_analysis import BeamAnalyzer
+from beam_aperture import Aperture, SHAPES
+from beam_source import PiCameraSource, SyntheticSource, FileSource, import_picamera, configure_camera
+from beam_raw import RawSource, PiRawSource, SyntheticRawSource
+from beam_writer import SaveJob, SaveWriter
+from beam_log import StatsLog, LOG_COLUMNS
+from beam_display import BeamDisplay, colormap
+from beam_timing import StageTimer
+from beam_buffers import BufferPool, MemoryMonitor
+from beam_background import Background, BACKGROUND_MODES
+
+#preview views: the beam map (with centroid lines and aperture) or the camera image
+VIEWS = ("beam", "camera")
+
+#control commands accepted by /control
+COMMANDS = ("aperture", "save", "log", "cal", "dark", "bg")
+
+#latest items published by the analysis loop (stats rows, preview images) and the clients waiting for them
+#publish(kind, item) replaces the item of a kind and wakes its clients, which wait(kind, after) for the next
+#one. Items are encoded by the clients' threads and previews are only rendered while wants(kind)
+class Broadcast(object):
+    closed = False #set on shutdown, wakes up and ends all streams
+
+    def __init__(self, kinds=("stats",)+VIEWS):
+        self.cond = threading.Condition()
+        self.clients = dict((kind, 0) for kind in kinds) #connected clients per kind
+        self.counts = dict((kind, 0) for kind in kinds) #items published per kind
+        self.items = {} #kind -> latest item
+        self.encoded = {} #(kind, ext, quality) -> (count, encoded bytes), images are encoded once per client format
+        self.encode_lock = threading.Lock()
+
+    #True if a client waits for items of kind (read without the lock, a stale answer only delays by a frame)
+    def wants(self, kind):
+        return self.clients[kind] > 0
+
+    def subscribe(self, kind):
+        with self.cond:
+            self.clients[kind] += 1
+
+    def unsubscribe(self, kind):
+        with self.cond:
+            self.clients[kind] -= 1
+
+    def publish(self, kind, item):
+        with self.cond:
+            self.items[kind] = item
+            self.counts[kind] += 1
+            self.cond.notify_all()
+
+    #wait until an item newer than the after-th one is published
+    #returns (count, item), or (count, None) on timeout or shutdown
+    def wait(self, kind, after, timeout=5.0):
+        with self.cond:
+            self.cond.wait_for(lambda: self.counts[kind] > after or self.closed, timeout)
+            if self.counts[kind] > after and not self.closed:
+                return self.counts[kind], self.items[kind]
+            return self.counts[kind], None
+
+    #latest (count, item) of kind, (0, None) before the first one
+    def latest(self, kind):
+        with self.cond:
+            return self.counts[kind], self.items.get(kind)
+
+    #RGB preview image encoded as ext (".jpg" or ".png"), shared by all clients of the same format
+    def encode(self, kind, count, image, ext=".jpg", quality=80):
+        key = (kind, ext, quality)
+        with self.encode_lock:
+            cached = self.encoded.get(key)
+            if cached is not None and cached[0] == count:
+                return cached[1]
+            params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext == ".jpg" else []
+            ok, data = cv2.imencode(ext, cv2.cvtColor(image, cv2.COLOR_RGB2BGR), params)
+            data = data.tobytes()
+            self.encoded[key] = (count, data)
+            return data
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+#capture -> analysis loop of the headless server, the Qt-free counterpart of captureThread (aperture mode)
+#control commands arrive on the HTTP threads and are handed over as flags or requests, like the GUI buttons
+class BeamServer(object):
+    ring_slots = 4 #number of preallocated frame buffers in the ring
+    drop_policy = "latest" #"latest" processes the newest frame and drops stale ones, "fifo" processes frames in order
+    pixel_um = 1.55 #multiply a pixel width by 1.55 micron to get physical width #SENSOR DEPENDENT
+    sat_level = 255 #gray value counted as saturated (2**bits - 1 for raw frames)
+    sat_num_allowed = 20 #number of allowed saturated pixels before considering the beam profile 'saturated'
+    preview_fps = 10 #maximum preview rate (previews are only rendered while a client is connected)
+    factor_P = 0 #power calibration factor (mW per count), set by the cal command
+    bg_mode = "off" #background subtraction, one of BACKGROUND_MODES
+    bg_level = 0 #background level subtracted from the last frame on top of the dark reference
+    SAVE_NOW = False #flag to save all data of the next frame once
+    LOGGING = False #flag to append every frame to the streaming log
+    DARK_NOW = False #flag to average the next frames into a new dark reference
+    aperture_request = None #(x, y, rx, ry, shape) set by the aperture command, applied by the loop
+    writer = None #background writer of the saved frames
+    stats_log = None #open StatsLog while logging
+    source = None #frame source which fills the ring
+    ring = None
+    running = False
+    message = "" #last event (saved, logging, dark reference), reported by /status
+    last_stats = None #(BeamStats, estimated power) of the last frame, used by cal
+
+    def __init__(self, source, W, H, savepath="saves", broadcast=None):
+        self.W, self.H = W, H
+        self.source = source
+        self.savepath = savepath
+        self.broadcast = broadcast or Broadcast()
+        if isinstance(source, RawSource):
+            self.sat_level = 2**source.bits - 1
+        self.analyzer = BeamAnalyzer(self.pixel_um, self.sat_level)
+        self.aperture = Aperture(int(W/2), int(H/2), int(H/2 - 100))
+        self.display = BeamDisplay(W, H, 4, self.preview_fps, self.sat_level)
+        self.timer = StageTimer(["capture", "analysis", "publish"])
+        self.buffers = BufferPool()
+        self.memory = MemoryMonitor()
+        self.background = Background(W, H, os.path.join(os.getcwd(), "backgrounds"))
+        self.lock = threading.Lock()
+
+    #run the loop until stop() (on the calling thread)
+    def run(self):
+        self.ring = self.source.start(self.ring_slots, self.drop_policy)
+        self.running = True
+        while self.running:
+            self.timer.start()
+            frame = self.ring.get(1.0)
+            if frame is None:
+                if self.ring.closed:
+                    break
+                continue
+            self.timer.mark("capture")
+            self.step(frame)
+            self.timer.end()
+            self.memory.sample()
+        self.close()
+
+    def stop(self):
+        self.running = False
+        self.source.stop()
+
+    #stop writing: close the log and wait for the queued saves
+    def close(self):
+        with self.lock:
+            if self.stats_log is not None:
+                self.stats_log.close()
+                self.stats_log = None
+        if self.writer is not None:
+            self.writer.flush()
+        self.broadcast.close()
+
+    #analyze one frame and publish the results
+    def step(self, frame):
+        with self.lock:
+            request, self.aperture_request = self.aperture_request, None
+        if request is not None:
+            self.aperture.set(*request)
+        image = frame.image if frame.image.ndim == 2 else \
+            cv2.cvtColor(frame.image, cv2.COLOR_BGR2GRAY, dst=self.buffers.get("gray", frame.image.shape[:2]))
+        if self.DARK_NOW:
+            path = self.background.add(image, frame.x0, frame.y0)
+            if path is not None:
+                self.DARK_NOW = False
+                self.message = "Dark reference saved to: "+path
+        #background subtraction fused into the aperture masking (see captureThread.beam)
+        mode = self.bg_mode
+        dark, dark_max = None, 0
+        if "dark" in mode:
+            dark, dark_max = self.background.reference(image.shape, frame.x0, frame.y0, image.dtype)
+        self.bg_level = self.aperture.edge_level(image, dark) if "edge" in mode else 0
+        image_m, x0, y0 = self.aperture.apply(image, self.buffers.get("masked", image.shape, image.dtype), \
+            dark, self.bg_level)
+        stats = self.analyzer.analyze(image_m, x0, y0, self.aperture.x, self.aperture.y, \
+            sat_level=self.sat_level - dark_max - self.bg_level)
+        self.timer.mark("analysis")
+        P_estimated = stats.pix_sum * self.factor_P
+        self.last_stats = (stats, P_estimated)
+        row = [frame.timestamp, frame.seq, stats.centroid_x, stats.centroid_y, stats.d4x, stats.d4y, \
+            P_estimated, stats.pix_max, stats.pix_sum, stats.sat_num, \
+            self.aperture.x, self.aperture.y, self.aperture.rx, self.aperture.ry]
+        self.publish(frame, image, stats, P_estimated, row)
+        self.timer.mark("publish")
+
+    #save, log and serve the results of a frame
+    def publish(self, frame, image, stats, P_estimated, row):
+        if self.SAVE_NOW:
+            self.SAVE_NOW = False
+            self.save(frame, image, stats, P_estimated)
+        with self.lock:
+            if self.LOGGING:
+                if self.stats_log is None:
+                    if not os.path.exists(self.savepath):
+                        os.makedirs(self.savepath)
+                    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+                    self.stats_log = StatsLog(os.path.join(self.savepath, "log_"+timestamp+".csv"))
+                    self.message = "Data logging to: "+self.stats_log.path
+                self.stats_log.append(row)
+            elif self.stats_log is not None:
+                self.stats_log.close()
+                self.stats_log = None
+                self.message = "Data logging stopped"
+        broadcast = self.broadcast
+        #the row is only encoded to JSON by the clients' threads
+        broadcast.publish("stats", row)
+        #previews are rendered at the preview rate and copied, the display buffers are reused
+        if (broadcast.wants("beam") or broadcast.wants("camera")) and self.display.due():
+            if broadcast.wants("beam"):
+                beam = self.display.beam(image, (stats.centroid_x, stats.centroid_y), self.aperture, frame.x0, frame.y0)
+                broadcast.publish("beam", beam.copy())
+            if broadcast.wants("camera"):
+                broadcast.publish("camera", self.display.camera(frame.image, frame.x0, frame.y0).copy())
+
+    #queue all data of the frame to the save writer (same files as the GUI's Save button)
+    def save(self, frame, image, stats, P_estimated):
+        if self.writer is None:
+            self.writer = SaveWriter(self.savepath)
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        ap = self.aperture
+        stats_rows = [("Image width (px), height (px)", (self.W, self.H)),
+            ("Centroid x (px), y (px)", (stats.centroid_x, stats.centroid_y)),
+            ("D4σ x, y", (stats.d4x, stats.d4y)),
+            ("Aperture x (px), y (px), radius (px), radius y (px), shape", (ap.x, ap.y, ap.rx, ap.ry, ap.shape)),
+            ("Estimated power (mW)", (P_estimated,)),
+            ("Gray value max (ct), sum (ct), saturated pixels (ct)", (stats.pix_max, stats.pix_sum, stats.sat_num)),
+            ("Saturation level (ct)", (self.sat_level,)),
+            ("Background mode, level (ct)", (self.bg_mode, self.bg_level))]
+        row = min(max(round(stats.centroid_y) - frame.y0, 0), image.shape[0]-1)
+        col = min(max(round(stats.centroid_x) - frame.x0, 0), image.shape[1]-1)
+        job = SaveJob(timestamp, frame.image.copy(), colormap(image, self.display.lut, self.sat_level), \
+            stats_rows, image[row,:].copy(), image[:,col].copy(), self.sat_level, frame.x0, frame.y0)
+        self.writer.submit(job, "block")
+        self.message = "Data saved to: "+os.path.abspath(self.savepath)
+
+    #apply a control command (called on the HTTP threads). params is a dict of strings
+    #returns a message, raises ValueError for invalid commands or parameters
+    def command(self, cmd, params):
+        if cmd not in COMMANDS:
+            raise ValueError("Unknown command: "+str(cmd))
+        if cmd == "aperture":
+            ap = self.aperture
+            x = int(params.get("x", ap.x))
+            y = int(params.get("y", ap.y))
+            rx = int(params.get("r", ap.rx))
+            ry = int(params.get("ry", rx if "r" in params else ap.ry))
+            shape = params.get("shape", ap.shape)
+            if shape not in SHAPES:
+                raise ValueError("Unknown aperture shape: "+shape)
+            with self.lock:
+                self.aperture_request = (x, y, rx, ry, shape)
+            return "Aperture set to %d, %d, %d, %d, %s" % (x, y, rx, ry, shape)
+        if cmd == "save":
+            self.SAVE_NOW = True
+            return "Saving the next frame to: "+os.path.abspath(self.savepath)
+        if cmd == "log":
+            on = params.get("on")
+            with self.lock:
+                self.LOGGING = (not self.LOGGING) if on is None else on not in ("0", "false", "off")
+            return "Data logging started" if self.LOGGING else "Data logging stopped"
+        if cmd == "cal":
+            measured_P = float(params.get("power", 0))
+            if self.last_stats is None:
+                raise ValueError("Calibration failed! No frame analyzed yet")
+            stats = self.last_stats[0]
+            if stats.sat_num > self.sat_num_allowed:
+                raise ValueError("Calibration failed! Image is saturated")
+            if not stats.pix_max > 0:
+                raise ValueError("Calibration failed! No beam detected")
+            self.factor_P = measured_P / stats.pix_sum
+            return "Power meter calibrated!"
+        if cmd == "dark":
+            self.DARK_NOW = True
+            return "Capturing dark reference, keep the beam blocked"
+        if cmd == "bg":
+            mode = params.get("mode", "")
+            if mode not in BACKGROUND_MODES:
+                raise ValueError("Unknown background mode: "+mode)
+            self.bg_mode = mode
+            return "Background mode: "+mode
+
+    #state of the server for /status
+    def status(self):
+        broadcast = self.broadcast
+        return {"fps": round(self.timer.fps(), 2), "frames": self.timer.count, \
+            "dropped": self.ring.frames_dropped if self.ring is not None else 0, \
+            "ms": dict(zip(self.timer.stages, [round(float(t), 3) for t in self.timer.mean_ms()])), \
+            "clients": dict(broadcast.clients), "logging": self.LOGGING, \
+            "log": self.stats_log.path if self.stats_log is not None else None, \
+            "saved": self.writer.frames_written if self.writer is not None else 0, \
+            "factor_p": self.factor_P, "bg_mode": self.bg_mode, "sat_level": self.sat_level, \
+            "rss_mb": round(self.memory.rss_mb, 1), "message": self.message}
+
+#one JSON line (numpy scalars are converted to python numbers)
+def json_line(obj):
+    return (json.dumps(obj, default=lambda value: value.item()) + "\n").encode()
+
+#HTTP endpoints of a BeamServer (self.server.beam)
+class BeamRequestHandler(BaseHTTPRequestHandler):
+    server_version = "BeamServer/1.0"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.handle_path(url.path, dict(parse_qsl(url.query)))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            params.update(parse_qsl(self.rfile.read(length).decode()))
+        self.handle_path(url.path, params)
+
+    def handle_path(self, path, params):
+        routes = {"/": self.index, "/stats": self.stats_stream, "/stats/latest": self.stats_latest, \
+            "/status": self.status, "/preview.mjpg": self.preview_mjpeg, "/preview.png": self.preview_png, \
+            "/control": self.control}
+        route = routes.get(path.rstrip("/") or "/")
+        if route is None:
+            self.reply(404, {"ok": False, "error": "Unknown endpoint: "+path})
+            return
+        try:
+            route(params)
+        except (BrokenPipeError, ConnectionResetError):
+            pass #the client disconnected
+
+    #send a complete response (dicts are sent as json)
+    def reply(self, code, body, content_type="application/json"):
+        if isinstance(body, dict):
+            body = json_line(body)
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def index(self, params):
+        self.reply(200, b"<html><head><title>Beam GUI</title></head><body>"
+            b"<img src='/preview.mjpg'><p><a href='/stats'>stats</a> <a href='/status'>status</a></p>"
+            b"</body></html>", "text/html")
+
+    #every=N: every N-th published item (raises ValueError for a non integer N)
+    def every(self, params):
+        return max(int(params.get("every", 1)), 1)
+
+    def stats_stream(self, params):
+        broadcast = self.server.beam.broadcast
+        try:
+            every = self.every(params)
+        except ValueError as error:
+            self.reply(400, {"ok": False, "error": str(error)})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        broadcast.subscribe("stats")
+        try:
+            count = broadcast.latest("stats")[0]
+            while not broadcast.closed:
+                count, row = broadcast.wait("stats", count + every - 1)
+                if row is not None:
+                    self.wfile.write(json_line(dict(zip(LOG_COLUMNS, row))))
+                    self.wfile.flush()
+        finally:
+            broadcast.unsubscribe("stats")
+
+    def stats_latest(self, params):
+        count, item = self.server.beam.broadcast.latest("stats")
+        if item is None:
+            self.reply(503, {"ok": False, "error": "No frame analyzed yet"})
+        else:
+            self.reply(200, dict(zip(LOG_COLUMNS, item)))
+
+    def status(self, params):
+        self.reply(200, self.server.beam.status())
+
+    def view(self, params):
+        view = params.get("view", "beam")
+        if view not in VIEWS:
+            raise ValueError("Unknown view: "+view)
+        return view
+
+    def preview_mjpeg(self, params):
+        broadcast = self.server.beam.broadcast
+        try:
+            every = self.every(params)
+            view = self.view(params)
+            quality = min(max(int(params.get("quality", 80)), 1), 100)
+        except ValueError as error:
+            self.reply(400, {"ok": False, "error": str(error)})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        broadcast.subscribe(view)
+        try:
+            count = 0
+            while not broadcast.closed:
+                count, image = broadcast.wait(view, count + every - 1)
+                if image is None:
+                    continue
+                jpeg = broadcast.encode(view, count, image, ".jpg", quality)
+                self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " + \
+                    str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                self.wfile.flush()
+        finally:
+            broadcast.unsubscribe(view)
+
+    #a single preview: the client counts as connected until the next preview is rendered
+    def preview_png(self, params):
+        broadcast = self.server.beam.broadcast
+        try:
+            view = self.view(params)
+        except ValueError as error:
+            self.reply(400, {"ok": False, "error": str(error)})
+            return
+        broadcast.subscribe(view)
+        try:
+            count, image = broadcast.wait(view, broadcast.latest(view)[0])
+        finally:
+            broadcast.unsubscribe(view)
+        if image is None:
+            self.reply(503, {"ok": False, "error": "No preview available"})
+        else:
+            self.reply(200, broadcast.encode(view, count, image, ".png"), "image/png")
+
+    def control(self, params):
+        try:
+            message = self.server.beam.command(params.get("cmd"), params)
+        except ValueError as error:
+            self.reply(400, {"ok": False, "error": str(error)})
+            return
+        self.reply(200, {"ok": True, "message": message})
+
+    #no per request logging on the console
+    def log_message(self, format, *args):
+        pass
+
+#open the frame source: saved images, the synthetic beam, or the Pi camera (synthetic without one)
+def open_source(W, H, replay=None, synthetic=False, raw_bits=0):
+    if replay is not None:
+        return FileSource(replay, W, H)
+    PiCamera = None if synthetic else import_picamera()[0]
+    if PiCamera is None:
+        if not synthetic:
+            print("No camera found! Running on a synthetic beam")
+        return SyntheticRawSource(W, H, raw_bits) if raw_bits else SyntheticSource(W, H)
+    camera = PiCamera()
+    camera.resolution = (W, H)
+    time.sleep(0.1)
+    configure_camera(camera)
+    if raw_bits:
+        return PiRawSource(camera, W, H, raw_bits)
+    return PiCameraSource(camera, W, H)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Beam GUI analysis headless and serve it over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for remote clients)")
+    parser.add_argument("--port", type=int, default=8080, help="HTTP port")
+    parser.add_argument("--resolution", default="2592x1944", help="camera resolution WxH")
+    parser.add_argument("--synthetic", action="store_true", help="analyze a synthetic beam instead of the camera")
+    parser.add_argument("--replay", help="directory (or glob) of saved camera images to replay")
+    parser.add_argument("--raw-bits", type=int, default=0, choices=(0, 10, 12), help="analyze 10/12-bit raw frames")
+    parser.add_argument("--preview-fps", type=float, default=10, help="maximum preview rate")
+    parser.add_argument("--savepath", default="saves", help="directory of saved and logged data")
+    args = parser.parse_args(argv)
+
+    W, H = [int(v) for v in args.resolution.lower().split("x")]
+    BeamServer.preview_fps = args.preview_fps
+    beam = BeamServer(open_source(W, H, args.replay, args.synthetic, args.raw_bits), W, H, args.savepath)
+    httpd = ThreadingHTTPServer((args.host, args.port), BeamRequestHandler)
+    httpd.daemon_threads = True
+    httpd.beam = beam
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    print("Serving on http://%s:%d/" % httpd.server_address[:2])
+    try:
+        beam.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        beam.stop()
+        beam.close()
+        httpd.shutdown()
+
+if __name__ == "__main__":
+    main()
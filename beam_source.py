@@ -0,0 +1,440 @@
+#GitHub: koopaduo2
+#Frame sources and ring buffer for Beam GUI
+#A frame source fills a fixed ring of preallocated frame buffers from its own thread, so acquisition
+#keeps running while the previous frame is being processed. Sources other than the Pi camera
+#(synthetic beams, saved image files) let the whole pipeline run on a machine without a camera
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+from collections import namedtuple
+import numpy as np
+import cv2
+import glob
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+#one captured frame. seq is the source's frame counter (gaps mean dropped frames),
+#timestamp is time.monotonic() at capture and image is a (H, W, 3) BGR (or (H, W) uint16 raw luminance)
+#view of the ring slot
+#x0, y0 is the frame's top left corner on the sensor (non zero when the sensor is zoomed to a region of interest)
+#slot is the ring buffer index holding the frame
+Frame = namedtuple("Frame", ["seq", "timestamp", "image", "x0", "y0", "slot"])
+
+#drop policies for the consumer of a FrameRing
+#"latest": always process the newest frame, all older unprocessed frames are dropped
+#"fifo": process frames in order, frames are only dropped when the ring overflows
+POLICIES = ("latest", "fifo")
+
+#fixed ring of preallocated frame buffers shared between one producer and one consumer
+#with shared=True the buffers live in one multiprocessing shared memory block (see beam_parallel.py)
+#so other processes can attach to them by name (ring.shm.name) without copying frames
+class FrameRing(object):
+    frames_written = 0 #frames committed by the producer
+    frames_read = 0 #frames handed to the consumer
+    frames_dropped = 0 #frames overwritten or skipped before they were processed
+    shm = None #SharedMemory block of the buffers (shared rings only)
+
+    def __init__(self, W, H, slots=4, policy="latest", channels=3, dtype=np.uint8, pad_W=None, pad_H=None, \
+        shared=False):
+        if slots < 3:
+            raise ValueError("A frame ring needs at least 3 slots")
+        if policy not in POLICIES:
+            raise ValueError("Unknown drop policy: "+str(policy))
+        self.W, self.H = W, H
+        self.policy = policy
+        #buffers may be padded (the Pi camera pads rows to 32 and columns to 16 pixels)
+        pad_W = pad_W or W
+        pad_H = pad_H or H
+        shape = (pad_H, pad_W, channels) if channels > 1 else (pad_H, pad_W)
+        self.shape, self.dtype = shape, np.dtype(dtype)
+        if shared:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots*int(np.prod(shape))*self.dtype.itemsize)
+            block = np.ndarray((slots,)+shape, self.dtype, buffer=self.shm.buf)
+            self.buffers = [block[i] for i in range(slots)]
+        else:
+            self.buffers = [np.zeros(shape, dtype) for i in range(slots)]
+        self.seqs = [-1]*slots
+        self.timestamps = [0.0]*slots
+        self.rois = [None]*slots #(x0, y0, w, h, pad_w, pad_h) of frames smaller than the full frame
+        self.pending = [] #committed slots not yet read, oldest first
+        self.reading = None #slot currently held by the consumer
+        self.held = set() #slots retained by the consumer until release() (e.g. while worker processes use them)
+        self.writing = None #slot currently being filled by the producer
+        self.closed = False
+        self.cond = threading.Condition()
+
+    #producer: get a free buffer to fill. Never returns the slot the consumer is holding
+    def acquire(self):
+        with self.cond:
+            while True:
+                busy = set(self.pending) | self.held
+                busy.add(self.reading)
+                free = [i for i in range(len(self.buffers)) if i not in busy]
+                if free:
+                    slot = free[0]
+                    break
+                if self.pending:
+                    #ring overflow: reuse the oldest unread frame
+                    slot = self.pending.pop(0)
+                    self.frames_dropped += 1
+                    break
+                #every slot is retained by the consumer: wait for a release
+                self.cond.wait(0.1)
+            self.writing = slot
+            return slot, self.buffers[slot]
+
+    #producer: publish the filled buffer
+    #roi = (x0, y0, w, h, pad_w, pad_h) if the buffer holds a (padded) region of interest frame packed
+    #at the start of the buffer instead of a full frame
+    def commit(self, slot, seq, timestamp=None, roi=None):
+        with self.cond:
+            self.seqs[slot] = seq
+            self.rois[slot] = roi
+            self.timestamps[slot] = time.monotonic() if timestamp is None else timestamp
+            self.writing = None
+            self.pending.append(slot)
+            self.frames_written += 1
+            self.cond.notify_all()
+
+    #consumer: wait for the next frame according to the drop policy and hold it until the next get
+    #with retain=True the slot is instead held until release(frame.slot), so several frames can be in use
+    #returns None on timeout or when the ring is closed
+    def get(self, timeout=None, retain=False):
+        with self.cond:
+            #release the previously held slot
+            self.reading = None
+            if not self.cond.wait_for(lambda: self.pending or self.closed, timeout):
+                return None
+            if self.closed and not self.pending:
+                return None
+            if self.policy == "latest":
+                #drop all stale frames
+                self.frames_dropped += len(self.pending) - 1
+                slot = self.pending[-1]
+                self.pending = []
+            else:
+                slot = self.pending.pop(0)
+            if retain:
+                self.held.add(slot)
+            else:
+                self.reading = slot
+            self.frames_read += 1
+            roi = self.rois[slot]
+            if roi is None:
+                return Frame(self.seqs[slot], self.timestamps[slot], self.buffers[slot][:self.H, :self.W], 0, 0, slot)
+            x0, y0, w, h, pad_w, pad_h = roi
+            buffer = self.buffers[slot]
+            image = buffer.reshape(-1)[:pad_w*pad_h*buffer[0,0].size].reshape((pad_h, pad_w)+buffer.shape[2:])
+            return Frame(self.seqs[slot], self.timestamps[slot], image[:h, :w], x0, y0, slot)
+
+    #consumer: give a slot retained by get(retain=True) back to the producer
+    def release(self, slot):
+        with self.cond:
+            self.held.discard(slot)
+            self.cond.notify_all()
+
+    #wake up the consumer and stop handing out frames
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    #free the shared memory block (shared rings only, once no process uses the frames anymore)
+    def unlink(self):
+        if self.shm is not None:
+            self.buffers = []
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+#base class of all frame sources
+#subclasses implement fill(buffer) which writes the next frame into buffer (returns False when exhausted)
+#start() runs the acquisition loop in a background thread which fills the ring
+class FrameSource(object):
+    W, H = 0, 0
+    pad_W, pad_H = None, None #padded buffer size required by the source (if any)
+    channels, dtype = 3, np.uint8 #frame format (8-bit BGR, raw sources deliver 16-bit luminance)
+    ring = None
+    thread = None
+    running = False
+    seq = 0 #sequence number of the next frame
+
+    def __init__(self, W, H):
+        self.W, self.H = W, H
+
+    def fill(self, buffer):
+        raise NotImplementedError
+
+    #create the ring buffer and start the acquisition thread
+    #shared=True puts the ring buffers in shared memory for worker processes
+    def start(self, slots=4, policy="latest", shared=False):
+        self.ring = FrameRing(self.W, self.H, slots, policy, self.channels, self.dtype, self.pad_W, self.pad_H, shared)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self.ring
+
+    #acquisition loop (runs in the source's thread)
+    #the ring is closed when the source is exhausted or fails, so readers can tell it stopped (ring.closed)
+    def run(self):
+        try:
+            while self.running:
+                slot, buffer = self.ring.acquire()
+                if not self.fill(buffer):
+                    break
+                self.ring.commit(slot, self.seq)
+                self.seq += 1
+        finally:
+            self.ring.close()
+
+    def stop(self):
+        self.running = False
+        if self.ring is not None:
+            self.ring.close()
+        if self.thread is not None:
+            self.thread.join(1)
+
+#picamera is only available on the Raspberry Pi and slow to import, so it is only imported when the camera
+#is opened. Returns (PiCamera, PiRGBArray) or (None, None) without it (a synthetic beam is used then)
+def import_picamera():
+    try:
+        from picamera.array import PiRGBArray
+        from picamera import PiCamera
+    except ImportError:
+        return None, None
+    return PiCamera, PiRGBArray
+
+#configure an open PiCamera for laser profiling (used by the GUI and the headless server)
+def configure_camera(camera):
+    #these settings were chosen to minimize exposure and gain for laser profiling
+    #even at minimum settings, the camera will most likely need a variable ND filter
+    camera.awb_mode = 'off' #AWB mode
+    camera.awb_gains = (3.1,3.1) #manual AWB gain settings
+    camera.brightness = 50 #Image brightness
+    camera.meter_mode = 'backlit' #Metering mode
+    camera.exposure_mode = 'off' #Prevent auto exposure so results are consistent
+    camera.exposure_compensation = 0 #Exposure compensation
+    camera.shutter_speed = 10 #Minimum shutter speed
+    #vflip should be set to True since the camera sensor is lensless and will not have the image inverted
+    #hflip can be set to True or False depending on how you want the image to move as you physically move
+    #the beam spot location on the sensor. It is ultimately an alignment convention
+    camera.vflip = True
+    camera.hflip = False
+    camera.iso = 1
+    camera.saturation = 0
+    #If ZOOM_BOOL is set to True, the camera capture will be zoomed in to a Region of Interest
+    #The ROI will be the full Field of View cropped by a ratio of crop_factor
+    #the roi_start_x, roi_start_y are the origin (top left corner) of the ROI
+    ZOOM_BOOL = False
+    if ZOOM_BOOL:
+        crop_factor = 0.4
+        roi_start_x = (1-crop_factor)/2
+        roi_start_y = (1-crop_factor)/2
+        camera.zoom = (roi_start_x,roi_start_y,crop_factor,crop_factor)
+    #If CAMERA_SETTINGS is set to True, the camera settings will be printed on camera init
+    CAMERA_SETTINGS=True
+    if CAMERA_SETTINGS:
+        print("AWB is "+str(camera.awb_mode))
+        print("AWB gain is "+str(camera.awb_gains))
+        print("Brightness is "+str(camera.brightness))
+        print("Aperture is "+str(camera.exposure_compensation))
+        print("Shutter speed is "+str(camera.shutter_speed))
+        print("Camera exposure speed is "+str(camera.exposure_speed))
+        print("Iso is "+str(camera.iso))
+        print("Camera digital gain is "+str(camera.digital_gain))
+        print("Camera analog gain is "+str(camera.analog_gain))
+        print("Camera v/h flip is "+str(camera.vflip)+", "+str(camera.hflip))
+        print("Camera contrast is "+str(camera.contrast))
+        print("Camera color saturation is "+str(camera.saturation))
+        print("Camera meter mode is "+str(camera.meter_mode))
+        if ZOOM_BOOL:
+            print("Camera crop factor is "+str(crop_factor))
+        else:
+            print("Camera crop is disabled")
+
+#Pi camera source using the video port for continuous capture
+#camera must be an already configured PiCamera (see captureThread.init_camera)
+class PiCameraSource(FrameSource):
+
+    #file-like output which lets picamera write a raw bgr frame directly into a ring buffer
+    class SlotOutput(object):
+        def __init__(self):
+            self.view = None
+            self.pos = 0
+
+        def write(self, data):
+            n = len(data)
+            self.view[self.pos:self.pos+n] = data
+            self.pos += n
+            return n
+
+        def flush(self):
+            pass
+
+    roi = None #current sensor region of interest (x0, y0, w, h), None for the full frame
+    pending_roi = False #region of interest requested by set_roi, applied by the capture thread
+
+    def __init__(self, camera, W, H):
+        FrameSource.__init__(self, W, H)
+        self.camera = camera
+        #raw captures are padded to a multiple of 32 columns and 16 rows
+        self.pad_W = (W + 31) // 32 * 32
+        self.pad_H = (H + 15) // 16 * 16
+
+    #request a sensor region of interest (x0, y0, w, h) in full frame pixels, or None for the full frame
+    #w should be a multiple of 32 and h a multiple of 16. Changing the zoom restarts the capture sequence
+    def set_roi(self, roi):
+        if roi != self.roi:
+            self.pending_roi = roi
+
+    #zoom the sensor and reduce the resolution so that output pixels still map 1:1 to full frame pixels
+    def apply_roi(self, roi):
+        self.roi = roi
+        if roi is None:
+            self.camera.zoom = (0.0, 0.0, 1.0, 1.0)
+            self.camera.resolution = (self.W, self.H)
+        else:
+            x0, y0, w, h = roi
+            self.camera.zoom = (x0/self.W, y0/self.H, w/self.W, h/self.H)
+            self.camera.resolution = (w, h)
+
+    #picamera drives its own loop through capture_sequence, which asks for one output per frame
+    #the sequence is ended and restarted whenever the region of interest changes
+    def run(self):
+        output = self.SlotOutput()
+
+        def outputs():
+            if self.roi is None:
+                roi = None
+            else:
+                x0, y0, w, h = self.roi
+                roi = (x0, y0, w, h, (w + 31) // 32 * 32, (h + 15) // 16 * 16)
+            while self.running and self.pending_roi is False:
+                slot, buffer = self.ring.acquire()
+                output.view = memoryview(buffer).cast("B")
+                output.pos = 0
+                yield output
+                self.ring.commit(slot, self.seq, roi=roi)
+                self.seq += 1
+
+        try:
+            while self.running:
+                if self.pending_roi is not False:
+                    roi, self.pending_roi = self.pending_roi, False
+                    self.apply_roi(roi)
+                self.camera.capture_sequence(outputs(), format="bgr", use_video_port=True)
+        finally:
+            self.ring.close()
+
+#kinds of synthetic beams generated by synthetic_frame
+BEAM_KINDS = ("gaussian", "elliptical", "multimode", "noisy", "saturated")
+
+#generate one synthetic BGR beam frame (uint8, H x W x 3) for tests and benchmarks
+#gaussian: round TEM00 beam, elliptical: 2:1 TEM00 beam, multimode: TEM00 + TEM10 + TEM01 mixture,
+#noisy: weak beam on a noisy background, saturated: TEM00 beam clipped at 255
+#waist_px is the 1/e² radius, cx, cy default to the frame center
+def synthetic_frame(W, H, kind="gaussian", waist_px=None, cx=None, cy=None, seed=0):
+    if kind not in BEAM_KINDS:
+        raise ValueError("Unknown beam kind: "+str(kind))
+    waist_px = waist_px or H/16
+    cx = W/2 if cx is None else cx
+    cy = H/2 if cy is None else cy
+    rng = np.random.default_rng(seed)
+    #separable 1d axes normalized to the waist
+    u = (np.arange(W, dtype=np.float32) - cx)/waist_px
+    v = (np.arange(H, dtype=np.float32) - cy)/waist_px
+    gx = np.exp(-2*u**2)
+    gy = np.exp(-2*v**2)
+    if kind == "elliptical":
+        beam = 220*np.outer(np.exp(-2*(v*2)**2), gx)
+    elif kind == "multimode":
+        #Hermite-Gaussian modes, the TEM10/TEM01 intensity is (2 x²/w²) exp(-2 x²/w²)
+        beam = 140*np.outer(gy, gx) + 160*np.outer(gy, 4*u**2*gx) + 100*np.outer(4*v**2*gy, gx)
+    elif kind == "noisy":
+        beam = 40*np.outer(gy, gx) + rng.normal(12, 6, (H, W)).astype(np.float32)
+    elif kind == "saturated":
+        beam = 600*np.outer(gy, gx)
+    else:
+        beam = 220*np.outer(gy, gx)
+    if kind != "noisy":
+        beam += rng.uniform(0, 3, (H, W)).astype(np.float32)
+    gray = np.clip(beam, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+#synthetic Gaussian beam source for testing and benchmarking without a camera
+#the beam wanders slowly around the frame center and gets some gray noise added
+class SyntheticSource(FrameSource):
+
+    def __init__(self, W, H, fps=30, waist_px=150, ellipticity=1.0, peak=220, noise=4, wander_px=20, frames=None):
+        FrameSource.__init__(self, W, H)
+        self.fps = fps
+        self.waist_px = waist_px
+        self.ellipticity = ellipticity
+        self.peak = peak
+        self.noise = noise
+        self.wander_px = wander_px
+        self.frames = frames #stop after this many frames (None runs forever)
+        self.next_time = 0
+        self.rng = np.random.default_rng(0)
+        #precompute separable x and y axes, only the beam position changes per frame
+        self.x = np.arange(W, dtype=np.float32)
+        self.y = np.arange(H, dtype=np.float32)
+        self.beam = np.empty((H, W), np.float32)
+        self.gray = np.empty((H, W), np.uint8)
+
+    def fill(self, buffer):
+        if self.frames is not None and self.seq >= self.frames:
+            return False
+        #pace the source to the requested frame rate
+        if self.fps:
+            now = time.monotonic()
+            if now < self.next_time:
+                time.sleep(self.next_time - now)
+            self.next_time = max(now, self.next_time) + 1.0/self.fps
+        t = self.seq / 30.0
+        cx = self.W/2 + self.wander_px*np.sin(t)
+        cy = self.H/2 + self.wander_px*np.cos(0.7*t)
+        gx = self.peak*np.exp(-2*((self.x - cx)/self.waist_px)**2)
+        gy = np.exp(-2*((self.y - cy)/(self.waist_px*self.ellipticity))**2)
+        beam = np.outer(gy, gx, out=self.beam)
+        if self.noise:
+            beam += self.rng.uniform(0, self.noise, beam.shape).astype(np.float32)
+        np.clip(beam, 0, 255, out=beam)
+        self.gray[...] = beam
+        cv2.cvtColor(self.gray, cv2.COLOR_GRAY2BGR, dst=buffer[:self.H, :self.W])
+        return True
+
+#file-backed source which replays saved camera images (e.g. saves/camera_*.png) in name order
+#pattern is a directory of saved data or a glob pattern. Images are resized to W x H if given
+class FileSource(FrameSource):
+
+    def __init__(self, pattern, W=None, H=None, fps=10, loop=True):
+        self.files = sorted(glob.glob(os.path.join(pattern, "camera_*.png")) if os.path.isdir(pattern) \
+            else glob.glob(pattern))
+        if not self.files:
+            raise IOError("No images found for: "+str(pattern))
+        if W is None or H is None:
+            first = cv2.imread(self.files[0])
+            W, H = first.shape[1], first.shape[0]
+        FrameSource.__init__(self, W, H)
+        self.fps = fps
+        self.loop = loop
+        self.next_time = 0
+
+    def fill(self, buffer):
+        if self.seq >= len(self.files) and not self.loop:
+            return False
+        if self.fps:
+            now = time.monotonic()
+            if now < self.next_time:
+                time.sleep(self.next_time - now)
+            self.next_time = max(now, self.next_time) + 1.0/self.fps
+        image = cv2.imread(self.files[self.seq % len(self.files)])
+        if image.shape[:2] != (self.H, self.W):
+            image = cv2.resize(image, (self.W, self.H))
+        buffer[:self.H, :self.W] = image
+        return True
@@ -0,0 +1,190 @@
+#GitHub: koopaduo2
+#Multi-spot analysis for Beam GUI
+#Fiber arrays, diffraction orders and ghost reflections put several beams on the sensor. The spots are found
+#once per frame by thresholding and labeling a downsampled copy of the frame, then every spot is analyzed at
+#full resolution in its own window only, so the cost follows the total spot area instead of the frame size.
+#Spot identities are kept across frames by matching every spot to the nearest spot of the previous frame
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+from collections import namedtuple
+import numpy as np
+import cv2
+import math
+from beam_buffers import BufferPool
+from beam_roi import clip_level, subtract_level
+
+#one analyzed spot: id stays the same while the spot is tracked, x0, y0, x1, y1 is its analysis window in full
+#frame pixels (x1, y1 exclusive), share its fraction of the summed power of all spots and stats its BeamStats
+Spot = namedtuple("Spot", ["id", "x0", "y0", "x1", "y1", "share", "stats"])
+
+#columns of the per spot streaming log (one row per spot and frame, see beam_log.StatsLog)
+SPOT_COLUMNS = ["t", "frame", "spot", "centroid_x", "centroid_y", "d4x", "d4y", "share", \
+    "pix_max", "pix_sum", "sat_num"]
+
+#finds, analyzes and tracks all spots of a frame
+#analyze(image) returns the list of Spots sorted by id (also kept as self.spots for drawing)
+class SpotFinder(object):
+    step = 8 #downsampling factor of the detection image
+    threshold = 0.135 #detection threshold as a fraction of the frame's peak above its minimum (1/e²)
+    detect_level = 10 #minimum gray value max for any spot to be detected
+    min_area = 2 #minimum spot area in detection pixels, smaller components are treated as noise
+    max_spots = 64 #largest spots analyzed per frame
+    factor = 3.0 #window size as a multiple of the spot's D4σ (ISO 11146 uses 3)
+    min_size = 16 #minimum window width/height (px)
+    max_missed = 5 #frames a spot may go undetected before its id is retired
+    next_id = 1 #id of the next new spot
+    clip_sigma = 0 #background clip of the windows (see beam_roi.subtract_level)
+
+    def __init__(self, W, H, analyzer, step=8, threshold=0.135, detect_level=10, factor=3.0):
+        self.W, self.H = W, H
+        self.analyzer = analyzer #beam_analysis.BeamAnalyzer of the spot windows (its pixel_um converts D4σ)
+        self.step = step
+        self.threshold = threshold
+        self.detect_level = detect_level
+        self.factor = factor
+        self.buffers = BufferPool()
+        self.tracks = {} #id -> [centroid x, centroid y, half window width, half window height, frames missed]
+        self.spots = []
+
+    #label the spots of a downsampled copy of the frame
+    #returns a list of (centroid x, centroid y, half width, half height) in full frame pixels, largest spots
+    #first. The half sizes are factor x the size above the threshold (~D4σ of a Gaussian)
+    def detect(self, image, fx0=0, fy0=0):
+        step = self.step
+        h, w = image.shape[:2]
+        sw, sh = max(w//step, 1), max(h//step, 1)
+        small = cv2.resize(image, (sw, sh), dst=self.buffers.get("small", (sh, sw), image.dtype), \
+            interpolation=cv2.INTER_AREA)
+        minv, maxv, minloc, maxloc = cv2.minMaxLoc(small)
+        if maxv < self.detect_level:
+            return []
+        mask = cv2.compare(small, minv + self.threshold*(maxv - minv), cv2.CMP_GT, \
+            dst=self.buffers.get("mask", (sh, sw)))
+        n, labels, cc_stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        found = []
+        for label in range(1, n):
+            x, y, bw, bh, area = cc_stats[label]
+            if area < self.min_area:
+                continue
+            cx = fx0 + (centroids[label][0] + 0.5)*step
+            cy = fy0 + (centroids[label][1] + 0.5)*step
+            found.append((area, cx, cy, self.factor*bw*step/2, self.factor*bh*step/2))
+        found.sort(reverse=True)
+        return [spot[1:] for spot in found[:self.max_spots]]
+
+    #match the detected spots to the tracked ones (nearest first, within the tracked window)
+    #returns the spot ids in the order of found, new spots get new ids
+    def match(self, found):
+        pairs = []
+        for i, (cx, cy, hw, hh) in enumerate(found):
+            for spot_id, (tx, ty, thw, thh, missed) in self.tracks.items():
+                dist = math.hypot(cx - tx, cy - ty)
+                if dist < max(thw, thh, self.min_size):
+                    pairs.append((dist, i, spot_id))
+        pairs.sort()
+        ids = [None]*len(found)
+        taken = set()
+        for dist, i, spot_id in pairs:
+            if ids[i] is None and spot_id not in taken:
+                ids[i] = spot_id
+                taken.add(spot_id)
+        for i in range(len(found)):
+            if ids[i] is None:
+                ids[i] = self.next_id
+                self.next_id += 1
+        #retire spots which stayed undetected
+        for spot_id in list(self.tracks):
+            if spot_id not in taken:
+                self.tracks[spot_id][4] += 1
+                if self.tracks[spot_id][4] > self.max_missed:
+                    del self.tracks[spot_id]
+        return ids
+
+    #analyze all spots of a grayscale frame whose top left corner is at fx0, fy0
+    #dark (the size of image) and each window's border background level are subtracted first (see
+    #BeamTracker.apply_clipped), pixels of other spots inside a window are zeroed
+    #sat_level is the saturation level of the frames before the subtraction (dark_max is the dark maximum)
+    def analyze(self, image, fx0=0, fy0=0, dark=None, dark_max=0, sat_level=255):
+        found = self.detect(image, fx0, fy0)
+        ids = self.match(found)
+        #a tracked spot keeps at least the window of its last D4σ
+        centers = []
+        for spot_id, (cx, cy, hw, hh) in zip(ids, found):
+            track = self.tracks.get(spot_id)
+            if track is not None:
+                hw, hh = max(hw, track[2]), max(hh, track[3])
+            centers.append((cx, cy, max(hw, self.min_size/2), max(hh, self.min_size/2)))
+        h, w = image.shape[:2]
+        spots = []
+        for i, (spot_id, center) in enumerate(zip(ids, centers)):
+            cx, cy, hw, hh = center
+            track = self.tracks.get(spot_id)
+            x0, y0 = min(max(int(cx - hw) - fx0, 0), w - 1), min(max(int(cy - hh) - fy0, 0), h - 1)
+            x1, y1 = max(min(int(cx + hw) + 1 - fx0, w), x0 + 1), max(min(int(cy + hh) + 1 - fy0, h), y0 + 1)
+            window, level = self.window(image, x0, y0, x1, y1, center, centers[:i] + centers[i+1:], dark, fx0, fy0)
+            stats = self.analyzer.analyze(window, x0 + fx0, y0 + fy0, sat_level=sat_level - dark_max - level)
+            if stats.d4x > 0 and stats.d4y > 0:
+                self.tracks[spot_id] = [stats.centroid_x, stats.centroid_y, \
+                    self.factor*stats.d4x/self.analyzer.pixel_um/2, self.factor*stats.d4y/self.analyzer.pixel_um/2, 0]
+            elif track is not None:
+                track[4] = 0
+            else:
+                self.tracks[spot_id] = [cx, cy, hw, hh, 0]
+            spots.append(Spot(spot_id, x0 + fx0, y0 + fy0, x1 + fx0, y1 + fy0, 0.0, stats))
+        total = sum(spot.stats.pix_sum for spot in spots)
+        if total > 0:
+            spots = [spot._replace(share=float(spot.stats.pix_sum/total)) for spot in spots]
+        spots.sort(key=lambda spot: spot.id)
+        self.spots = spots
+        return spots
+
+    #copy a window of the frame (dark and background level subtracted, see beam_roi.subtract_level) into a
+    #reused float32 buffer, returns it with the level. Pixels on the far side of the boundary to a neighboring
+    #spot (windows is a list of (cx, cy, hw, hh) of the other spots) are left out of the level and zeroed. The
+    #boundary divides the line between the centers in the ratio of the spot sizes, so close or touching spots
+    #do not add each other's wings
+    def window(self, image, x0, y0, x1, y1, center, neighbors, dark=None, fx0=0, fy0=0):
+        crop = image[y0:y1, x0:x1]
+        out = self.buffers.get("window", crop.shape, np.float32)
+        if dark is not None:
+            cv2.subtract(crop, dark[y0:y1, x0:x1], dst=out, dtype=cv2.CV_32F)
+        else:
+            np.copyto(out, crop)
+        cx, cy, hw, hh = center
+        far = None
+        for ncx, ncy, nhw, nhh in neighbors:
+            #only neighbors whose windows overlap this one
+            if abs(ncx - cx) >= hw + nhw or abs(ncy - cy) >= hh + nhh:
+                continue
+            dx, dy = ncx - cx, ncy - cy
+            r, nr = math.hypot(hw, hh), math.hypot(nhw, nhh)
+            mx, my = cx + dx*r/(r + nr) - fx0, cy + dy*r/(r + nr) - fy0
+            side = np.add.outer((np.arange(y0, y1) - my)*dy, (np.arange(x0, x1) - mx)*dx) > 0
+            far = side if far is None else far | side
+        level = clip_level(out, self.clip_sigma, None if far is None else (~far).view(np.uint8))
+        subtract_level(out, level, self.clip_sigma)
+        if far is not None:
+            out[far] = 0
+        return out, level
+
+    #spot with the largest power share (None without spots)
+    def main(self):
+        return max(self.spots, key=lambda spot: spot.share) if self.spots else None
+
+    #forget all spots (ids start again at 1)
+    def reset(self):
+        self.tracks.clear()
+        self.spots = []
+        self.next_id = 1
+
+    #draw the spot windows and ids on a display image which has been downsampled by scale
+    def draw(self, image, scale=1, color=(0,0,0), thickness=2):
+        for spot in self.spots:
+            p0 = (round(spot.x0/scale), round(spot.y0/scale))
+            cv2.rectangle(image, p0, (round(spot.x1/scale), round(spot.y1/scale)), color, thickness)
+            cv2.putText(image, str(spot.id), (p0[0] + 2, p0[1] + 14), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, \
+                cv2.LINE_AA)
+        return image
@@ -0,0 +1,81 @@
+#GitHub: koopaduo2
+#Low overhead per stage timing for Beam GUI
+#Every pipeline stage of a frame is timed with perf_counter_ns and kept in fixed size arrays,
+#giving rolling per stage milliseconds and frame rate without allocating per frame
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import time
+
+#stages timed by captureThread
+STAGES = ["capture", "gray", "average", "mask", "moments", "display", "qt", "save"]
+
+#rolling per stage timer over the last window frames
+#usage per frame: start(), mark(stage) after each stage (time since the previous mark), end()
+class StageTimer(object):
+    count = 0 #frames completed
+
+    def __init__(self, stages=STAGES, window=120):
+        self.stages = list(stages)
+        self.index = dict((stage, i) for i, stage in enumerate(self.stages))
+        self.window = window
+        self.times = np.zeros((window, len(self.stages)), np.int64) #ns per stage of the last window frames
+        self.starts = np.zeros(window, np.int64) #start time of the last window frames
+        self.current = np.zeros(len(self.stages), np.int64) #frame being timed
+        self.last = np.zeros(len(self.stages), np.int64) #last completed frame
+        self.t0 = self.t = time.perf_counter_ns()
+
+    #start timing a frame
+    def start(self):
+        self.t0 = self.t = time.perf_counter_ns()
+        self.current.fill(0)
+
+    #add the time since the previous mark to stage
+    def mark(self, stage):
+        now = time.perf_counter_ns()
+        self.current[self.index[stage]] += now - self.t
+        self.t = now
+
+    #charge time measured elsewhere (e.g. by a worker process) to stage
+    def add(self, stage, ns):
+        self.current[self.index[stage]] += ns
+
+    #restart the clock without charging the elapsed time to any stage
+    def skip(self):
+        self.t = time.perf_counter_ns()
+
+    #store the frame's timings in the rolling window
+    def end(self):
+        row = self.count % self.window
+        self.times[row] = self.current
+        self.starts[row] = self.t0
+        self.last[:] = self.current
+        self.count += 1
+
+    #mean milliseconds per stage over the window
+    def mean_ms(self):
+        n = min(self.count, self.window)
+        if n == 0:
+            return np.zeros(len(self.stages))
+        return self.times[:n].mean(axis=0) / 1e6
+
+    #frame rate over the window
+    def fps(self):
+        n = min(self.count, self.window)
+        if n < 2:
+            return 0.0
+        starts = self.starts[:n]
+        span = starts.max() - starts.min()
+        return (n - 1) * 1e9 / span if span > 0 else 0.0
+
+    #last completed frame's timings in milliseconds
+    def last_ms(self):
+        return self.last / 1e6
+
+    #one line summary for the status bar
+    def summary(self):
+        ms = self.mean_ms()
+        return "%.1f fps | " % self.fps() + " ".join("%s %.1f" % (stage, t) for stage, t in zip(self.stages, ms)) + " ms"
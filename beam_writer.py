@@ -0,0 +1,143 @@
+#GitHub: koopaduo2
+#Background save/log writer for Beam GUI
+#PNG encoding and csv writing run in worker threads fed by a bounded queue,
+#so saving and logging no longer stall the acquisition loop
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+from collections import namedtuple
+import cv2
+import os
+import queue
+import threading
+
+#one set of data to save
+#timestamp is used in the file names, camera and beam are BGR images (either may be None),
+#stats is a list of (header, values) csv line pairs and x_prof, y_prof are 1d profiles (or None)
+#max_value is the full scale of the frames (255, or 2**bits - 1 for raw frames), x_start and y_start are the
+#full frame pixels of the profiles' first samples
+SaveJob = namedtuple("SaveJob", ["timestamp", "camera", "beam", "stats", "x_prof", "y_prof", "max_value", \
+    "x_start", "y_start"])
+SaveJob.__new__.__defaults__ = (255, 0, 0)
+
+#backpressure policies when the queue is full
+#"block": wait for space (saving never loses data but can slow down acquisition)
+#"drop_oldest": discard the oldest queued job to make room for the new one
+#"decimate": only every decimate-th job is queued, further jobs are dropped while the queue is full
+POLICIES = ("block", "drop_oldest", "decimate")
+
+#save a beam profile as a csv array: one "pixel, intensity" line per sample (first sample at pixel start)
+def save_profile(path, profile, axis="x", start=0):
+    with open(path, 'w') as profilefile:
+        profilefile.write(axis+" (px),Intensity (ct)\n")
+        profilefile.write("".join("%d,%s\n" % (start + i, repr(float(v))) for i, v in enumerate(profile)))
+
+#submit the SaveJob of a frame while Save is requested. Only logging in "files" mode saves every frame (with the
+#writer's policy, Save stays latched), anything else (a single Save, also while stream logging) is one job which
+#waits for queue space. Returns True while Save stays latched
+def submit_save(writer, job, logging=False, log_mode="stream"):
+    if logging and log_mode == "files":
+        writer.submit(job)
+        return True
+    writer.submit(job, "block")
+    return False
+
+#bounded queue + worker thread pool which writes SaveJobs to savepath
+class SaveWriter(object):
+    frames_written = 0 #jobs completely written
+    frames_dropped = 0 #jobs discarded by the backpressure policy
+    submitted = 0 #jobs offered to submit()
+    errors = 0 #jobs which failed to write
+    last_error = None
+
+    def __init__(self, savepath, workers=2, maxsize=8, policy="block", decimate=1):
+        if policy not in POLICIES:
+            raise ValueError("Unknown backpressure policy: "+str(policy))
+        self.savepath = savepath
+        self.policy = policy
+        self.decimate = max(int(decimate), 1)
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self.run, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    #queue a job according to the backpressure policy (or the given policy, e.g. "block" for single saves)
+    #returns True if the job was queued
+    def submit(self, job, policy=None):
+        policy = policy or self.policy
+        self.submitted += 1
+        if policy == "block":
+            self.queue.put(job)
+            return True
+        if policy == "decimate" and (self.submitted - 1) % self.decimate:
+            self.count_dropped()
+            return False
+        while True:
+            try:
+                self.queue.put_nowait(job)
+                return True
+            except queue.Full:
+                if policy == "decimate":
+                    self.count_dropped()
+                    return False
+            #drop_oldest: make room and try again
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.count_dropped()
+            except queue.Empty:
+                pass
+
+    def count_dropped(self):
+        with self.lock:
+            self.frames_dropped += 1
+
+    #number of jobs waiting to be written
+    def pending(self):
+        return self.queue.qsize()
+
+    #block until every queued job has been written
+    def flush(self):
+        self.queue.join()
+
+    #worker thread loop
+    def run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self.write(job)
+                with self.lock:
+                    self.frames_written += 1
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                    self.last_error = e
+            finally:
+                self.queue.task_done()
+
+    #write all data of one job (same file layout as the original inline save)
+    def write(self, job):
+        savepath = self.savepath
+        if not os.path.exists(savepath):
+            os.makedirs(savepath, exist_ok=True)
+        timestamp = job.timestamp
+        if job.camera is not None:
+            cv2.imwrite(os.path.join(savepath, "camera_"+timestamp+".png"), job.camera)
+        if job.beam is not None:
+            cv2.imwrite(os.path.join(savepath, "beam_"+timestamp+".png"), job.beam)
+        if job.stats:
+            lines = []
+            for header, values in job.stats:
+                lines.append(header)
+                lines.append(",".join(str(v) for v in values))
+            with open(os.path.join(savepath, "stats_"+timestamp+".csv"), 'w') as statsfile:
+                statsfile.write("\n".join(lines)+"\n")
+        if job.x_prof is not None:
+            save_profile(os.path.join(savepath, "x_profile_"+timestamp+".csv"), job.x_prof, "x", job.x_start)
+        if job.y_prof is not None:
+            save_profile(os.path.join(savepath, "y_profile_"+timestamp+".csv"), job.y_prof, "y", job.y_start)
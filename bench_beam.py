@@ -0,0 +1,226 @@
+#GitHub: koopaduo2
+#Benchmark of the Beam GUI capture -> analysis -> display pipeline on synthetic beams
+#Runs without a camera or display. Every pipeline stage is timed separately and the per stage latency
+#percentiles and end to end frame rate are written to a json file which can be compared between versions
+#
+#usage: python bench_beam.py [--frames 50] [--raw-bits 12] [--output bench.json] [--compare old_bench.json]
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import cv2
+import argparse
+import json
+import math
+import platform
+import time
+from beam_analysis import BeamAnalyzer
+from beam_buffers import MemoryMonitor
+from beam_aperture import Aperture
+from beam_display import BeamDisplay, colormap
+from beam_profiles import fit_profiles
+from beam_source import synthetic_frame, BEAM_KINDS
+from beam_raw import RawUnpacker, synthetic_raw
+
+#resolutions benchmarked by default: Pi camera v1 (as used by the GUI), HQ camera full resolution
+RESOLUTIONS = [(2592, 1944), (4056, 3040)]
+
+#pipeline stages in order, each calling the same entry point as captureThread: "stats" is
+#BeamAnalyzer.analyze_profiles (analyze without profiles), "fit" the 1/e² profile fits and "display"
+#BeamDisplay.beam. "save" (png encoding of the camera and beam images) is only timed on a few frames since it
+#is much slower than the rest
+STAGES = ["gray", "mask", "stats", "fit", "display", "save"]
+
+#latency percentiles (ms) of a list of nanosecond timings
+def percentiles(times_ns):
+    ms = np.array(times_ns, dtype=np.float64) / 1e6
+    return {"p50": float(np.percentile(ms, 50)), "p90": float(np.percentile(ms, 90)), \
+        "p99": float(np.percentile(ms, 99)), "mean": float(ms.mean()), "n": len(ms)}
+
+#moments (and with profiles the marginal profiles and their fits) of a masked frame as computed by
+#captureThread.analyze and publish. Returns the stats, profiles and fits and the time the fits were done
+def analyze(analyzer, image_m, x0, y0, aperture, profiles=True, clock=time.perf_counter_ns):
+    if not profiles:
+        stats = analyzer.analyze(image_m, x0, y0, aperture.x, aperture.y)
+        return stats, None, (None, None), clock()
+    stats, marginals = analyzer.analyze_profiles(image_m, x0, y0, aperture.x, aperture.y)
+    t = clock()
+    return stats, marginals, fit_profiles(marginals), t
+
+#time every stage of the pipeline for one resolution and beam kind
+#profiles: analyze as captureThread does with PROFILES (marginal profiles, their fits drawn on the display)
+def bench_case(W, H, kind, frames=50, save_frames=3, warmup=3, profiles=True):
+    frame = synthetic_frame(W, H, kind)
+    analyzer = BeamAnalyzer()
+    aperture = Aperture(W//2, H//2, H//2 - 100)
+    display = BeamDisplay(W, H)
+    gray = np.empty((H, W), np.uint8)
+    masked = np.empty((H, W), np.uint8)
+    times = dict((stage, []) for stage in STAGES)
+    totals = []
+    memory = MemoryMonitor()
+    clock = time.perf_counter_ns
+    for i in range(warmup + frames):
+        t0 = clock()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+        t1 = clock()
+        image_m, x0, y0 = aperture.apply(gray, masked)
+        t2 = clock()
+        stats, marginals, fits, t3 = analyze(analyzer, image_m, x0, y0, aperture, profiles, clock)
+        t4 = clock()
+        display.beam(gray, (stats.centroid_x, stats.centroid_y), aperture, 0, 0, marginals, fits)
+        t5 = clock()
+        if i < warmup:
+            continue
+        for stage, dt in zip(STAGES, (t1-t0, t2-t1, t3-t2, t4-t3, t5-t4)):
+            times[stage].append(dt)
+        totals.append(t5 - t0)
+        memory.sample()
+    for i in range(save_frames):
+        t0 = clock()
+        cv2.imencode(".png", frame)
+        cv2.imencode(".png", colormap(gray, display.lut))
+        times["save"].append(clock() - t0)
+    result = {"width": W, "height": H, "kind": kind, "frames": frames, "profiles": profiles, \
+        "stages": dict((stage, percentiles(times[stage])) for stage in STAGES if times[stage])}
+    result["stages"]["total"] = percentiles(totals)
+    #end to end rate of the analysis + display path (saving excluded)
+    result["fps"] = 1e9 / float(np.mean(totals))
+    #resident memory while timing (steady once warmed up, the loop allocates no frame sized arrays)
+    result["rss_mb"] = memory.rss_mb
+    result["peak_rss_mb"] = memory.peak_mb
+    return result
+
+#time the raw (10/12-bit) path: unpacking the packed Bayer data, demosaicing to 16-bit luminance and the
+#analysis and display stages on the uint16 frame (as in bench_case)
+def bench_raw(W, H, bits=12, frames=20, warmup=2, profiles=True):
+    raw, mosaic = synthetic_raw(W, H, bits)
+    unpacker = RawUnpacker(W, H, bits)
+    analyzer = BeamAnalyzer(sat_level=unpacker.max_value())
+    aperture = Aperture(W//2, H//2, H//2 - 100)
+    display = BeamDisplay(W, H, max_value=unpacker.max_value())
+    masked = np.empty((H, W), np.uint16)
+    stages = ["unpack", "demosaic", "mask", "stats", "fit", "display"]
+    times = dict((stage, []) for stage in stages)
+    totals = []
+    clock = time.perf_counter_ns
+    for i in range(warmup + frames):
+        t0 = clock()
+        unpacker.unpack(raw)
+        t1 = clock()
+        gray = cv2.cvtColor(unpacker.mosaic, unpacker.code, dst=unpacker.gray)
+        t2 = clock()
+        image_m, x0, y0 = aperture.apply(gray, masked)
+        t3 = clock()
+        stats, marginals, fits, t4 = analyze(analyzer, image_m, x0, y0, aperture, profiles, clock)
+        t5 = clock()
+        display.beam(gray, (stats.centroid_x, stats.centroid_y), aperture, 0, 0, marginals, fits)
+        t6 = clock()
+        if i < warmup:
+            continue
+        for stage, dt in zip(stages, (t1-t0, t2-t1, t3-t2, t4-t3, t5-t4, t6-t5)):
+            times[stage].append(dt)
+        totals.append(t6 - t0)
+    result = {"width": W, "height": H, "kind": "raw%d" % bits, "frames": frames, "profiles": profiles, \
+        "stages": dict((stage, percentiles(times[stage])) for stage in stages)}
+    result["stages"]["total"] = percentiles(totals)
+    result["fps"] = 1e9 / float(np.mean(totals))
+    return result
+
+#time the original (v1.1) beam() processing for reference: full resolution float mask,
+#full resolution colormap and centroid lines, then resize
+def bench_legacy(W, H, kind, frames=10):
+    frame = synthetic_frame(W, H, kind)
+    mask_x, mask_y, mask_r = W//2, H//2, H//2 - 100
+    totals = []
+    for i in range(frames):
+        t0 = time.perf_counter_ns()
+        mask = np.zeros([H,W])
+        mask = cv2.circle(mask, (mask_x,mask_y), mask_r, 255, -1)
+        image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        image_m = np.copy(image)
+        image_m[mask==0] = 0
+        np.sum(image_m)
+        image_m.max()
+        len(np.where(image_m==255)[0])
+        MOM = cv2.moments(image_m)
+        if MOM['m00'] != 0:
+            cx = round(MOM['m10']/MOM['m00'])
+            cy = round(MOM['m01']/MOM['m00'])
+            math.sqrt(abs(MOM['m20']/MOM['m00'] - cx**2))
+        else:
+            cx, cy = mask_x, mask_y
+        beam = cv2.applyColorMap(255 - image, cv2.COLORMAP_RAINBOW)
+        cv2.line(beam, (cx,0), (cx,H), (0,0,0), thickness=5)
+        cv2.line(beam, (0,cy), (W,cy), (0,0,0), thickness=5)
+        beam_R = cv2.resize(beam, (int(W/4),int(H/4)))
+        beam_R = cv2.cvtColor(beam_R, cv2.COLOR_BGR2RGB)
+        cv2.resize(frame, (int(W/4),int(H/4)))
+        totals.append(time.perf_counter_ns() - t0)
+    return {"width": W, "height": H, "kind": kind, "frames": frames, \
+        "stages": {"total": percentiles(totals)}, "fps": 1e9 / float(np.mean(totals))}
+
+#print a results table, with the p50 ratio to a previous run if given
+def report(results, previous=None):
+    old = {}
+    if previous:
+        for r in previous["results"]:
+            old[(r.get("pipeline", "current"), r["width"], r["height"], r["kind"])] = r
+    for r in results:
+        key = (r.get("pipeline", "current"), r["width"], r["height"], r["kind"])
+        line = "%s %dx%d %s: %.1f fps" % (key[0], r["width"], r["height"], r["kind"], r["fps"])
+        if "peak_rss_mb" in r:
+            line += ", peak RSS %.0f MB" % r["peak_rss_mb"]
+        print(line)
+        for stage, p in r["stages"].items():
+            line = "    %-9s p50 %8.2f ms  p90 %8.2f ms  p99 %8.2f ms" % (stage, p["p50"], p["p90"], p["p99"])
+            if key in old and stage in old[key]["stages"]:
+                line += "  (x%.2f vs previous p50)" % (p["p50"] / max(old[key]["stages"][stage]["p50"], 1e-9))
+            print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Beam GUI pipeline on synthetic beams")
+    parser.add_argument("--frames", type=int, default=50, help="frames timed per case")
+    parser.add_argument("--save-frames", type=int, default=3, help="frames for the (slow) png save stage")
+    parser.add_argument("--kinds", default=",".join(BEAM_KINDS), help="comma separated beam kinds")
+    parser.add_argument("--resolutions", default=",".join("%dx%d" % r for r in RESOLUTIONS), \
+        help="comma separated WxH resolutions")
+    parser.add_argument("--no-profiles", action="store_true", help="analyze without the marginal profiles and fits "
+        "(captureThread.PROFILES = False)")
+    parser.add_argument("--legacy", action="store_true", help="also time the original v1.1 processing")
+    parser.add_argument("--raw-bits", type=int, choices=(10, 12), help="also time the raw path at this bit depth")
+    parser.add_argument("--output", default="bench_output.json", help="json results file")
+    parser.add_argument("--compare", help="previous json results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    for res in args.resolutions.split(","):
+        W, H = [int(v) for v in res.lower().split("x")]
+        for kind in args.kinds.split(","):
+            result = bench_case(W, H, kind, args.frames, args.save_frames, profiles=not args.no_profiles)
+            result["pipeline"] = "current"
+            results.append(result)
+            if args.legacy:
+                result = bench_legacy(W, H, kind, max(args.frames//5, 1))
+                result["pipeline"] = "legacy"
+                results.append(result)
+        if args.raw_bits:
+            result = bench_raw(W, H, args.raw_bits, max(args.frames//2, 1), profiles=not args.no_profiles)
+            result["pipeline"] = "raw"
+            results.append(result)
+    output = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "machine": platform.machine(), \
+        "platform": platform.platform(), "python": platform.python_version(), \
+        "numpy": np.__version__, "opencv": cv2.__version__, "results": results}
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    report(results, previous)
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=1)
+    print("Results written to "+args.output)
+
+if __name__ == "__main__":
+    main()
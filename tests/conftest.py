@@ -0,0 +1,11 @@
+#GitHub: koopaduo2
+#pytest configuration for the Beam GUI tests: the modules live in the repository root
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
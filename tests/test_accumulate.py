@@ -0,0 +1,37 @@
+#GitHub: koopaduo2
+#Frame accumulation tests: averages, the memory of the "window" mode and the running statistics
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import pytest
+from beam_accumulate import FrameAccumulator, RunningStats, max_window_frames, WINDOW_BYTES
+
+def test_exponential_default_constant_memory():
+    acc = FrameAccumulator((1944, 2592), 256, dtype=np.uint16)
+    assert acc.mode == "exponential" and acc.history is None
+    frames = [np.full((1944, 2592), v, np.uint16) for v in (10, 20, 30)]
+    for frame in frames:
+        mean = acc.add(frame)
+    #the first N frames are averaged exactly
+    assert np.allclose(mean, 20)
+
+def test_window_average_and_budget():
+    acc = FrameAccumulator((4, 4), 2, "window")
+    for v in (10, 20, 40):
+        mean = acc.add(np.full((4, 4), v, np.uint8))
+    assert np.allclose(mean, 30)
+    #5 MP frames: 256 8-bit frames (1.3 GB) are far over the budget
+    assert max_window_frames((1944, 2592), np.uint8) == WINDOW_BYTES // (1944*2592)
+    assert max_window_frames((1944, 2592), np.uint16) < max_window_frames((1944, 2592), np.uint8) < 256
+    with pytest.raises(ValueError):
+        FrameAccumulator((1944, 2592), 256, "window")
+
+def test_running_stats():
+    stats = RunningStats(["a"])
+    for v in (1.0, 2.0, 3.0, 4.0):
+        stats.update((v,))
+    mean, std = stats.summary()["a"]
+    assert mean == 2.5 and abs(std - np.std([1, 2, 3, 4], ddof=1)) < 1e-12
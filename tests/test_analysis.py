@@ -0,0 +1,107 @@
+#GitHub: koopaduo2
+#Beam analysis engine tests: BeamAnalyzer against a numpy reference of the ISO 11146 second moments on
+#synthetic beams (rotated elliptical beam, empty frame, saturation threshold, tiled and profile reductions)
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from beam_analysis import BeamAnalyzer, histogram_stats, tile_stats, combine_tiles
+
+W, H = 400, 300
+PIXEL_UM = 1.55
+
+#Gaussian beam with 1/e² radii wx, wy (px) rotated by angle (degrees) around cx, cy
+def elliptical_beam(cx=210.3, cy=140.7, wx=60.0, wy=25.0, angle=30.0, peak=200, dtype=np.uint8):
+    y, x = np.mgrid[0:H, 0:W].astype(np.float64)
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    u, v = (x - cx)*c + (y - cy)*s, -(x - cx)*s + (y - cy)*c
+    return np.rint(peak*np.exp(-2*(u*u/wx**2 + v*v/wy**2))).astype(dtype)
+
+#centroid, D4σ x, y, signed D4σ xy (μm) and ellipticity from the pixel sums in float64
+def reference(image):
+    I = image.astype(np.float64)
+    y, x = np.mgrid[0:I.shape[0], 0:I.shape[1]]
+    m00 = I.sum()
+    cx, cy = (I*x).sum()/m00, (I*y).sum()/m00
+    vx, vy = (I*(x - cx)**2).sum()/m00, (I*(y - cy)**2).sum()/m00
+    vxy = (I*(x - cx)*(y - cy)).sum()/m00
+    root = math.sqrt((vx - vy)**2 + 4*vxy**2)
+    ellipticity = math.sqrt((vx + vy - root)/(vx + vy + root))
+    return cx, cy, 4*PIXEL_UM*math.sqrt(vx), 4*PIXEL_UM*math.sqrt(vy), \
+        math.copysign(4*PIXEL_UM*math.sqrt(abs(vxy)), vxy), ellipticity
+
+def test_rotated_elliptical_beam():
+    image = elliptical_beam()
+    stats = BeamAnalyzer(PIXEL_UM, cross_terms=True).analyze(image)
+    cx, cy, d4x, d4y, d4xy, ellipticity = reference(image)
+    assert stats.centroid_x == pytest.approx(cx, abs=1e-6) and stats.centroid_y == pytest.approx(cy, abs=1e-6)
+    assert stats.d4x == pytest.approx(d4x, rel=1e-6) and stats.d4y == pytest.approx(d4y, rel=1e-6)
+    assert stats.d4xy == pytest.approx(d4xy, rel=1e-6) and stats.d4xy > 0
+    assert stats.ellipticity == pytest.approx(ellipticity, rel=1e-6)
+    #and the beam itself: principal widths 2 wx, 2 wy
+    assert stats.centroid_x == pytest.approx(210.3, abs=0.05) and stats.centroid_y == pytest.approx(140.7, abs=0.05)
+    assert stats.ellipticity == pytest.approx(25.0/60.0, rel=0.01)
+    assert stats.pix_sum == int(image.astype(np.int64).sum()) and stats.pix_max == 200
+
+#D4σ x, y of an axis aligned beam are the 1/e² diameters, the cross terms are only computed on request
+def test_axis_aligned_beam():
+    stats = BeamAnalyzer(PIXEL_UM, 65535).analyze(elliptical_beam(angle=0, peak=60000, dtype=np.uint16))
+    assert stats.d4x == pytest.approx(120*PIXEL_UM, rel=0.001) and stats.d4y == pytest.approx(50*PIXEL_UM, rel=0.001)
+    assert stats.d4xy is None and stats.ellipticity is None
+
+#without a beam the centroid falls back to cx0, cy0 (else the image center) and the widths are 0
+def test_empty_frame():
+    image = np.zeros((H, W), np.uint8)
+    stats = BeamAnalyzer(cross_terms=True).analyze(image, 10, 20)
+    assert (stats.centroid_x, stats.centroid_y) == (10 + W/2, 20 + H/2)
+    assert (stats.pix_sum, stats.pix_max, stats.sat_num, stats.d4x, stats.d4y) == (0, 0, 0, 0, 0)
+    assert stats.d4xy == 0 and stats.ellipticity == 1.0
+    stats, profiles = BeamAnalyzer().analyze_profiles(image, cx0=50, cy0=60)
+    assert (stats.centroid_x, stats.centroid_y, stats.d4x, stats.d4y) == (50, 60, 0, 0)
+    assert not profiles.x.any() and not profiles.y.any()
+
+#pixels at the saturation level count, one count below does not
+@pytest.mark.parametrize("dtype, sat_level", [(np.uint8, 255), (np.uint16, 4095), (np.float32, 255)])
+def test_sat_num_threshold(dtype, sat_level):
+    image = np.zeros((20, 30), dtype)
+    image[0, :5] = sat_level
+    image[1, :4] = sat_level - 1
+    #above the level (8-bit frames end at it)
+    image[2, :3] = sat_level if dtype == np.uint8 else sat_level + 1
+    expected = 8
+    assert histogram_stats(image, sat_level)[2] == expected
+    assert BeamAnalyzer(sat_level=sat_level).analyze(image).sat_num == expected
+    #a lowered level counts the pixels one below as well
+    assert histogram_stats(image, sat_level - 1)[2] == expected + 4
+
+#strips combined with the parallel axis theorem equal a single pass
+@pytest.mark.parametrize("tiles", [2, 3, 7])
+def test_combine_tiles(tiles):
+    image = elliptical_beam(dtype=np.uint16, peak=4000)
+    single = tile_stats(image, 0, 4095)
+    rows = [int(r) for r in np.linspace(0, H, tiles + 1)]
+    combined = combine_tiles([tile_stats(image[r0:r1], r0, 4095) for r0, r1 in zip(rows[:-1], rows[1:])])
+    assert combined[:4] == single[:4]
+    assert combined[4:] == pytest.approx(single[4:], rel=1e-9)
+    analyzer = BeamAnalyzer(PIXEL_UM, 4095, cross_terms=True)
+    with ThreadPoolExecutor(tiles) as executor:
+        tiled = analyzer.analyze(image, 5, 7, executor=executor, tiles=tiles)
+    assert tiled == pytest.approx(analyzer.analyze(image, 5, 7), rel=1e-9)
+
+#the profile reduction gives the same statistics as the moments pass
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.float32])
+def test_analyze_profiles(dtype):
+    image = elliptical_beam(dtype=dtype)
+    analyzer = BeamAnalyzer(PIXEL_UM, cross_terms=True)
+    stats = analyzer.analyze(image, 12, 34, sat_level=150)
+    profiled, profiles = analyzer.analyze_profiles(image, 12, 34, sat_level=150)
+    assert profiled[:3] == stats[:3]
+    assert profiled[3:] == pytest.approx(stats[3:], rel=1e-6)
+    assert profiles.x0 == 12 and profiles.y0 == 34
+    assert np.allclose(profiles.x, image.sum(axis=0, dtype=np.float64))
+    assert np.allclose(profiles.y, image.sum(axis=1, dtype=np.float64))
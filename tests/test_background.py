@@ -0,0 +1,122 @@
+#GitHub: koopaduo2
+#Background subtraction tests: every background mode run end to end through the masking and analysis steps
+#of captureThread.beam (aperture, profiles and Auto ROI paths), and the batch reanalysis of the sample data
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import os
+import numpy as np
+import pytest
+from beam_analysis import BeamAnalyzer, histogram_stats
+from beam_aperture import Aperture
+from beam_background import Background, BACKGROUND_MODES
+from beam_roi import BeamTracker
+from beam_log import load_log
+import beam_batch
+
+W, H = 640, 480
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Gaussian beam (1/e² radius 60 px) on a noisy offset, with a few saturated pixels
+def beam_frame(dtype=np.uint8, sat_level=255, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:H, 0:W]
+    beam = 0.8*sat_level*np.exp(-2*((x - 320.0)**2 + (y - 240.0)**2)/60**2) + 0.03*sat_level
+    beam += rng.uniform(0, 0.02*sat_level, beam.shape)
+    beam[238:241, 318:321] = sat_level
+    return np.clip(np.rint(beam), 0, sat_level).astype(dtype)
+
+#a dark reference captured (averaged) with the beam blocked
+@pytest.fixture
+def background(tmp_path):
+    background = Background(W, H, str(tmp_path), frames=4)
+    rng = np.random.default_rng(1)
+    for i in range(4):
+        background.add(np.rint(rng.uniform(5, 9, (H, W))).astype(np.uint8))
+    return background
+
+#the masking and analysis steps of captureThread.beam for one background mode
+def analyze_mode(image, mode, background, analyzer, path):
+    aperture = Aperture(320, 240, 200)
+    dark, dark_max = None, 0
+    if "dark" in mode:
+        dark, dark_max = background.reference(image.shape, 0, 0, image.dtype, image.dtype)
+    if path == "roi":
+        tracker = BeamTracker(W, H)
+        image_m, x0, y0 = tracker.apply_clipped(image, 0, 0, np.empty(image.shape, np.float32), dark)
+        return analyzer.analyze(image_m, x0, y0, sat_level=analyzer.sat_level - dark_max - tracker.level)
+    bg_level = aperture.edge_level(image, dark) if "edge" in mode else 0
+    image_m, x0, y0 = aperture.apply(image, np.empty_like(image), dark, bg_level)
+    sat_level = analyzer.sat_level - dark_max - bg_level
+    if path == "profiles":
+        return analyzer.analyze_profiles(image_m, x0, y0, aperture.x, aperture.y, sat_level)[0]
+    return analyzer.analyze(image_m, x0, y0, aperture.x, aperture.y, sat_level=sat_level)
+
+@pytest.mark.parametrize("path", ["aperture", "profiles", "roi"])
+@pytest.mark.parametrize("mode", BACKGROUND_MODES)
+def test_background_modes(background, mode, path):
+    analyzer = BeamAnalyzer()
+    stats = analyze_mode(beam_frame(), mode, background, analyzer, path)
+    assert abs(stats.centroid_x - 320) < 2 and abs(stats.centroid_y - 240) < 2
+    assert stats.d4x > 0 and stats.d4y > 0
+    #the saturated pixels still count as saturated after the subtraction
+    assert stats.sat_num >= 9
+
+def test_background_modes_averaged(background):
+    analyzer = BeamAnalyzer()
+    image = beam_frame().astype(np.float32)
+    for mode in BACKGROUND_MODES:
+        stats = analyze_mode(image, mode, background, analyzer, "aperture")
+        assert stats.sat_num >= 9
+
+def test_fractional_sat_level():
+    image = np.array([[250, 251, 252, 255]], np.uint8)
+    #gray values from the next integer up count as saturated
+    assert histogram_stats(image, 250.5)[2] == 3
+    assert histogram_stats(image, 251)[2] == 3
+    assert histogram_stats(image.astype(np.uint16), 251.0)[2] == 3
+    assert histogram_stats(image.astype(np.uint32), 251.2)[2] == 2
+
+#the documented batch reanalysis with default arguments, and with a numeric background
+#an edge level with a fractional part of 0.5 or more: cv2.subtract rounds it up, the saturation level must be
+#lowered by the same integer so the saturated pixels stay counted
+@pytest.mark.parametrize("share", [0.4, 0.6])
+@pytest.mark.parametrize("dtype, sat_level", [(np.uint8, 255), (np.uint16, 4095)])
+def test_fractional_edge_level(share, dtype, sat_level):
+    rng = np.random.default_rng(2)
+    image = (3 + (rng.uniform(0, 1, (H, W)) < share)).astype(dtype)
+    image[230:250, 310:330] = 100
+    image[238:241, 318:321] = sat_level
+    aperture = Aperture(320, 240, 200)
+    aperture.update(W, H)
+    rows, cols = aperture.edge()
+    mean = image[aperture.y0:aperture.y1, aperture.x0:aperture.x1][rows, cols].mean()
+    assert abs(mean - 3 - share) < 0.05
+    bg_level = aperture.edge_level(image)
+    assert bg_level == int(round(mean)) and isinstance(bg_level, int)
+    analyzer = BeamAnalyzer(sat_level=sat_level)
+    image_m, x0, y0 = aperture.apply(image, np.empty_like(image), None, bg_level)
+    assert image_m[240 - y0, 320 - x0] == sat_level - bg_level
+    for stats in (analyzer.analyze(image_m, x0, y0, sat_level=sat_level - bg_level), \
+        analyzer.analyze_profiles(image_m, x0, y0, sat_level=sat_level - bg_level)[0]):
+        assert stats.sat_num == 9
+
+#averaged (float) frames keep the exact level
+def test_fractional_edge_level_float():
+    image = np.full((H, W), 3.6, np.float32)
+    assert Aperture(320, 240, 200).edge_level(image) == pytest.approx(3.6)
+
+@pytest.mark.parametrize("background", [0, 2])
+def test_batch_sample_data(tmp_path, background):
+    output = str(tmp_path / "reanalysis.csv")
+    n = beam_batch.reprocess(os.path.join(ROOT, "sample_save_data.zip"), output, background=background, workers=2)
+    log = load_log(output)
+    assert n > 0 and len(log["d4x"]) == n
+    assert np.all(np.asarray(log["d4x"]) > 0)
+
+def test_batch_main_defaults(tmp_path):
+    output = str(tmp_path / "reanalysis.csv")
+    beam_batch.main([os.path.join(ROOT, "sample_save_data.zip"), "--workers", "2", "--output", output])
+    assert os.path.exists(output)
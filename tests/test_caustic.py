@@ -0,0 +1,103 @@
+#GitHub: koopaduo2
+#Caustic (M²) tests: the incremental ISO 11146 fit recovers a synthetic hyperbola, keeps its running sums equal
+#to a refit from scratch when positions are replaced or removed, and returns None for too few or degenerate
+#positions
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import pytest
+from beam_caustic import Caustic, CausticFitter, CausticPoint, SimulatedStage
+
+WAVELENGTH_UM = 1.064
+
+#stand-in stage of a beam with waist D4σ 100 μm at z0 12 mm and M² 1.4, scanned from 0 to 40 mm
+def stage(count=21):
+    return SimulatedStage(0.0, 40.0/(count - 1), count, d0_um=100.0, z0_mm=12.0, m2=1.4, wavelength_um=WAVELENGTH_UM)
+
+def scanned(count=21, wavelength_um=WAVELENGTH_UM):
+    caustic = Caustic(wavelength_um, frames=1)
+    scan = stage(count)
+    for z in scan.positions:
+        d = scan.diameter_um(z)
+        caustic.set(CausticPoint(z, d, 0.8*d, 0.0, 0.0, 1))
+    return caustic, scan
+
+def test_fit_hyperbola():
+    caustic, scan = scanned()
+    fit_x, fit_y = caustic.fits
+    zr = np.pi*50.0**2/(1.4*WAVELENGTH_UM)*1e-3
+    assert fit_x.d0 == pytest.approx(100.0, rel=1e-6) and fit_x.z0 == pytest.approx(12.0, abs=1e-6)
+    assert fit_x.zr == pytest.approx(zr, rel=1e-6) and fit_x.m2 == pytest.approx(1.4, rel=1e-6)
+    assert fit_x.theta == pytest.approx(100.0/zr, rel=1e-6)
+    assert fit_x.residual == pytest.approx(0, abs=1e-6) and fit_x.points == 21
+    #the y axis is the same caustic scaled by 0.8: same waist position and Rayleigh range
+    assert fit_y.d0 == pytest.approx(80.0, rel=1e-6) and fit_y.z0 == pytest.approx(12.0, abs=1e-6)
+    assert fit_y.zr == pytest.approx(zr, rel=1e-6) and fit_y.m2 == pytest.approx(0.64*1.4, rel=1e-6)
+    near, far = caustic.coverage(fit_x)
+    assert near > 0 and far > 0
+
+#frames are averaged per position (after the settle frames), frames without a beam are not counted
+def test_average_position():
+    caustic = Caustic(WAVELENGTH_UM, frames=3)
+    caustic.start(5.0, settle=2)
+    results = [caustic.add(d, d) for d in (999, 999, 100, 0, 110, 120)]
+    assert results[:-1] == [None]*5
+    point = results[-1]
+    assert point.z == 5.0 and point.frames == 3 and point.d4x == pytest.approx(110)
+    assert point.std_x == pytest.approx(np.std([100, 110, 120], ddof=1))
+    assert not caustic.capturing() and caustic.rows() == [point]
+
+def fresh_sums(caustic, axis):
+    fitter = CausticFitter()
+    fitter.z_ref = caustic.fitters[axis].z_ref
+    for point in caustic.points.values():
+        fitter.add(point.z, point.d4x if axis == 0 else point.d4y)
+    return fitter
+
+#replacing and removing positions keeps the running normal equation sums equal to a refit from scratch
+def test_replace_remove():
+    caustic, scan = scanned()
+    for z in (0.0, 12.0, 20.0):
+        caustic.set(CausticPoint(z, 500.0, 400.0, 0.0, 0.0, 1))
+    for z in (2.0, 40.0, 34.0):
+        caustic.remove(z)
+    caustic.remove(34.0) #not measured (any more)
+    assert len(caustic.points) == 18
+    for axis in (0, 1):
+        fitter = fresh_sums(caustic, axis)
+        assert caustic.fitters[axis].sums == pytest.approx(fitter.sums, rel=1e-9)
+        assert caustic.fits[axis] == pytest.approx(fitter.fit(WAVELENGTH_UM), rel=1e-9)
+    #removing every position resets the fit
+    for z in list(caustic.points):
+        caustic.remove(z)
+    assert caustic.fits == (None, None) and caustic.fitters[0].z_ref is None and not caustic.fitters[0].sums.any()
+
+#fewer than 3 positions, all at one z, a flat or a downward parabola: no fit, no exception
+@pytest.mark.parametrize("points", [[], [(0, 300)], [(0, 300), (10, 400)], [(5, 300), (5, 310), (5, 320)], \
+    [(0, 300), (10, 300), (20, 300)], [(0, 300), (10, 400), (20, 300)]])
+def test_no_fit(points):
+    fitter = CausticFitter()
+    for z, d in points:
+        fitter.add(z, d)
+    assert fitter.fit(WAVELENGTH_UM) is None
+
+#a position whose removal leaves fewer than 3 positions drops the fit
+def test_too_few_after_remove():
+    caustic = Caustic(WAVELENGTH_UM)
+    for z, d in ((0, 400), (10, 300), (20, 400)):
+        caustic.set(CausticPoint(z, d, d, 0.0, 0.0, 1))
+    assert caustic.fits[0] is not None
+    caustic.remove(10)
+    assert caustic.fits == (None, None)
+
+def test_save(tmp_path):
+    caustic, scan = scanned(5)
+    path = str(tmp_path / "caustic.csv")
+    caustic.save(path)
+    with open(path) as causticfile:
+        lines = causticfile.read().splitlines()
+    assert lines[0] == "z,d4x,d4y,std_x,std_y,frames" and len(lines) == 1 + 5 + 1 + 1 + 2
+    assert lines[-2].startswith("x,"+str(WAVELENGTH_UM)+",") and lines[-1].startswith("y,")
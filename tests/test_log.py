@@ -0,0 +1,52 @@
+#GitHub: koopaduo2
+#Streaming log tests: the frame archive keeps frames whose shape or dtype changes during logging (Auto ROI
+#zoom, raw or averaged frames) in separate chunks, and the batch reanalysis reads them back
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import os
+import numpy as np
+from beam_log import FrameArchive, load_frames, load_log, CHUNK_COLUMNS
+import beam_batch
+
+def frames(shape, dtype, count, start):
+    return [np.full(shape, start + i, dtype) for i in range(count)]
+
+def test_archive_shape_change(tmp_path):
+    path = str(tmp_path / "frames")
+    archive = FrameArchive(path, (48, 64), np.uint8, chunk=4)
+    written = frames((48, 64), np.uint8, 6, 0) + frames((20, 30), np.uint8, 3, 6) + \
+        frames((20, 30), np.float32, 2, 9) + frames((48, 64), np.uint16, 1, 11)
+    for frame in written:
+        archive.append(frame)
+    archive.close()
+    chunks = load_frames(path)
+    assert [(chunk.shape, chunk.dtype.name) for chunk in chunks] == [((4, 48, 64), "uint8"), ((2, 48, 64), "uint8"), \
+        ((3, 20, 30), "uint8"), ((2, 20, 30), "float32"), ((1, 48, 64), "uint16")]
+    read = [frame for chunk in chunks for frame in chunk]
+    assert len(read) == archive.frames == len(written)
+    for a, b in zip(read, written):
+        assert a.dtype == b.dtype and np.array_equal(a, b)
+    with open(os.path.join(path, "chunks.csv")) as indexfile:
+        index = indexfile.read().splitlines()
+    assert index[0] == ",".join(CHUNK_COLUMNS)
+    assert index[1:] == ["frames_000000.npy,0,4,48x64,uint8", "frames_000001.npy,4,2,48x64,uint8", \
+        "frames_000002.npy,6,3,20x30,uint8", "frames_000003.npy,9,2,20x30,float32", \
+        "frames_000004.npy,11,1,48x64,uint16"]
+
+#the batch reanalysis reads every chunk with its own frame shape
+def test_batch_mixed_shapes(tmp_path):
+    path = str(tmp_path / "frames")
+    archive = FrameArchive(path, chunk=8)
+    y, x = np.mgrid[0:120, 0:160]
+    beam = np.clip(200*np.exp(-2*((x - 80.0)**2 + (y - 60.0)**2)/15**2), 0, 255).astype(np.uint8)
+    for frame in [beam]*3 + [beam[20:100, 40:120]]*2:
+        archive.append(frame)
+    archive.close()
+    output = str(tmp_path / "batch.csv")
+    assert beam_batch.reprocess(path, output, aperture=(50, 50, 300, 300, "circle"), workers=1) == 5
+    log = load_log(output)
+    assert list(log.centroid_x) == [80, 80, 80, 40, 40] and list(log.centroid_y) == [60, 60, 60, 40, 40]
+    assert np.all(log.d4x > 0) and np.allclose(log.d4x, log.d4x[0])
@@ -0,0 +1,62 @@
+#GitHub: koopaduo2
+#Multi-process analysis tests: results match the serial analysis, a dead worker raises instead of hanging and
+#closing frees the shared memory
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import cv2
+import pytest
+from multiprocessing import shared_memory
+from beam_source import SyntheticSource
+from beam_analysis import BeamAnalyzer
+from beam_aperture import Aperture
+from beam_parallel import ParallelAnalyzer
+
+W, H = 320, 240
+APERTURE = (160, 120, 100, 100, "circle")
+
+@pytest.fixture
+def pool():
+    source = SyntheticSource(W, H, fps=0, waist_px=30, frames=4)
+    ring = source.start(6, "fifo", shared=True)
+    parallel = ParallelAnalyzer(ring, W, H, workers=2)
+    yield source, ring, parallel
+    source.stop()
+    parallel.close()
+    ring.unlink()
+
+def test_results_match_serial(pool):
+    source, ring, parallel = pool
+    analyzer, aperture = BeamAnalyzer(), Aperture(*APERTURE)
+    for i in range(4):
+        frame = ring.get(5, retain=True)
+        parallel.submit(frame, APERTURE)
+        result = parallel.next_result(30)
+        assert result is not None and result.frame.seq == frame.seq
+        gray = cv2.cvtColor(frame.image, cv2.COLOR_BGR2GRAY)
+        image_m, x0, y0 = aperture.apply(gray)
+        assert result.stats == analyzer.analyze(image_m, x0, y0, aperture.x, aperture.y)
+        ring.release(frame.slot)
+
+def test_dead_worker(pool):
+    source, ring, parallel = pool
+    for process in parallel.processes:
+        process.terminate()
+        process.join(5)
+    parallel.submit(ring.get(5, retain=True), APERTURE)
+    with pytest.raises(RuntimeError):
+        parallel.next_result(30, poll=0.1)
+
+def test_close_frees_shared_memory():
+    source = SyntheticSource(W, H, fps=0, frames=1)
+    ring = source.start(4, shared=True)
+    parallel = ParallelAnalyzer(ring, W, H, workers=1)
+    names = [ring.shm.name, parallel.display_shm.name]
+    source.stop()
+    parallel.close()
+    ring.unlink()
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,82 @@
+#GitHub: koopaduo2
+#Profile tests: the Gaussian and super-Gaussian fits recover the 1/e² diameters of known profiles, profiles
+#without a beam give no fit, and the moments of the marginal profiles match BeamAnalyzer's D4σ
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import pytest
+from beam_analysis import BeamAnalyzer
+from beam_profiles import fit_profile, fit_profiles, marginal_profiles, profile_moments, refine_fit, ProfileFit, \
+    fit_curve, draw_profiles
+
+#profile of a (super-)Gaussian of 1/e² diameter d and the given order centered at center, first sample at start
+def profile(d, center, order=2.0, n=400, start=0, amplitude=1000.0, baseline=0.0):
+    x = np.arange(start, start + n, dtype=np.float64)
+    return baseline + amplitude*np.exp(-2*np.abs((x - center)/(d/2))**order)
+
+@pytest.mark.parametrize("d, center, start", [(40.0, 200.3, 0), (120.0, 950.0, 800), (8.0, 60.5, 0)])
+def test_gaussian_fit(d, center, start):
+    fit = fit_profile(profile(d, center, start=start, baseline=37.0), start)
+    assert fit.diameter == pytest.approx(d, rel=1e-6) and fit.center == pytest.approx(center, abs=1e-6)
+    assert fit.order == 2.0 and fit.amplitude == pytest.approx(1000.0, rel=1e-6)
+    assert fit.residual < 1e-6 and fit.baseline == pytest.approx(37.0, abs=1e-3)
+
+#a flat top beam: the super-Gaussian recovers diameter and order, the Gaussian does not fit it as well
+@pytest.mark.parametrize("order", [2.0, 4.0, 8.0])
+def test_super_gaussian_fit(order):
+    y = profile(100.0, 180.0, order)
+    fit = fit_profile(y, 0, "super-gaussian")
+    assert fit.diameter == pytest.approx(100.0, rel=1e-3) and fit.order == pytest.approx(order, rel=1e-3)
+    assert fit.center == pytest.approx(180.0, abs=1e-3) and fit.residual < 1e-4
+    if order > 2:
+        assert fit_profile(y, 0).residual > 10*fit.residual
+
+#refine_fit started from a poor guess converges to the true parameters
+def test_refine_fit():
+    x = np.arange(400, dtype=np.float64)
+    y = profile(100.0, 180.0, 6.0)
+    fit = refine_fit(x, y, ProfileFit(800.0, 175.0, 90.0, 2.0, 0.0), iterations=50)
+    assert fit.diameter == pytest.approx(100.0, rel=1e-4) and fit.order == pytest.approx(6.0, rel=1e-3)
+    assert fit_curve(fit, x) == pytest.approx(y, abs=1e-3)
+
+#no beam: empty, zero, flat, or too few samples above the floor
+@pytest.mark.parametrize("y", [[], np.zeros(50), np.full(50, 12.0), np.r_[np.zeros(20), 5.0, 7.0, np.zeros(20)]])
+@pytest.mark.parametrize("model", ["gaussian", "super-gaussian"])
+def test_no_beam(y, model):
+    assert fit_profile(y, 0, model) is None
+
+def test_unknown_model():
+    with pytest.raises(ValueError):
+        fit_profile(profile(40.0, 200.0), 0, "lorentzian")
+
+#the moments of the marginal profiles are BeamAnalyzer's centroid and D4σ, the fits its 1/e² diameters
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.float32])
+def test_marginal_moments(dtype):
+    y, x = np.mgrid[0:300, 0:400]
+    image = np.rint(200*np.exp(-2*((x - 210.4)**2/50.0**2 + (y - 130.2)**2/30.0**2))).astype(dtype)
+    stats = BeamAnalyzer(1.0).analyze(image, 20, 10)
+    profiles = marginal_profiles(image, 20, 10)
+    for axis, p, start, centroid, d4 in ((0, profiles.x, 20, stats.centroid_x, stats.d4x), \
+        (1, profiles.y, 10, stats.centroid_y, stats.d4y)):
+        m00, c, mu2 = profile_moments(p)
+        assert m00 == pytest.approx(stats.pix_sum, rel=1e-6)
+        assert start + c == pytest.approx(centroid, abs=1e-6)
+        assert 4*np.sqrt(mu2/m00) == pytest.approx(d4, rel=1e-6)
+    fit_x, fit_y = fit_profiles(profiles)
+    assert fit_x.center == pytest.approx(230.4, abs=0.05) and fit_y.center == pytest.approx(140.2, abs=0.05)
+    assert fit_x.diameter == pytest.approx(100.0, rel=0.01) and fit_y.diameter == pytest.approx(60.0, rel=0.01)
+
+def test_empty_profile_moments():
+    assert profile_moments(np.zeros(10)) == (0.0, 0.0, 0.0)
+
+#drawing the profiles and fits stays inside the display image
+def test_draw_profiles():
+    y, x = np.mgrid[0:120, 0:160]
+    image = np.rint(200*np.exp(-2*((x - 80.0)**2 + (y - 60.0)**2)/20.0**2)).astype(np.uint8)
+    profiles = marginal_profiles(image)
+    display = np.zeros((30, 40, 3), np.uint8)
+    draw_profiles(display, profiles, 4, fit_profiles(profiles))
+    assert display.any()
@@ -0,0 +1,97 @@
+#GitHub: koopaduo2
+#Raw capture tests on synthetic packed raw buffers: RAW10/RAW12 pack and unpack round trips, row padding,
+#locating the raw block of a capture and analyzing the 16-bit frames
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import pytest
+from beam_raw import raw_stride, raw_size, pack_raw, synthetic_raw, raw_block, RawUnpacker, PiRawSource, \
+    RAW_HEADER
+from beam_analysis import BeamAnalyzer
+
+def random_mosaic(W, H, bits, seed=0):
+    return np.random.default_rng(seed).integers(0, 2**bits, (H, W)).astype(np.uint16)
+
+@pytest.mark.parametrize("bits", [10, 12])
+@pytest.mark.parametrize("W, H", [(64, 16), (100, 30), (2592, 8)])
+def test_round_trip(bits, W, H):
+    mosaic = random_mosaic(W, H, bits)
+    rows = pack_raw(mosaic, bits)
+    unpacker = RawUnpacker(W, H, bits)
+    assert np.array_equal(unpacker.unpack(rows), mosaic)
+    assert unpacker.max_value() == 2**bits - 1
+
+#MIPI CSI-2 byte layouts: high bytes first, then the low bits of each pixel
+def test_packed_layout():
+    rows = pack_raw(np.array([[0x3FF, 0x001, 0x2AA, 0x155]], np.uint16), 10)
+    assert list(rows[0, :5]) == [0xFF, 0x00, 0xAA, 0x55, 0b01100111]
+    rows = pack_raw(np.array([[0xABC, 0x123]], np.uint16), 12)
+    assert list(rows[0, :3]) == [0xAB, 0x12, 0x3C]
+
+@pytest.mark.parametrize("bits", [10, 12])
+def test_stride_padding(bits):
+    for W in (64, 100, 2592, 4056):
+        stride = raw_stride(W, bits)
+        assert stride % 32 == 0 and W*bits//8 <= stride < W*bits//8 + 32
+    assert raw_size(4056, 3040, 12) == 18711040
+    assert raw_size(2592, 1944, 10) == 6404096
+    assert raw_size(3280, 2464, 10) == 10270208
+    #padding bytes after the pixels of a row are ignored
+    W, H = 100, 4
+    mosaic = random_mosaic(W, H, bits)
+    rows = pack_raw(mosaic, bits)
+    rows[:, W*bits//8:] = 0xFF
+    assert np.array_equal(RawUnpacker(W, H, bits).unpack(rows), mosaic)
+    #a wider stride than the default
+    rows = pack_raw(mosaic, bits, raw_stride(W, bits) + 32)
+    assert np.array_equal(RawUnpacker(W, H, bits, raw_stride(W, bits) + 32).unpack(rows), mosaic)
+
+def test_unsupported():
+    with pytest.raises(ValueError):
+        pack_raw(np.zeros((2, 8), np.uint16), 8)
+    with pytest.raises(ValueError):
+        RawUnpacker(6, 2, 10)
+
+#a bayer=True capture: jpeg, then the BRCM header, then the raw rows and padding rows
+def capture(W, H, bits, mosaic):
+    rows = np.zeros(((raw_size(W, H, bits) - RAW_HEADER)//raw_stride(W, bits), raw_stride(W, bits)), np.uint8)
+    rows[:H] = pack_raw(mosaic, bits)
+    header = b"BRCM" + bytes(RAW_HEADER - 4)
+    return b"\xff\xd8jpeg data\xff\xd9" + header + rows.tobytes()
+
+def test_raw_block():
+    W, H, bits = 100, 20, 12
+    mosaic = random_mosaic(W, H, bits)
+    data = capture(W, H, bits, mosaic)
+    assert np.array_equal(RawUnpacker(W, H, bits).unpack(raw_block(data, W, H, bits)), mosaic)
+    #another size or bit depth than the sensor's raw mode
+    for size in ((200, 20, 12), (100, 40, 12), (100, 20, 10)):
+        with pytest.raises(ValueError):
+            raw_block(data, *size)
+
+class Camera(object):
+    revision = "imx477"
+
+def test_sensor_mode():
+    with pytest.raises(ValueError):
+        PiRawSource(Camera(), 2592, 1944, 12)
+    with pytest.raises(ValueError):
+        PiRawSource(Camera(), 4056, 3040, 10)
+    assert PiRawSource(Camera(), 4056, 3040, 12).W == 4056
+
+@pytest.mark.parametrize("bits", [10, 12])
+def test_analyze_raw(bits):
+    W, H = 640, 480
+    raw, mosaic = synthetic_raw(W, H, bits, noise=0)
+    frame = RawUnpacker(W, H, bits, demosaic=False).luminance(raw)
+    assert frame.dtype == np.uint16 and np.array_equal(frame, mosaic)
+    analyzer = BeamAnalyzer(1.0, 2**bits - 1)
+    stats = analyzer.analyze(frame)
+    assert stats.pix_sum == int(mosaic.sum(dtype=np.int64)) and stats.pix_max == int(mosaic.max())
+    assert abs(stats.centroid_x - W/2) < 1 and abs(stats.centroid_y - H/2) < 1
+    #D4σ of the Gaussian is its 1/e² diameter (waist H/16 is the radius)
+    assert abs(stats.d4x - H/8) < 1 and abs(stats.d4y - H/8) < 1
+    assert stats.sat_num == 0
@@ -0,0 +1,63 @@
+#GitHub: koopaduo2
+#Auto ROI and multi-spot window tests: D4σ of a Gaussian beam on a noisy offset must not depend on the
+#background noise (the baseline is subtracted, the beam wings and the noise are kept)
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import pytest
+from beam_analysis import BeamAnalyzer
+from beam_roi import BeamTracker, clip_level, subtract_level
+from beam_spots import SpotFinder
+
+W, H = 800, 600
+D4 = 200.0 #true D4σ (px)
+
+#Gaussian beam (1/e² radius D4/2) with offset 20 and gaussian noise
+def noisy_frame(noise, seed):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:H, 0:W]
+    beam = 200*np.exp(-2*((x - 400.0)**2 + (y - 300.0)**2)/(D4/2)**2) + 20 + rng.normal(0, noise, (H, W))
+    return np.clip(np.rint(beam), 0, 255).astype(np.uint8)
+
+@pytest.mark.parametrize("noise", [0, 4, 12])
+def test_tracker_d4sigma(noise):
+    analyzer = BeamAnalyzer(1.0)
+    tracker = BeamTracker(W, H, 1.0)
+    out = np.empty((H, W), np.float32)
+    d4 = []
+    for seed in range(8):
+        window, x0, y0 = tracker.apply_clipped(noisy_frame(noise, seed), 0, 0, out)
+        stats = analyzer.analyze(window, x0, y0)
+        tracker.update(stats)
+        d4 += [stats.d4x, stats.d4y]
+    assert tracker.level == pytest.approx(20, abs=1)
+    assert np.mean(d4[4:]) == pytest.approx(D4, rel=0.02)
+
+@pytest.mark.parametrize("noise", [0, 4, 12])
+def test_spots_d4sigma(noise):
+    finder = SpotFinder(W, H, BeamAnalyzer(1.0))
+    d4 = []
+    for seed in range(8):
+        spots = finder.analyze(noisy_frame(noise, seed))
+        assert len(spots) == 1
+        d4 += [spots[0].stats.d4x, spots[0].stats.d4y]
+    assert np.mean(d4[4:]) == pytest.approx(D4, rel=0.02)
+
+#the level comes from the pixels outside the inscribed ellipse: a beam filling the center does not raise it
+def test_clip_level_ignores_center():
+    window = np.full((60, 90), 10, np.float32)
+    window[15:45, 25:65] = 250
+    assert clip_level(window) == pytest.approx(10)
+    mask = np.ones(window.shape, np.uint8)
+    mask[:, :5] = 0
+    window[:, :5] = 100
+    assert clip_level(window, mask=mask) == pytest.approx(10)
+
+#sigma = 0 keeps the negative noise, a clip clamps at 0
+def test_subtract_level():
+    window = np.array([[8, 10, 12]], np.float32)
+    assert subtract_level(window.copy(), 10).tolist() == [[-2, 0, 2]]
+    assert subtract_level(window.copy(), 11, sigma=1).tolist() == [[0, 0, 1]]
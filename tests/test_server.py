@@ -0,0 +1,135 @@
+#GitHub: koopaduo2
+#Headless server tests: background modes switched over /control keep the capture loop analyzing, invalid
+#query parameters are answered with 400, and a server on localhost with a synthetic source streams the stats
+#of new frames and only renders and encodes previews while a client is connected
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import json
+import threading
+import time
+import urllib.request
+import urllib.error
+import numpy as np
+import pytest
+from http.server import ThreadingHTTPServer
+from beam_source import SyntheticSource, Frame
+from beam_background import BACKGROUND_MODES
+from beam_log import LOG_COLUMNS
+from beam_server import BeamServer, BeamRequestHandler, Broadcast
+
+W, H = 320, 240
+
+#synthetic frames handed to BeamServer.step directly (no capture thread)
+def frames(source):
+    buffer = np.empty((H, W, 3), np.uint8)
+    seq = 0
+    while True:
+        source.fill(buffer)
+        source.seq += 1
+        yield Frame(seq, float(seq), buffer, 0, 0, 0)
+        seq += 1
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    #dark references are saved below the working directory
+    monkeypatch.chdir(tmp_path)
+    return BeamServer(SyntheticSource(W, H, fps=0, waist_px=30, wander_px=0), W, H, str(tmp_path / "saves"))
+
+def test_background_modes(server):
+    stream = frames(server.source)
+    server.command("dark", {})
+    while server.DARK_NOW:
+        server.step(next(stream))
+    for mode in BACKGROUND_MODES:
+        server.command("bg", {"mode": mode})
+        for i in range(3):
+            server.step(next(stream))
+        stats = server.last_stats[0]
+        assert abs(stats.centroid_x - W/2) < 2 and stats.d4x > 0
+
+def test_invalid_every(server):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), BeamRequestHandler)
+    httpd.daemon_threads = True
+    httpd.beam = server
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        for path in ("/stats?every=abc", "/preview.mjpg?every=abc"):
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen("http://127.0.0.1:%d%s" % (httpd.server_address[1], path), timeout=5)
+            assert error.value.code == 400
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+#broadcast which counts the encoded previews
+class CountingBroadcast(Broadcast):
+    encodes = 0
+
+    def encode(self, kind, count, image, ext=".jpg", quality=80):
+        self.encodes += 1
+        return Broadcast.encode(self, kind, count, image, ext, quality)
+
+#BeamServer running its capture loop on a synthetic source, served on a free localhost port
+@pytest.fixture
+def live(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    beam = BeamServer(SyntheticSource(W, H, fps=60, waist_px=30), W, H, str(tmp_path / "saves"), CountingBroadcast())
+    loop = threading.Thread(target=beam.run, daemon=True)
+    loop.start()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), BeamRequestHandler)
+    httpd.daemon_threads = True
+    httpd.beam = beam
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield beam, "http://127.0.0.1:%d" % httpd.server_address[1]
+    beam.stop()
+    loop.join(10)
+    httpd.shutdown()
+    httpd.server_close()
+
+#wait for n more analyzed frames
+def wait_frames(beam, n):
+    count = beam.broadcast.latest("stats")[0]
+    for i in range(n):
+        count, row = beam.broadcast.wait("stats", count)
+        assert row is not None
+
+def test_stats_stream(live):
+    beam, url = live
+    with urllib.request.urlopen(url + "/stats", timeout=5) as response:
+        assert response.headers["Content-Type"] == "application/x-ndjson"
+        rows = [json.loads(response.readline()) for i in range(5)]
+    assert all(list(row) == LOG_COLUMNS for row in rows)
+    frames = [row["frame"] for row in rows]
+    assert all(b > a for a, b in zip(frames, frames[1:]))
+    assert all(abs(row["centroid_x"] - W/2) < 25 and row["d4x"] > 0 for row in rows)
+    #every=3 skips at least two frames between rows
+    with urllib.request.urlopen(url + "/stats?every=3", timeout=5) as response:
+        frames = [json.loads(response.readline())["frame"] for i in range(3)]
+    assert all(b - a >= 3 for a, b in zip(frames, frames[1:]))
+
+#no preview is rendered or encoded before a client connects and after it disconnects
+def test_preview_only_while_connected(live):
+    beam, url = live
+    broadcast = beam.broadcast
+    wait_frames(beam, 10)
+    assert broadcast.counts["beam"] == 0 and broadcast.encodes == 0
+    with urllib.request.urlopen(url + "/preview.mjpg", timeout=5) as response:
+        assert response.readline() == b"--frame\r\n"
+        assert response.readline() == b"Content-Type: image/jpeg\r\n"
+        length = int(response.readline().split(b":")[1])
+        response.readline()
+        assert response.read(length)[:2] == b"\xff\xd8"
+        assert broadcast.clients["beam"] == 1
+    assert broadcast.counts["beam"] > 0 and broadcast.encodes > 0
+    #the server notices the disconnect on its next write
+    deadline = time.monotonic() + 10
+    while broadcast.clients["beam"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert broadcast.clients["beam"] == 0
+    wait_frames(beam, 2)
+    rendered, encodes = broadcast.counts["beam"], broadcast.encodes
+    wait_frames(beam, 20)
+    assert broadcast.counts["beam"] == rendered and broadcast.encodes == encodes
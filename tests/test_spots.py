@@ -0,0 +1,91 @@
+#GitHub: koopaduo2
+#Multi-spot tests: several spots are found and measured, keep their ids while they move, share the power and
+#do not add each other's wings when their windows overlap
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import numpy as np
+import pytest
+from beam_analysis import BeamAnalyzer
+from beam_spots import SpotFinder
+
+W, H = 640, 480
+
+#Gaussian spots given as (cx, cy, 1/e² radius, peak) on a zero background
+def spots_frame(spots):
+    y, x = np.mgrid[0:H, 0:W].astype(np.float64)
+    image = np.zeros((H, W))
+    for cx, cy, w, peak in spots:
+        image += peak*np.exp(-2*((x - cx)**2 + (y - cy)**2)/w**2)
+    return np.clip(np.rint(image), 0, 255).astype(np.uint8)
+
+SPOTS = [(150.0, 120.0, 20.0, 200), (450.0, 130.0, 30.0, 150), (200.0, 350.0, 15.0, 250), (500.0, 360.0, 25.0, 100)]
+
+#nearest found spot to each true spot
+def nearest(found, spots):
+    return [min(found, key=lambda spot: (spot.stats.centroid_x - cx)**2 + (spot.stats.centroid_y - cy)**2) \
+        for cx, cy, w, peak in spots]
+
+def test_several_spots():
+    finder = SpotFinder(W, H, BeamAnalyzer(1.0))
+    for i in range(3):
+        found = finder.analyze(spots_frame(SPOTS))
+    assert len(found) == 4 and [spot.id for spot in found] == sorted(spot.id for spot in found)
+    for spot, (cx, cy, w, peak) in zip(nearest(found, SPOTS), SPOTS):
+        assert spot.stats.centroid_x == pytest.approx(cx, abs=0.1) and spot.stats.centroid_y == pytest.approx(cy, abs=0.1)
+        assert spot.stats.d4x == pytest.approx(2*w, rel=0.02) and spot.stats.d4y == pytest.approx(2*w, rel=0.02)
+        assert spot.x0 <= cx < spot.x1 and spot.y0 <= cy < spot.y1
+    assert finder.main() is nearest(found, SPOTS)[1]
+
+#the power shares sum to 1 and follow the spots' powers (peak x radius²)
+def test_power_shares():
+    found = SpotFinder(W, H, BeamAnalyzer(1.0)).analyze(spots_frame(SPOTS))
+    assert sum(spot.share for spot in found) == pytest.approx(1.0)
+    powers = np.array([peak*w*w for cx, cy, w, peak in SPOTS])
+    shares = [spot.share for spot in nearest(found, SPOTS)]
+    assert shares == pytest.approx(list(powers/powers.sum()), abs=0.005)
+
+#moving spots keep their ids, a new spot gets a new one, a vanished spot's id is retired
+def test_stable_ids():
+    finder = SpotFinder(W, H, BeamAnalyzer(1.0))
+    ids = None
+    for frame in range(8):
+        moved = [(cx + 6*frame, cy - 4*frame, w, peak) for cx, cy, w, peak in SPOTS]
+        found = finder.analyze(spots_frame(moved))
+        frame_ids = [spot.id for spot in nearest(found, moved)]
+        if ids is None:
+            ids = frame_ids
+        assert frame_ids == ids
+    new = [(330.0, 250.0, 20.0, 200)]
+    found = finder.analyze(spots_frame(moved + new))
+    assert len(found) == 5 and nearest(found, new)[0].id == max(ids) + 1
+    for frame in range(finder.max_missed + 1):
+        found = finder.analyze(spots_frame(moved[1:]))
+    assert [spot.id for spot in nearest(found, moved[1:])] == ids[1:]
+    assert ids[0] not in finder.tracks
+    finder.reset()
+    assert finder.analyze(spots_frame(SPOTS[:1]))[0].id == 1
+
+#two spots 3 radii apart: their windows overlap, each window excludes the other spot beyond the boundary
+def test_neighbors_excluded():
+    pair = [(300.0, 240.0, 20.0, 200), (360.0, 240.0, 20.0, 200)]
+    finder = SpotFinder(W, H, BeamAnalyzer(1.0))
+    for i in range(3):
+        found = finder.analyze(spots_frame(pair))
+    assert len(found) == 2
+    left, right = nearest(found, pair)
+    assert left.x1 > right.x0 #the windows overlap
+    for spot, (cx, cy, w, peak) in ((left, pair[0]), (right, pair[1])):
+        assert spot.stats.centroid_x == pytest.approx(cx, abs=0.5)
+        assert spot.stats.d4x == pytest.approx(2*w, rel=0.03) and spot.stats.d4y == pytest.approx(2*w, rel=0.03)
+        assert spot.share == pytest.approx(0.5, abs=0.01)
+    #the window of the left spot is zero beyond the boundary halfway to the right spot
+    image = spots_frame(pair)
+    center, other = (300.0, 240.0, 60.0, 60.0), (360.0, 240.0, 60.0, 60.0)
+    window, level = finder.window(image, 240, 180, 361, 301, center, [other])
+    assert level == 0 and not window[:, 331 - 240:].any() and window[60, 280 - 240:330 - 240].all()
+    #without the neighbor its wing would be included
+    window, level = finder.window(image, 240, 180, 361, 301, center, [])
+    assert window[:, 331 - 240:].any()
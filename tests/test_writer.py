@@ -0,0 +1,128 @@
+#GitHub: koopaduo2
+#Save writer tests: the backpressure policies and counters with a stalled writer thread, and Save while stream
+#logging writes a single set of files (only "files" log mode saves every frame)
+
+#This software is made available via MIT license
+#GitHub project link: https://github.com/koopaduo2/Beam-GUI
+
+#required imports
+import os
+import threading
+import numpy as np
+import pytest
+from beam_writer import SaveJob, SaveWriter, submit_save
+
+def job(timestamp):
+    image = np.full((16, 16, 3), 100, np.uint8)
+    return SaveJob(timestamp, image, image, [("Centroid x (px), y (px)", (8, 8))], np.arange(16), np.arange(16))
+
+#writer whose single thread stalls on every job until released, records the order jobs are written in
+class StalledWriter(SaveWriter):
+
+    def __init__(self, savepath, **kwargs):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.written = []
+        SaveWriter.__init__(self, savepath, workers=1, **kwargs)
+
+    def write(self, job):
+        self.started.set()
+        self.release.wait(10)
+        self.written.append(job.timestamp)
+
+#submit jobs "0", "1", ... once the writer thread is stalled on job "0"
+def stall(writer, count):
+    writer.submit(job("0"))
+    assert writer.started.wait(10)
+    return [writer.submit(job(str(i))) for i in range(1, count)]
+
+def queued(writer):
+    return [queued_job.timestamp for queued_job in list(writer.queue.queue)]
+
+def test_drop_oldest(tmp_path):
+    writer = StalledWriter(str(tmp_path), maxsize=2, policy="drop_oldest")
+    assert stall(writer, 6) == [True]*5
+    assert queued(writer) == ["4", "5"] and writer.pending() == 2
+    assert writer.frames_dropped == 3 and writer.frames_written == 0 and writer.submitted == 6
+    writer.release.set()
+    writer.flush()
+    assert writer.written == ["0", "4", "5"] and writer.frames_written == 3 and writer.frames_dropped == 3
+
+def test_decimate(tmp_path):
+    writer = StalledWriter(str(tmp_path), maxsize=2, policy="decimate", decimate=2)
+    #every second job is dropped, and every job while the queue is full
+    assert stall(writer, 8) == [False, True, False, True, False, False, False]
+    assert queued(writer) == ["2", "4"]
+    assert writer.frames_dropped == 5 and writer.frames_written == 0
+    writer.release.set()
+    writer.flush()
+    assert writer.written == ["0", "2", "4"] and writer.frames_written == 3 and writer.frames_dropped == 5
+
+def test_block(tmp_path):
+    writer = StalledWriter(str(tmp_path), maxsize=2, policy="block")
+    stall(writer, 3)
+    #the next job waits for space in the queue
+    blocked = threading.Thread(target=writer.submit, args=(job("3"),))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive() and queued(writer) == ["1", "2"]
+    writer.release.set()
+    blocked.join(10)
+    writer.flush()
+    assert writer.written == ["0", "1", "2", "3"] and writer.frames_written == 4 and writer.frames_dropped == 0
+
+#a single Save waits for space even if the writer drops while logging
+def test_block_override(tmp_path):
+    writer = StalledWriter(str(tmp_path), maxsize=1, policy="drop_oldest")
+    stall(writer, 2)
+    blocked = threading.Thread(target=writer.submit, args=(job("save"), "block"))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive() and queued(writer) == ["1"]
+    writer.release.set()
+    blocked.join(10)
+    writer.flush()
+    assert writer.written == ["0", "1", "save"] and writer.frames_dropped == 0
+
+#failed writes are counted as errors, not as written frames
+def test_write_error(tmp_path):
+    path = tmp_path / "file"
+    path.write_text("")
+    writer = SaveWriter(str(path / "saves"))
+    writer.submit(job("0"))
+    writer.flush()
+    assert writer.errors == 1 and writer.frames_written == 0 and writer.last_error is not None
+
+def test_unknown_policy(tmp_path):
+    with pytest.raises(ValueError):
+        SaveWriter(str(tmp_path), policy="newest")
+
+#frames of captureThread.publish: Save pressed once, then frames keep coming with the given log mode
+def save_frames(path, logging, log_mode, frames=5):
+    writer = SaveWriter(path, maxsize=2, policy="drop_oldest")
+    save_now = True
+    for i in range(frames):
+        if save_now:
+            save_now = submit_save(writer, job("%03d" % i), logging, log_mode)
+    writer.flush()
+    return writer, save_now
+
+def test_save_while_stream_logging(tmp_path):
+    path = str(tmp_path)
+    writer, save_now = save_frames(path, True, "stream")
+    assert not save_now
+    assert sorted(os.listdir(path)) == ["beam_000.png", "camera_000.png", "stats_000.csv", "x_profile_000.csv", \
+        "y_profile_000.csv"]
+    assert writer.frames_written == 1 and writer.frames_dropped == 0
+
+def test_single_save(tmp_path):
+    writer, save_now = save_frames(str(tmp_path), False, "files")
+    assert not save_now and writer.frames_written == 1
+
+#"files" mode logging keeps saving every frame
+def test_files_logging(tmp_path):
+    path = str(tmp_path)
+    writer, save_now = save_frames(path, True, "files")
+    assert save_now
+    assert writer.frames_written + writer.frames_dropped == 5
+    assert len([name for name in os.listdir(path) if name.startswith("stats_")]) == writer.frames_written